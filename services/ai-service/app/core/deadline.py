@@ -0,0 +1,56 @@
+from fastapi import HTTPException, Request
+from typing import Optional
+from starlette.datastructures import Headers
+import time
+
+# Remaining request budget in milliseconds, relative so clock skew between hosts does not matter
+DEADLINE_HEADER = "X-Request-Budget-Ms"
+
+def budget_from_headers(headers) -> Optional[float]:
+    """Read the remaining budget in seconds from request headers, if present"""
+    value = headers.get(DEADLINE_HEADER)
+    if value is None:
+        return None
+    try:
+        return max(float(value) / 1000.0, 0.0)
+    except ValueError:
+        return None
+
+def remaining(request: Request) -> Optional[float]:
+    """Seconds left before the request's deadline, or None when it has none"""
+    deadline = getattr(request.state, "deadline", None)
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def check_deadline(request: Request) -> Optional[float]:
+    """Give up with 504 once the budget is spent; otherwise return what is left"""
+    left = remaining(request)
+    if left is not None and left <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    return left
+
+def request_budget(request: Request) -> Optional[float]:
+    """Dependency giving the seconds left in the request's budget, if it has one"""
+    return check_deadline(request)
+
+def budget_header(left: float) -> str:
+    return str(max(int(left * 1000), 0))
+
+class DeadlineMiddleware:
+    """Turn an incoming budget header into a local deadline on request.state.
+
+    Plain ASGI rather than an http middleware, so streamed request bodies reach
+    endpoints that read them while already streaming a response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            budget = budget_from_headers(Headers(scope=scope))
+            scope.setdefault("state", {})["deadline"] = (
+                time.monotonic() + budget if budget is not None else None
+            )
+        await self.app(scope, receive, send)
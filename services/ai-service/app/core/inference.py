@@ -0,0 +1,46 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import functools
+import threading
+from .config import settings
+
+class InferencePoolSaturatedError(Exception):
+    """Raised when every inference slot is taken, including by calls whose requests gave up"""
+
+class InferencePool:
+    """Run blocking model calls on a dedicated, bounded thread pool.
+
+    A model call can't be interrupted once its thread starts, so a call that
+    outlives its request budget keeps its worker until generation ends. Work
+    counts as pending until its thread is done rather than until the request
+    stops waiting, and work beyond max_pending is rejected immediately instead
+    of queueing behind generations nobody is waiting for. Calls still queued
+    when their budget runs out are dropped without running.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, budget: Optional[float], fn, *args, **kwargs):
+        """Run fn off the event loop, giving up when the budget runs out"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise InferencePoolSaturatedError("Inference pool is saturated")
+            self.pending += 1
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(self._finished)
+        # On timeout this cancels the call if it hasn't started; a running one finishes in the background
+        return await asyncio.wait_for(asyncio.wrap_future(future), budget)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+inference_pool = InferencePool(settings.INFERENCE_WORKERS, settings.INFERENCE_MAX_PENDING)
@@ -1,12 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 import logging
 from prometheus_client import Counter, Histogram
 import time
-import httpx
 from datetime import datetime
+import asyncio
 import openai
 from transformers import pipeline
 import torch
@@ -14,6 +15,11 @@ import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from nltk.tokenize import sent_tokenize
 import nltk
+from app.core.config import settings
+from autonote_common.ids import new_id
+from autonote_common.security import KeysUnavailableError, TokenVerificationError, TokenVerifier
+from app.core.deadline import DeadlineMiddleware, check_deadline, request_budget
+from app.core.inference import InferencePoolSaturatedError, inference_pool
 
 # Download required NLTK data
 nltk.download('punkt')
@@ -41,6 +47,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline propagated by the API gateway
+app.add_middleware(DeadlineMiddleware)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.AUTH_SERVICE_URL}/token")
+token_verifier = TokenVerifier(
+    settings.AUTH_SERVICE_URL,
+    settings.JWT_ALGORITHMS,
+    settings.JWKS_REFRESH_SECONDS,
+    settings.REVOCATION_REFRESH_SECONDS,
+    settings.JWKS_MIN_REFRESH_SECONDS
+)
+
+@app.on_event("startup")
+async def startup():
+    await token_verifier.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await token_verifier.stop()
+    inference_pool.shutdown()
+
 # Models
 class AIRequest(BaseModel):
     content: str
@@ -63,30 +90,22 @@ summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
 question_generator = pipeline("text2text-generation", model="t5-base")
 
 # Helper functions
-async def verify_token(token: str) -> str:
-    """Verify JWT token with Auth Service"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "http://auth-service:8001/users/me",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()["username"]
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        except Exception as e:
-            logger.error(f"Error verifying token: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error verifying authentication"
-            )
-
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current user from token"""
-    return await verify_token(token)
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """Get current user from a locally verified token"""
+    try:
+        claims = await token_verifier.verify(token, timeout=check_deadline(request))
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except KeysUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error verifying authentication"
+        )
+    return claims["sub"]
 
 def extract_key_points(text: str, num_points: int = 5) -> List[str]:
     """Extract key points from text using TF-IDF and sentence importance"""
@@ -127,30 +146,33 @@ def generate_questions(text: str, num_questions: int = 3) -> List[str]:
 async def process_content(
     request: AIRequest,
     background_tasks: BackgroundTasks,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    budget: Optional[float] = Depends(request_budget)
 ):
     start_time = time.time()
     
     if request.user_id != current_user:
         raise HTTPException(status_code=403, detail="Not authorized to process content for this user")
     
-    result_id = f"{request.operation}_{int(time.time())}"
+    result_id = new_id()
     
     try:
         result = {}
         if request.operation == "summarize":
             # Generate summary using BART
-            summary = summarizer(request.content, max_length=130, min_length=30, do_sample=False)
+            summary = await inference_pool.run(
+                budget, summarizer, request.content, max_length=130, min_length=30, do_sample=False
+            )
             result["summary"] = summary[0]["summary_text"]
             
         elif request.operation == "extract_key_points":
             # Extract key points
-            key_points = extract_key_points(request.content)
+            key_points = await inference_pool.run(budget, extract_key_points, request.content)
             result["key_points"] = key_points
             
         elif request.operation == "generate_questions":
             # Generate questions
-            questions = generate_questions(request.content)
+            questions = await inference_pool.run(budget, generate_questions, request.content)
             result["questions"] = questions
             
         else:
@@ -171,6 +193,17 @@ async def process_content(
         
         return ai_response
         
+    except HTTPException:
+        raise
+    except InferencePoolSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many AI operations in progress, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Deadline exceeded running {request.operation}")
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
         logger.error(f"Error processing content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing content: {str(e)}")
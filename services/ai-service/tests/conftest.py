@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Services are run from their own directory, so make `app` and `main` importable the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.inference import InferencePool, InferencePoolSaturatedError
+
+def test_timed_out_calls_keep_their_slot_until_the_thread_finishes():
+    pool = InferencePool(workers=1, max_pending=2)
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(0.05, release.wait)
+        # The first call still holds the only worker; this one times out while queued
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(0.05, ran.append, "queued")
+        assert pool.pending == 1
+        release.set()
+        while pool.pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    pool.shutdown()
+    assert ran == []
+
+def test_rejects_work_when_saturated():
+    pool = InferencePool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(0.05, release.wait)
+        with pytest.raises(InferencePoolSaturatedError):
+            await pool.run(None, lambda: "rejected")
+        release.set()
+        while pool.pending:
+            await asyncio.sleep(0.01)
+        assert await pool.run(None, lambda: "accepted") == "accepted"
+
+    asyncio.run(scenario())
+    pool.shutdown()
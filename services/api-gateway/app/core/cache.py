@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+import hashlib
+import re
+import time
+
+# Idempotent reads that may be served from the gateway cache
+CACHEABLE_ROUTES = [
+    re.compile(r"^/notes/[^/]+$"),
+    re.compile(r"^/content/[^/]+$"),
+]
+
+# Collection endpoints that the patterns above would otherwise mistake for single resources
+UNCACHEABLE_ROUTES = [
+    re.compile(r"^/notes/search$"),
+    re.compile(r"^/notes/export$"),
+    re.compile(r"^/notes/changes$"),
+]
+
+# Writes that make cached reads of the same path stale
+INVALIDATING_METHODS = {"PUT", "PATCH", "DELETE"}
+
+CacheKey = Tuple[str, str, str, str]
+
+def is_cacheable(path: str) -> bool:
+    """Check whether a gateway path is an idempotent read we cache"""
+    if any(route.match(path) for route in UNCACHEABLE_ROUTES):
+        return False
+    return any(route.match(path) for route in CACHEABLE_ROUTES)
+
+def auth_scope(authorization: Optional[str]) -> str:
+    """Scope cache entries to the caller's credentials.
+
+    The gateway does not verify tokens, so entries are keyed on a digest of the
+    whole Authorization header rather than on unverified claims inside it.
+    """
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+class CacheEntry:
+    __slots__ = ("path", "status_code", "headers", "body", "etag", "expires_at")
+
+    def __init__(self, path: str, status_code: int, headers: Dict[str, str], body: bytes, ttl: float):
+        self.path = path
+        self.status_code = status_code
+        # Keep an upstream validator, which clients may send back in If-Match
+        self.etag = headers.get("etag") or make_etag(body)
+        self.headers = {key: value for key, value in headers.items() if key != "etag"}
+        self.body = body
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+class ResponseCache:
+    """Per-user response cache bounded by a byte budget with LRU eviction"""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        max_entry_bytes: Optional[int] = None,
+        on_evict: Optional[Callable[[], None]] = None
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.on_evict = on_evict
+        self.entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self.keys_by_path: Dict[str, Set[CacheKey]] = {}
+        self.size = 0
+
+    @staticmethod
+    def key(scope: str, path: str, query: str, accept_encoding: str = "") -> CacheKey:
+        # Upstreams may compress, so each accepted encoding gets its own entry
+        return (scope, path, query, accept_encoding)
+
+    def get(self, key: CacheKey) -> Optional[CacheEntry]:
+        """Look up a fresh entry and mark it as most recently used"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: CacheKey, status_code: int, headers: Dict[str, str], body: bytes) -> CacheEntry:
+        """Store a response, evicting least recently used entries over budget"""
+        entry = CacheEntry(key[1], status_code, headers, body, self.ttl)
+        if entry.size > self.max_entry_bytes:
+            return entry
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.keys_by_path.setdefault(entry.path, set()).add(key)
+        self.size += entry.size
+        while self.size > self.max_bytes and self.entries:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            if self.on_evict:
+                self.on_evict()
+        return entry
+
+    def invalidate_path(self, path: str) -> int:
+        """Drop cached entries for a path across every user scope"""
+        keys = self.keys_by_path.get(path, set())
+        count = len(keys)
+        for key in list(keys):
+            self._remove(key)
+        return count
+
+    def _remove(self, key: CacheKey):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        keys = self.keys_by_path.get(entry.path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_path[entry.path]
@@ -0,0 +1,61 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import re
+
+# Idempotent reads that are often requested by many clients at once
+COALESCABLE_ROUTES = [
+    re.compile(r"^/content/"),
+    re.compile(r"^/ai/results/"),
+]
+
+def is_coalescable(path: str) -> bool:
+    """Check whether concurrent GETs of a gateway path may share one upstream call"""
+    return any(route.match(path) for route in COALESCABLE_ROUTES)
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 1
+
+class RequestCoalescer:
+    """Single-flight: identical in-flight requests share one upstream call"""
+
+    LEADER = "leader"
+    FOLLOWER = "follower"
+    OVERFLOW = "overflow"
+
+    def __init__(self, max_waiters: int, on_complete: Optional[Callable[[int], None]] = None):
+        self.max_waiters = max_waiters
+        self.on_complete = on_complete
+        self.flights: Dict[Hashable, _Flight] = {}
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Run fetch once per key, fanning its result out to every concurrent caller.
+
+        Returns the result and the caller's role. Once a flight has max_waiters
+        callers, further callers fetch on their own instead of piling on.
+        """
+        flight = self.flights.get(key)
+        if flight is not None and flight.waiters >= self.max_waiters:
+            return await fetch(), self.OVERFLOW
+        if flight is not None:
+            flight.waiters += 1
+            role = self.FOLLOWER
+        else:
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            role = self.LEADER
+        # Shield so a disconnecting caller cannot cancel the shared call
+        return await asyncio.shield(flight.task), role
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if not flight.task.cancelled():
+            # Mark any exception as retrieved even if every caller went away
+            flight.task.exception()
+        if self.on_complete:
+            self.on_complete(flight.waiters)
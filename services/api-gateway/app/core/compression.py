@@ -0,0 +1,126 @@
+from typing import AsyncIterator, Callable, Dict, Optional
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Preferred first when the client rates several encodings equally
+SUPPORTED_ENCODINGS = [
+    encoding for encoding, available in (
+        ("zstd", zstandard is not None),
+        ("br", brotli is not None),
+        ("gzip", True),
+    ) if available
+]
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+)
+
+# Called with (encoding, cpu_seconds, bytes_in, bytes_out) after each compression step
+CompressionObserver = Callable[[str, float, int, int], None]
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding the client accepts, honouring q-values"""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def is_compressible(headers, size: Optional[int], min_size: int) -> bool:
+    """Only compress uncompressed text-like bodies that are at least min_size bytes"""
+    if headers.get("content-encoding", "identity").lower() != "identity":
+        return False
+    content_type = headers.get("content-type", "").lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return False
+    return size is None or size >= min_size
+
+class StreamCompressor:
+    """Incremental compressor for one of the supported encodings"""
+
+    def __init__(self, encoding: str, level: int, observer: Optional[CompressionObserver] = None):
+        self.encoding = encoding
+        self.observer = observer
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress, self._flush = self._compressor.compress, self._compressor.flush
+            self._sync = lambda: self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+            self._compress, self._flush = self._compressor.process, self._compressor.finish
+            self._sync = self._compressor.flush
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._flush = self._compressor.compress, self._compressor.flush
+            self._sync = lambda: self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def _timed(self, fn, data: bytes = b"") -> bytes:
+        started = time.thread_time()
+        output = fn(data) if data else fn()
+        if self.observer:
+            self.observer(self.encoding, time.thread_time() - started, len(data), len(output))
+        return output
+
+    def compress(self, data: bytes) -> bytes:
+        return self._timed(self._compress, data) if data else b""
+
+    def flush(self) -> bytes:
+        return self._timed(self._flush)
+
+    def sync(self) -> bytes:
+        """Emit everything compressed so far without ending the stream"""
+        return self._timed(self._sync)
+
+def compress_body(body: bytes, encoding: str, level: int, observer: Optional[CompressionObserver] = None) -> bytes:
+    compressor = StreamCompressor(encoding, level, observer)
+    return compressor.compress(body) + compressor.flush()
+
+async def compress_stream(
+    chunks: AsyncIterator[bytes],
+    encoding: str,
+    level: int,
+    observer: Optional[CompressionObserver] = None,
+    flush_chunks: bool = False
+) -> AsyncIterator[bytes]:
+    """Compress a body as it streams; flush_chunks sends each chunk on at once, for slow producers"""
+    compressor = StreamCompressor(encoding, level, observer)
+    async for chunk in chunks:
+        output = compressor.compress(chunk)
+        if flush_chunks and chunk:
+            output += compressor.sync()
+        if output:
+            yield output
+    yield compressor.flush()
@@ -7,12 +7,17 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/v1"
     PROJECT_NAME: str = "AutoNote API Gateway"
     
-    # Service URLs
+    # Service URLs (comma-separated to list several replicas)
     AUTH_SERVICE_URL: str = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8001")
     NOTE_SERVICE_URL: str = os.getenv("NOTE_SERVICE_URL", "http://note-service:8002")
     CONTENT_SERVICE_URL: str = os.getenv("CONTENT_SERVICE_URL", "http://content-service:8003")
     AI_SERVICE_URL: str = os.getenv("AI_SERVICE_URL", "http://ai-service:8004")
     
+    # Load balancing and circuit breaking
+    HEALTH_CHECK_INTERVAL: int = 30
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: int = 30
+    
     # CORS settings
     BACKEND_CORS_ORIGINS: list = ["*"]
     
@@ -20,12 +25,54 @@ class Settings(BaseSettings):
     API_KEY_HEADER: str = "X-API-Key"
     API_KEY: str = os.getenv("API_KEY", "your-api-key-here")
     
-    # Rate limiting
+    # Rate limiting per API key, or per client address without one (opt-in)
+    RATE_LIMIT_ENABLED: bool = False
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_BURST: int = 0  # 0 means same as RATE_LIMIT_PER_MINUTE
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, redis
+    RATE_LIMIT_SHARDS: int = 16
+    RATE_LIMIT_IDLE_SECONDS: int = 300
+    
+    # Redis settings for state shared between gateway replicas
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
-    # Timeout settings
+    # Timeout settings (also the default end-to-end deadline budget)
     REQUEST_TIMEOUT: int = 30
     
+    # Hedged requests for idempotent reads to multi-replica services
+    HEDGING_ENABLED: bool = False
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 0.5  # used until enough latency samples exist
+    HEDGE_MIN_DELAY_SECONDS: float = 0.01
+    
+    # Upstream connection pool settings
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 30.0
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    UPSTREAM_POOL_TIMEOUT: float = 5.0
+    UPSTREAM_HTTP2: bool = True
+    
+    # Proxy mode: stream bodies through untouched, or buffer them in full
+    PROXY_STREAMING: bool = True
+    
+    # Response cache for idempotent note and content reads (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 64MB
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024  # 1MB
+    RESPONSE_CACHE_TTL_SECONDS: int = 60
+    
+    # Request coalescing for identical concurrent GETs (opt-in: coalesced responses are buffered in full)
+    COALESCING_ENABLED: bool = False
+    COALESCE_MAX_WAITERS: int = 100
+    
+    # Response compression, negotiated from Accept-Encoding
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes
+    COMPRESSION_LEVEL: int = 6
+    
+    # Batch endpoint
+    BATCH_MAX_REQUESTS: int = 20
+    
     # Logging
     LOG_LEVEL: str = "INFO"
     
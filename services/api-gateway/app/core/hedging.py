@@ -0,0 +1,23 @@
+from collections import deque
+from typing import Deque, Dict
+
+class LatencyTracker:
+    """Recent upstream latencies per service, used to time hedged requests"""
+
+    def __init__(self, window: int = 256):
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record(self, service: str, seconds: float):
+        samples = self.samples.get(service)
+        if samples is None:
+            samples = self.samples[service] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, service: str, q: float, default: float) -> float:
+        """Latency at quantile q over the recent window, or default with too few samples"""
+        samples = self.samples.get(service)
+        if not samples or len(samples) < 20:
+            return default
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
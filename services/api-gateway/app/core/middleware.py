@@ -1,29 +1,157 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+from typing import Dict, List, Optional
 import time
-from collections import defaultdict
 import asyncio
+import logging
+import zlib
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class InMemoryRateLimitBackend:
+    """Token buckets held in process, split across shards by client id.
+
+    Each check is O(1) and contains no await, so it runs atomically on the
+    event loop without a lock. Sharding keeps idle-client sweeps incremental.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: int, num_shards: int = 16):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.shards: List[Dict[str, _Bucket]] = [{} for _ in range(num_shards)]
+
+    def _shard(self, client_id: str) -> Dict[str, _Bucket]:
+        return self.shards[zlib.crc32(client_id.encode()) % len(self.shards)]
+
+    async def acquire(self, client_id: str) -> bool:
+        """Take one token for the client, returning False when the bucket is empty"""
+        now = time.monotonic()
+        shard = self._shard(client_id)
+        bucket = shard.get(client_id)
+        if bucket is None:
+            shard[client_id] = _Bucket(self.capacity - 1, now)
+            return True
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    def evict_idle(self, shard_index: int, idle_seconds: float) -> int:
+        """Forget clients in one shard that have not been seen for idle_seconds"""
+        cutoff = time.monotonic() - idle_seconds
+        shard = self.shards[shard_index]
+        idle = [client_id for client_id, bucket in shard.items() if bucket.updated < cutoff]
+        for client_id in idle:
+            del shard[client_id]
+        return len(idle)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+class RedisRateLimitBackend:
+    """Token buckets in Redis so every gateway replica enforces one shared limit"""
+
+    # Refill and take a token atomically, using the Redis clock so replicas agree
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return allowed
+    """
+
+    def __init__(self, redis_url: str, rate_per_minute: int, burst: int, idle_seconds: int):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(redis_url)
+        self.script = self.redis.register_script(self.SCRIPT)
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.idle_seconds = idle_seconds
+
+    async def acquire(self, client_id: str) -> bool:
+        """Take one token for the client; fail open if Redis is unreachable"""
+        try:
+            allowed = await self.script(
+                keys=[f"ratelimit:{client_id}"],
+                args=[self.rate, self.capacity, self.idle_seconds]
+            )
+            return bool(allowed)
+        except Exception as e:
+            logger.error(f"Rate limit backend error: {str(e)}")
+            return True
+
+    async def close(self):
+        await self.redis.close()
+
 class RateLimiter:
-    def __init__(self):
-        self.requests = defaultdict(list)
-        self.lock = asyncio.Lock()
-    
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else self._default_backend()
+        self._eviction_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _default_backend():
+        burst = settings.RATE_LIMIT_BURST or settings.RATE_LIMIT_PER_MINUTE
+        if settings.RATE_LIMIT_BACKEND == "redis":
+            return RedisRateLimitBackend(
+                settings.REDIS_URL,
+                settings.RATE_LIMIT_PER_MINUTE,
+                burst,
+                settings.RATE_LIMIT_IDLE_SECONDS
+            )
+        return InMemoryRateLimitBackend(
+            settings.RATE_LIMIT_PER_MINUTE, burst, settings.RATE_LIMIT_SHARDS
+        )
+
+    def _start_eviction(self):
+        """Start sweeping idle clients once an event loop is running"""
+        if self._eviction_task is None and isinstance(self.backend, InMemoryRateLimitBackend):
+            self._eviction_task = asyncio.create_task(self._evict_idle_clients())
+
+    async def _evict_idle_clients(self):
+        """Sweep one shard at a time so eviction never stalls the event loop"""
+        num_shards = len(self.backend.shards)
+        interval = settings.RATE_LIMIT_IDLE_SECONDS / num_shards
+        shard_index = 0
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.backend.evict_idle(shard_index, settings.RATE_LIMIT_IDLE_SECONDS)
+            if evicted:
+                logger.debug(f"Evicted {evicted} idle rate limit buckets")
+            shard_index = (shard_index + 1) % num_shards
+
     async def is_rate_limited(self, client_id: str) -> bool:
-        async with self.lock:
-            now = time.time()
-            # Remove requests older than 1 minute
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if now - req_time < 60
-            ]
-            
-            if len(self.requests[client_id]) >= settings.RATE_LIMIT_PER_MINUTE:
-                return True
-            
-            self.requests[client_id].append(now)
-            return False
+        self._start_eviction()
+        return not await self.backend.acquire(client_id)
+
+    async def stop(self):
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            self._eviction_task = None
+        if isinstance(self.backend, RedisRateLimitBackend):
+            await self.backend.close()
 
 rate_limiter = RateLimiter()
 
@@ -37,4 +165,4 @@ async def rate_limit_middleware(request: Request, call_next):
             content={"detail": "Too many requests"}
         )
     
-    return await call_next(request) 
\ No newline at end of file
+    return await call_next(request)
@@ -0,0 +1,50 @@
+from typing import List, Optional, Pattern, Tuple
+import re
+from starlette.routing import Match
+
+# Upstream routes reachable through the gateway, used to label metrics.
+# More specific templates must come before ones with a placeholder in the same position.
+ROUTE_TEMPLATES = [
+    "/auth/token",
+    "/auth/login",
+    "/auth/register",
+    "/auth/change-password",
+    "/auth/users/me",
+    "/auth/users/{user_id}",
+    "/notes",
+    "/notes/search",
+    "/notes/import",
+    "/notes/export",
+    "/notes/changes",
+    "/notes/{note_id}/related",
+    "/notes/{note_id}",
+    "/content/process",
+    "/content/{content_id}",
+    "/ai/process",
+    "/ai/results/{result_id}",
+]
+
+def _compile(template: str) -> Pattern:
+    pattern = re.sub(r"\{[^/]+\}", "[^/]+", template)
+    return re.compile(f"^{pattern}/?$")
+
+_COMPILED_TEMPLATES: List[Tuple[Pattern, str]] = [
+    (_compile(template), template) for template in ROUTE_TEMPLATES
+]
+
+def route_template(path: str, service: Optional[str] = None) -> str:
+    """Map a forwarded path to its route template so metric labels stay bounded"""
+    for pattern, template in _COMPILED_TEMPLATES:
+        if pattern.match(path):
+            return template
+    if service:
+        return f"/{service}/*"
+    return "unmatched"
+
+def app_route_template(app, scope) -> str:
+    """Map a request handled by the gateway itself to the path of its route"""
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
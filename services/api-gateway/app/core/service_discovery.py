@@ -1,71 +1,229 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Set
 import httpx
 import asyncio
+import random
+import time
 from .config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+class ServiceUnavailableError(Exception):
+    """Raised when a service has no endpoint able to take a request"""
+
+class CircuitBreaker:
+    """Per-endpoint breaker fed by real request outcomes"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+
+    def allow_request(self) -> bool:
+        """Closed lets everything through; half-open lets a single probe through"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            # A probe whose outcome never came back must not hold the endpoint out of rotation for good
+            return not self.probe_in_flight or time.monotonic() - self.probe_started_at >= self.reset_timeout
+        return True
+
+    def on_dispatch(self):
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = True
+            self.probe_started_at = time.monotonic()
+
+    def abort_probe(self):
+        """Forget a probe that ended without an outcome, e.g. a cancelled hedge, so another can go"""
+        self.probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+class Endpoint:
+    """A single replica of a service"""
+
+    def __init__(self, service: str, url: str):
+        self.service = service
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.outstanding = 0
+        self.removed = False
+        self.breaker = CircuitBreaker(
+            settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.removed and self.breaker.allow_request()
+
+    def abandon(self):
+        """A request to this endpoint was cancelled; it says nothing about the replica's health"""
+        self.breaker.abort_probe()
+
+    def record_outcome(self, success: bool):
+        """Feed the result of a proxied request into the circuit breaker"""
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "circuit": self.breaker.state,
+        }
+
+def parse_urls(value: str) -> List[str]:
+    """Split a comma-separated list of replica URLs"""
+    return [url.strip() for url in value.split(",") if url.strip()]
+
 class ServiceDiscovery:
-    def __init__(self):
-        self.services = {
-            "auth": settings.AUTH_SERVICE_URL,
-            "notes": settings.NOTE_SERVICE_URL,
-            "content": settings.CONTENT_SERVICE_URL,
-            "ai": settings.AI_SERVICE_URL
+    def __init__(self, services: Optional[Dict[str, List[str]]] = None):
+        if services is None:
+            services = {
+                "auth": parse_urls(settings.AUTH_SERVICE_URL),
+                "notes": parse_urls(settings.NOTE_SERVICE_URL),
+                "content": parse_urls(settings.CONTENT_SERVICE_URL),
+                "ai": parse_urls(settings.AI_SERVICE_URL)
+            }
+        self.services: Dict[str, List[Endpoint]] = {
+            service: [Endpoint(service, url) for url in urls]
+            for service, urls in services.items()
         }
-        self.health_status = {service: False for service in self.services}
-        self._start_health_check()
-    
-    def _start_health_check(self):
+        self._health_check_task: Optional[asyncio.Task] = None
+
+    def start(self):
         """Start periodic health checks for all services"""
-        asyncio.create_task(self._periodic_health_check())
-    
+        if self._health_check_task is None:
+            self._health_check_task = asyncio.create_task(self._periodic_health_check())
+
+    async def stop(self):
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+
     async def _periodic_health_check(self):
         """Periodically check health of all services"""
         while True:
             await self.check_all_services()
-            await asyncio.sleep(30)  # Check every 30 seconds
-    
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
     async def check_all_services(self) -> Dict[str, bool]:
-        """Check health of all services"""
+        """Check health of every endpoint of every service"""
+        endpoints = [endpoint for group in self.services.values() for endpoint in group]
         async with httpx.AsyncClient() as client:
-            tasks = []
-            for service, url in self.services.items():
-                tasks.append(self._check_service_health(client, service, url))
-            
+            tasks = [self._check_endpoint_health(client, endpoint) for endpoint in endpoints]
             results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for service, result in zip(self.services.keys(), results):
-                if isinstance(result, Exception):
-                    logger.error(f"Health check failed for {service}: {str(result)}")
-                    self.health_status[service] = False
-                else:
-                    self.health_status[service] = result
-            
-            return self.health_status
-    
-    async def _check_service_health(self, client: httpx.AsyncClient, service: str, url: str) -> bool:
-        """Check health of a single service"""
+
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, Exception):
+                logger.error(f"Health check failed for {endpoint.service} at {endpoint.url}: {str(result)}")
+                endpoint.healthy = False
+            else:
+                endpoint.healthy = result
+
+        return self.get_all_health_status()
+
+    async def _check_endpoint_health(self, client: httpx.AsyncClient, endpoint: Endpoint) -> bool:
+        """Check health of a single endpoint"""
         try:
-            response = await client.get(f"{url}/health", timeout=5.0)
+            response = await client.get(f"{endpoint.url}/health", timeout=5.0)
             return response.status_code == 200
         except Exception as e:
-            logger.error(f"Error checking health for {service}: {str(e)}")
+            logger.error(f"Error checking health for {endpoint.service} at {endpoint.url}: {str(e)}")
             return False
-    
-    def get_service_url(self, service: str) -> str:
-        """Get URL for a specific service"""
+
+    def _endpoints(self, service: str) -> List[Endpoint]:
         if service not in self.services:
             raise ValueError(f"Unknown service: {service}")
         return self.services[service]
-    
+
+    def choose(self, service: str, exclude: Optional[Set[str]] = None) -> Endpoint:
+        """Pick an endpoint using power of two choices on outstanding requests"""
+        candidates = [
+            endpoint for endpoint in self._endpoints(service)
+            if endpoint.available and not (exclude and endpoint.url in exclude)
+        ]
+        if not candidates:
+            raise ServiceUnavailableError(f"No available endpoint for {service}")
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    def acquire(self, service: str, exclude: Optional[Set[str]] = None) -> Endpoint:
+        """Choose an endpoint and count the request against it until released"""
+        endpoint = self.choose(service, exclude)
+        endpoint.outstanding += 1
+        endpoint.breaker.on_dispatch()
+        return endpoint
+
+    def release(self, endpoint: Endpoint):
+        endpoint.outstanding = max(endpoint.outstanding - 1, 0)
+
+    def add_endpoint(self, service: str, url: str) -> Endpoint:
+        """Take a replica into rotation without restarting the gateway"""
+        endpoints = self.services.setdefault(service, [])
+        for endpoint in endpoints:
+            if endpoint.url == url.rstrip("/"):
+                return endpoint
+        endpoint = Endpoint(service, url)
+        endpoints.append(endpoint)
+        logger.info(f"Added endpoint {endpoint.url} to {service}")
+        return endpoint
+
+    def remove_endpoint(self, service: str, url: str) -> bool:
+        """Take a replica out of rotation; in-flight requests finish normally"""
+        endpoints = self._endpoints(service)
+        for endpoint in endpoints:
+            if endpoint.url == url.rstrip("/"):
+                endpoint.removed = True
+                endpoints.remove(endpoint)
+                logger.info(f"Removed endpoint {endpoint.url} from {service}")
+                return True
+        return False
+
+    def get_service_url(self, service: str) -> str:
+        """Get URL of an available endpoint for a specific service"""
+        return self.choose(service).url
+
     def is_service_healthy(self, service: str) -> bool:
-        """Check if a specific service is healthy"""
-        return self.health_status.get(service, False)
-    
+        """Check if a service has at least one healthy endpoint"""
+        return any(endpoint.healthy for endpoint in self.services.get(service, []))
+
     def get_all_health_status(self) -> Dict[str, bool]:
         """Get health status of all services"""
-        return self.health_status.copy()
+        return {service: self.is_service_healthy(service) for service in self.services}
+
+    def describe(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the endpoints of every service with their load and circuit state"""
+        return {
+            service: [endpoint.to_dict() for endpoint in endpoints]
+            for service, endpoints in self.services.items()
+        }
 
-service_discovery = ServiceDiscovery() 
\ No newline at end of file
+service_discovery = ServiceDiscovery()
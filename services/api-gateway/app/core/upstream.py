@@ -0,0 +1,263 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from starlette.concurrency import run_until_first_complete
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+import asyncio
+import h11
+import httpx
+import logging
+import time
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Uploads whose upstream answers while still reading them, so responses must flow during the upload
+DUPLEX_ROUTES = {("POST", "/notes/import")}
+
+def is_duplex(method: str, path: str) -> bool:
+    return (method, path) in DUPLEX_ROUTES
+
+# Headers that only apply to a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+    "host",
+}
+
+def filter_headers(headers) -> Dict[str, str]:
+    """Drop hop-by-hop headers so pooled connections stay reusable"""
+    return {
+        key: value for key, value in headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS
+    }
+
+class RequestBody:
+    """A request body read as a stream, noting when the client has sent all of it"""
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.done = asyncio.Event()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        async for chunk in self.request.stream():
+            yield chunk
+        self.done.set()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Streaming response sent while the request body may still be streaming upstream.
+
+    StreamingResponse listens for client disconnects by consuming receive(),
+    which would swallow request body chunks the upstream has not read yet.
+    This one only starts listening once the body has been read in full; until
+    then the body reader owns receive() and fails on a disconnect itself.
+    """
+
+    def __init__(self, content, body: RequestBody, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body = body
+
+    async def _listen_after_body(self, receive):
+        await self.body.done.wait()
+        await self.listen_for_disconnect(receive)
+
+    async def __call__(self, scope, receive, send):
+        await run_until_first_complete(
+            (self.stream_response, {"send": send}),
+            (self._listen_after_body, {"receive": receive}),
+        )
+        if self.background is not None:
+            await self.background()
+
+class DuplexResponse:
+    """Upstream response read while the request body is still being sent.
+
+    httpx sends the whole request body before it reads a response, so a
+    streamed upload proxied through it gets no response bytes until the
+    upload ends. This speaks HTTP/1.1 over its own connection instead, with
+    the body sent by a separate task, and offers the parts of httpx.Response
+    the proxy uses. It is only used for DUPLEX_ROUTES; everything else goes
+    through the pooled clients.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, connection: h11.Connection):
+        self.status_code = 0
+        self.headers = httpx.Headers()
+        self._reader = reader
+        self._writer = writer
+        self._connection = connection
+        self._upload: Optional[asyncio.Task] = None
+        self._last_sent = time.monotonic()
+
+    async def _read(self) -> bytes:
+        """Read from the upstream, timing out once neither side has made progress for REQUEST_TIMEOUT"""
+        while True:
+            try:
+                return await asyncio.wait_for(self._reader.read(65536), settings.REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                # The upstream may rightly stay quiet while the client is still uploading
+                uploading = self._upload is not None and not self._upload.done()
+                if not uploading or time.monotonic() - self._last_sent >= settings.REQUEST_TIMEOUT:
+                    raise httpx.ReadTimeout("Upstream stopped responding") from None
+
+    async def _next_event(self):
+        while True:
+            event = self._connection.next_event()
+            if event is not h11.NEED_DATA:
+                return event
+            self._connection.receive_data(await self._read())
+
+    async def _send(self, body: AsyncIterator[bytes]):
+        try:
+            async for chunk in body:
+                if chunk:
+                    self._writer.write(self._connection.send(h11.Data(data=chunk)))
+                    await self._writer.drain()
+                    self._last_sent = time.monotonic()
+            self._writer.write(self._connection.send(h11.EndOfMessage()))
+            await self._writer.drain()
+        except Exception as e:
+            # A truncated upload must not look complete to the upstream
+            logger.error(f"Error streaming request body upstream: {str(e)}")
+            self._writer.transport.abort()
+
+    async def start(self, method: str, url: httpx.URL, headers: List[Tuple[str, str]], body: AsyncIterator[bytes]):
+        """Send the request head, start the body and wait for the response head"""
+        self._writer.write(self._connection.send(h11.Request(method=method, target=url.raw_path, headers=headers)))
+        await self._writer.drain()
+        self._upload = asyncio.ensure_future(self._send(body))
+        while True:
+            event = await self._next_event()
+            if isinstance(event, h11.Response):
+                break
+            if isinstance(event, h11.ConnectionClosed):
+                raise httpx.RemoteProtocolError("Upstream closed the connection before responding")
+        self.status_code = event.status_code
+        self.headers = httpx.Headers([(name.decode("latin-1"), value.decode("latin-1")) for name, value in event.headers])
+
+    async def aiter_raw(self) -> AsyncIterator[bytes]:
+        while True:
+            event = await self._next_event()
+            if isinstance(event, h11.Data):
+                yield bytes(event.data)
+            elif isinstance(event, (h11.EndOfMessage, h11.ConnectionClosed)):
+                return
+
+    async def aclose(self):
+        if self._upload is not None and not self._upload.done():
+            self._upload.cancel()
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except Exception:
+            # The upload may already have aborted the connection
+            pass
+
+async def send_duplex(
+    method: str,
+    url: httpx.URL,
+    headers: Dict[str, str],
+    body: AsyncIterator[bytes]
+) -> DuplexResponse:
+    """Open a connection for one streamed upload and return once the response head arrives.
+
+    The connection is closed afterwards rather than pooled: an aborted upload
+    leaves it mid-message, and imports are too infrequent for reuse to matter.
+    """
+    port = url.port or (443 if url.scheme == "https" else 80)
+    # Verify upstream certificates the same way the pooled clients do
+    ssl_context = httpx.create_ssl_context() if url.scheme == "https" else None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(url.host, port, ssl=ssl_context),
+            settings.UPSTREAM_CONNECT_TIMEOUT
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        raise httpx.ConnectError(str(e))
+    head = [("host", url.netloc.decode("ascii")), ("connection", "close")]
+    head.extend(headers.items())
+    if "content-length" not in {name.lower() for name in headers}:
+        head.append(("transfer-encoding", "chunked"))
+    response = DuplexResponse(reader, writer, h11.Connection(h11.CLIENT))
+    try:
+        await response.start(method, url, head, body)
+    except BaseException:
+        await response.aclose()
+        raise
+    return response
+
+class UpstreamPool:
+    """Long-lived, pooled HTTP clients, one per upstream service"""
+
+    def __init__(self, services: Iterable[str]):
+        self.services = list(services)
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.in_flight: Dict[str, int] = {service: 0 for service in self.services}
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            settings.REQUEST_TIMEOUT,
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            pool=settings.UPSTREAM_POOL_TIMEOUT,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=settings.UPSTREAM_HTTP2,
+        )
+
+    async def start(self):
+        """Open one client per upstream service"""
+        for service in self.services:
+            if service not in self.clients:
+                self.clients[service] = self._build_client()
+        logger.info(f"Opened upstream pools for: {', '.join(self.clients)}")
+
+    async def close(self):
+        """Close all upstream clients and their connections"""
+        for service, client in self.clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing upstream pool for {service}: {str(e)}")
+        self.clients.clear()
+
+    def client(self, service: str) -> httpx.AsyncClient:
+        """Get the pooled client for a service, creating it lazily if needed"""
+        if service not in self.clients:
+            self.clients[service] = self._build_client()
+        return self.clients[service]
+
+    def acquire(self, service: str):
+        """Mark a request to a service as in flight"""
+        self.in_flight[service] = self.in_flight.get(service, 0) + 1
+
+    def release(self, service: str):
+        """Mark an in-flight request to a service as finished"""
+        self.in_flight[service] = max(self.in_flight.get(service, 0) - 1, 0)
+
+    def open_connections(self, service: str, state: Optional[str] = None) -> int:
+        """Count pooled connections for a service, optionally by state (idle/active)"""
+        client = self.clients.get(service)
+        if client is None:
+            return 0
+        # httpx does not expose pool statistics publicly, so read the httpcore pool
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None) or []
+        if state == "idle":
+            return sum(1 for conn in connections if conn.is_idle())
+        if state == "active":
+            return sum(1 for conn in connections if not conn.is_idle())
+        return len(connections)
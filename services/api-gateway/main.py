@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import httpx
 import logging
-from typing import Dict, Any
-import os
-from prometheus_client import Counter, Histogram
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+import json
+from pydantic import BaseModel
+from prometheus_client import Counter, Histogram, Gauge
 import time
+from app.core.config import settings
+from app.core.upstream import (
+    NDJSON_MEDIA_TYPE, DuplexStreamingResponse, RequestBody, UpstreamPool, filter_headers, is_duplex, send_duplex
+)
+from app.core.service_discovery import Endpoint, ServiceUnavailableError, service_discovery
+from app.core.deadline import DEADLINE_HEADER, budget_from_headers, budget_header, check_deadline
+from app.core.hedging import LatencyTracker
+from app.core.routes import app_route_template, route_template
+from app.core.middleware import rate_limit_middleware, rate_limiter
+from app.core.compression import compress_body, compress_stream, is_compressible, negotiate
+from app.core.coalescing import RequestCoalescer, is_coalescable
+from app.core.cache import (
+    ResponseCache, INVALIDATING_METHODS, auth_scope, etag_matches, is_cacheable
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +31,28 @@ logger = logging.getLogger(__name__)
 # Prometheus metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
 REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+UPSTREAM_LATENCY = Histogram(
+    'gateway_upstream_request_duration_seconds',
+    'Time from dispatch to upstream response headers',
+    ['service'],
+    # Wide buckets: AI inference takes seconds while note reads take milliseconds
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+UPSTREAM_IN_FLIGHT = Gauge('gateway_upstream_requests_in_flight', 'Requests currently in flight per upstream', ['service'])
+UPSTREAM_CONNECTIONS = Gauge('gateway_upstream_pool_connections', 'Pooled upstream connections', ['service', 'state'])
+CACHE_HITS = Counter('gateway_cache_hits_total', 'Responses served from the gateway cache')
+CACHE_MISSES = Counter('gateway_cache_misses_total', 'Cacheable requests forwarded upstream')
+CACHE_EVICTIONS = Counter('gateway_cache_evictions_total', 'Entries evicted from the gateway cache')
+HEDGED_REQUESTS = Counter('gateway_hedged_requests_total', 'Hedged requests sent to a second replica', ['service'])
+HEDGE_WINS = Counter('gateway_hedge_wins_total', 'Hedged requests that answered before the original', ['service'])
+COMPRESSION_CPU = Counter('gateway_compression_cpu_seconds_total', 'CPU time spent compressing responses', ['encoding'])
+COMPRESSION_BYTES = Counter('gateway_compression_bytes_total', 'Response bytes before and after compression', ['encoding', 'direction'])
+COALESCE_REQUESTS = Counter('gateway_coalesce_requests_total', 'Coalescable GETs by role in their flight', ['role'])
+COALESCE_FANOUT = Histogram(
+    'gateway_coalesce_fanout',
+    'Callers served by a single coalesced upstream call',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
 
 app = FastAPI(
     title="AutoNote API Gateway",
@@ -29,15 +67,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# Pooled upstream clients, kept open for the lifetime of the app
+upstream_pool = UpstreamPool(service_discovery.services)
+
+for _service in service_discovery.services:
+    UPSTREAM_IN_FLIGHT.labels(service=_service).set_function(
+        lambda service=_service: upstream_pool.in_flight.get(service, 0)
+    )
+    for _state in ("idle", "active"):
+        UPSTREAM_CONNECTIONS.labels(service=_service, state=_state).set_function(
+            lambda service=_service, state=_state: upstream_pool.open_connections(service, state)
+        )
+
+# Opt-in response cache for idempotent note and content reads
+response_cache = ResponseCache(
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    max_entry_bytes=settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    on_evict=CACHE_EVICTIONS.inc
+)
+
+# Recent upstream latencies, used to time hedged requests
+latency_tracker = LatencyTracker()
+
+# Single-flight for identical concurrent GETs
+request_coalescer = RequestCoalescer(
+    max_waiters=settings.COALESCE_MAX_WAITERS,
+    on_complete=COALESCE_FANOUT.observe
 )
 
-# Service URLs
-SERVICE_URLS = {
-    "auth": os.getenv("AUTH_SERVICE_URL", "http://auth-service:8001"),
-    "notes": os.getenv("NOTE_SERVICE_URL", "http://note-service:8002"),
-    "content": os.getenv("CONTENT_SERVICE_URL", "http://content-service:8003"),
-    "ai": os.getenv("AI_SERVICE_URL", "http://ai-service:8004"),
-}
+@app.on_event("startup")
+async def startup():
+    await upstream_pool.start()
+    service_discovery.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await service_discovery.stop()
+    await upstream_pool.close()
+    await rate_limiter.stop()
 
 # Health check endpoint
 @app.get("/health")
@@ -47,16 +118,375 @@ async def health_check():
 # Service health check
 @app.get("/health/services")
 async def service_health():
-    health_status = {}
-    async with httpx.AsyncClient() as client:
-        for service, url in SERVICE_URLS.items():
-            try:
-                response = await client.get(f"{url}/health")
-                health_status[service] = "healthy" if response.status_code == 200 else "unhealthy"
-            except Exception as e:
-                logger.error(f"Error checking {service} health: {str(e)}")
-                health_status[service] = "unhealthy"
-    return health_status
+    health_status = await service_discovery.check_all_services()
+    return {
+        service: "healthy" if healthy else "unhealthy"
+        for service, healthy in health_status.items()
+    }
+
+# Replica management
+class EndpointUpdate(BaseModel):
+    url: str
+
+def verify_api_key(api_key: Optional[str]):
+    if api_key != settings.API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+
+@app.get("/admin/services")
+async def list_service_endpoints(api_key: Optional[str] = Header(None, alias=settings.API_KEY_HEADER)):
+    verify_api_key(api_key)
+    return service_discovery.describe()
+
+@app.post("/admin/services/{service}/endpoints")
+async def add_service_endpoint(
+    service: str,
+    update: EndpointUpdate,
+    api_key: Optional[str] = Header(None, alias=settings.API_KEY_HEADER)
+):
+    verify_api_key(api_key)
+    if service not in service_discovery.services:
+        raise HTTPException(status_code=404, detail=f"Unknown service: {service}")
+    return service_discovery.add_endpoint(service, update.url).to_dict()
+
+@app.delete("/admin/services/{service}/endpoints")
+async def remove_service_endpoint(
+    service: str,
+    url: str,
+    api_key: Optional[str] = Header(None, alias=settings.API_KEY_HEADER)
+):
+    verify_api_key(api_key)
+    if service not in service_discovery.services:
+        raise HTTPException(status_code=404, detail=f"Unknown service: {service}")
+    if not service_discovery.remove_endpoint(service, url):
+        raise HTTPException(status_code=404, detail="Endpoint not found")
+    return {"status": "success"}
+
+def _request_body(request: Request):
+    """Stream the incoming body upstream only when the client actually sent one"""
+    if "content-length" in request.headers or "transfer-encoding" in request.headers:
+        return request.stream()
+    return None
+
+def _streams_upload(request: Request) -> bool:
+    """An open-ended upload, sent chunked or as NDJSON (e.g. note imports), lasting as long as the client sends"""
+    if "transfer-encoding" in request.headers:
+        return True
+    return "content-length" in request.headers and request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE)
+
+def _release(service: str, endpoint: Endpoint):
+    upstream_pool.release(service)
+    service_discovery.release(endpoint)
+
+async def _iter_upstream(response: httpx.Response, service: str, endpoint: Endpoint) -> AsyncIterator[bytes]:
+    """Relay raw upstream chunks, releasing the pooled connection when done"""
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    finally:
+        await response.aclose()
+        _release(service, endpoint)
+
+async def _close_upstream(response: httpx.Response, service: str, endpoint: Endpoint):
+    await response.aclose()
+    _release(service, endpoint)
+
+async def _send_upstream(
+    request: Request,
+    service: str,
+    path: str,
+    tried: Optional[Set[str]] = None
+) -> Tuple[httpx.Response, Endpoint]:
+    """Send the request to a balanced endpoint and return once response headers arrive"""
+    client = upstream_pool.client(service)
+    tried = tried if tried is not None else set()
+    attempts = max(len(service_discovery.services[service]), 1)
+    for attempt in range(attempts):
+        left = check_deadline(request)
+        endpoint = service_discovery.acquire(service, exclude=tried)
+        tried.add(endpoint.url)
+        headers = filter_headers(request.headers)
+        if left is not None:
+            # Replaces the budget the client sent, whose key arrives lowercased
+            headers[DEADLINE_HEADER.lower()] = budget_header(left)
+        if is_duplex(request.method, path):
+            # httpx sends the whole body before reading the response, which would hold back progress lines
+            request.state.body = RequestBody(request)
+            send = send_duplex(
+                request.method,
+                httpx.URL(f"{endpoint.url}{path}", params=request.query_params.multi_items()),
+                headers,
+                request.state.body.stream()
+            )
+        else:
+            upstream_request = client.build_request(
+                method=request.method,
+                url=f"{endpoint.url}{path}",
+                headers=headers,
+                params=request.query_params.multi_items(),
+                content=_request_body(request)
+            )
+            send = client.send(upstream_request, stream=True)
+        upstream_pool.acquire(service)
+        dispatched_at = time.time()
+        try:
+            response = await asyncio.wait_for(send, left)
+        except httpx.ConnectError:
+            # Nothing reached the replica, so another one can safely take the request
+            endpoint.record_outcome(success=False)
+            _release(service, endpoint)
+            if attempt == attempts - 1:
+                raise
+            continue
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # A hedge that lost the race, or a client budget running out, says nothing
+            # about the replica's health; counting it would let tiny budgets open breakers
+            endpoint.abandon()
+            _release(service, endpoint)
+            raise
+        except Exception:
+            endpoint.record_outcome(success=False)
+            _release(service, endpoint)
+            raise
+        elapsed = time.time() - dispatched_at
+        UPSTREAM_LATENCY.labels(service=service).observe(elapsed)
+        latency_tracker.record(service, elapsed)
+        endpoint.record_outcome(success=response.status_code < 500)
+        return response, endpoint
+
+def _should_hedge(request: Request, service: str) -> bool:
+    return (
+        settings.HEDGING_ENABLED
+        and request.method == "GET"
+        and _request_body(request) is None
+        and len(service_discovery.services[service]) > 1
+    )
+
+async def _dispatch(request: Request, service: str, path: str) -> Tuple[httpx.Response, Endpoint]:
+    """Send upstream, hedging idempotent reads to a second replica after the p95 delay"""
+    if not _should_hedge(request, service):
+        return await _send_upstream(request, service, path)
+    
+    tried: Set[str] = set()
+    primary = asyncio.ensure_future(_send_upstream(request, service, path, tried))
+    delay = max(
+        latency_tracker.percentile(service, 0.95, settings.HEDGE_DEFAULT_DELAY_SECONDS),
+        settings.HEDGE_MIN_DELAY_SECONDS
+    )
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    
+    HEDGED_REQUESTS.labels(service=service).inc()
+    hedge = asyncio.ensure_future(_send_upstream(request, service, path, tried))
+    pending = {primary, hedge}
+    error = None
+    
+    def discard_late(task: asyncio.Future):
+        # A loser that got its headers anyway must still hand back its connection
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(_close_upstream(*task.result(), service))
+    
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winners = [task for task in done if not task.cancelled() and task.exception() is None]
+            if winners:
+                for task in winners[1:]:
+                    discard_late(task)
+                if winners[0] is hedge:
+                    HEDGE_WINS.labels(service=service).inc()
+                return winners[0].result()
+            error = error or next(task.exception() for task in done if not task.cancelled())
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+            task.add_done_callback(discard_late)
+
+async def proxy_streaming(request: Request, service: str, path: str) -> Response:
+    """Pass bodies through chunk by chunk in both directions without decoding them"""
+    response, endpoint = await _dispatch(request, service, path)
+    if is_duplex(request.method, path):
+        # The upstream answers before it finishes reading the upload, so keep relaying the body meanwhile
+        return DuplexStreamingResponse(
+            _iter_upstream(response, service, endpoint),
+            request.state.body,
+            status_code=response.status_code,
+            headers=filter_headers(response.headers)
+        )
+    return StreamingResponse(
+        _iter_upstream(response, service, endpoint),
+        status_code=response.status_code,
+        headers=filter_headers(response.headers)
+    )
+
+async def _fetch_buffered(request: Request, service: str, path: str) -> Tuple[int, Dict[str, str], bytes]:
+    """Read the whole upstream response, keeping the body byte-for-byte"""
+    response, endpoint = await _dispatch(request, service, path)
+    body = b"".join([chunk async for chunk in _iter_upstream(response, service, endpoint)])
+    return response.status_code, filter_headers(response.headers), body
+
+async def _fetch_shared(request: Request, service: str, path: str) -> Tuple[int, Dict[str, str], bytes]:
+    """Fetch a buffered GET, sharing one upstream call among identical concurrent requests"""
+    if not (settings.COALESCING_ENABLED and request.method == "GET" and is_coalescable(path)):
+        return await _fetch_buffered(request, service, path)
+    # Everything that can change the upstream's answer: conditional requests may get a 304, budgets a 504
+    key = (
+        auth_scope(request.headers.get("authorization")),
+        path,
+        request.url.query,
+        request.headers.get("accept-encoding", ""),
+        request.headers.get("if-none-match", ""),
+        request.headers.get("if-modified-since", ""),
+        request.headers.get(DEADLINE_HEADER, "")
+    )
+    result, role = await request_coalescer.run(
+        key, lambda: _fetch_buffered(request, service, path)
+    )
+    COALESCE_REQUESTS.labels(role=role).inc()
+    return result
+
+async def proxy_coalesced(request: Request, service: str, path: str) -> Response:
+    """Forward a coalescable GET, answering every waiter from one upstream response"""
+    status_code, headers, body = await _fetch_shared(request, service, path)
+    return Response(content=body, status_code=status_code, headers=headers)
+
+async def proxy_buffered(request: Request, service: str, path: str) -> Response:
+    """Read the whole upstream body before answering"""
+    status_code, headers, body = await _fetch_buffered(request, service, path)
+    return Response(content=body, status_code=status_code, headers=headers)
+
+async def proxy_cached(request: Request, service: str, path: str) -> Response:
+    """Serve a cacheable GET from the response cache, revalidating with ETags"""
+    key = ResponseCache.key(
+        auth_scope(request.headers.get("authorization")),
+        path,
+        request.url.query,
+        request.headers.get("accept-encoding", "")
+    )
+    entry = response_cache.get(key)
+    if entry is not None:
+        CACHE_HITS.inc()
+    else:
+        CACHE_MISSES.inc()
+        status_code, headers, body = await _fetch_shared(request, service, path)
+        if status_code != 200:
+            return Response(content=body, status_code=status_code, headers=headers)
+        entry = response_cache.put(key, status_code, headers, body)
+    
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(
+        content=entry.body,
+        status_code=entry.status_code,
+        headers={**entry.headers, "ETag": entry.etag}
+    )
+
+def _observe_compression(encoding: str, seconds: float, bytes_in: int, bytes_out: int):
+    COMPRESSION_CPU.labels(encoding=encoding).inc(seconds)
+    COMPRESSION_BYTES.labels(encoding=encoding, direction="in").inc(bytes_in)
+    COMPRESSION_BYTES.labels(encoding=encoding, direction="out").inc(bytes_out)
+
+def compress_response(request: Request, response: Response) -> Response:
+    """Compress a response once, at the gateway, in the encoding the client prefers"""
+    if not settings.COMPRESSION_ENABLED or request.method == "HEAD" or response.status_code in (204, 304):
+        return response
+    streaming = isinstance(response, StreamingResponse)
+    if streaming:
+        length = response.headers.get("content-length")
+        size = int(length) if length else None
+    else:
+        size = len(response.body)
+    if not is_compressible(response.headers, size, settings.COMPRESSION_MIN_SIZE):
+        return response
+    
+    response.headers["vary"] = "Accept-Encoding"
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return response
+    
+    if streaming:
+        # Chunked and NDJSON bodies (exports, import results) arrive over time; don't sit on them in the encoder
+        flush_chunks = size is None or response.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE)
+        response.body_iterator = compress_stream(
+            response.body_iterator, encoding, settings.COMPRESSION_LEVEL, _observe_compression, flush_chunks
+        )
+        if "content-length" in response.headers:
+            del response.headers["content-length"]
+    else:
+        response.body = compress_body(
+            response.body, encoding, settings.COMPRESSION_LEVEL, _observe_compression
+        )
+        response.headers["content-length"] = str(len(response.body))
+    response.headers["content-encoding"] = encoding
+    # The compressed bytes differ from what a strong ETag promised
+    etag = response.headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        response.headers["etag"] = f"W/{etag}"
+    return response
+
+def set_deadline(request: Request):
+    """Give a forwarded request its deadline, tightened by any budget the client sent.
+
+    A streamed upload takes as long as the client keeps sending, so only a
+    budget the client sent bounds it; idle timeouts still apply upstream.
+    """
+    budget = None if _streams_upload(request) else settings.REQUEST_TIMEOUT
+    client_budget = budget_from_headers(request.headers)
+    if client_budget is not None:
+        budget = client_budget if budget is None else min(budget, client_budget)
+    request.state.deadline = time.monotonic() + budget if budget is not None else None
+
+async def forward(request: Request, service: str, path: str, stream: bool) -> Response:
+    """Forward a request to its service, turning gateway-side failures into error responses"""
+    start_time = time.time()
+    try:
+        # Forward the request to the appropriate service over its pooled client
+        if settings.RESPONSE_CACHE_ENABLED and request.method == "GET" and is_cacheable(path):
+            response = await proxy_cached(request, service, path)
+        elif settings.COALESCING_ENABLED and request.method == "GET" and is_coalescable(path):
+            response = await proxy_coalesced(request, service, path)
+        elif stream:
+            response = await proxy_streaming(request, service, path)
+        else:
+            response = await proxy_buffered(request, service, path)
+        
+        if settings.RESPONSE_CACHE_ENABLED and request.method in INVALIDATING_METHODS:
+            response_cache.invalidate_path(path)
+        
+        response = compress_response(request, response)
+    except ServiceUnavailableError as e:
+        logger.error(str(e))
+        response = JSONResponse(
+            status_code=503,
+            content={"detail": f"{service} service unavailable"}
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Deadline exceeded forwarding request to {service}")
+        response = JSONResponse(
+            status_code=504,
+            content={"detail": "Request deadline exceeded"}
+        )
+    except HTTPException as e:
+        response = JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.detail}
+        )
+    
+    # Record metrics (latency is time to upstream response headers)
+    endpoint = route_template(path, service)
+    REQUEST_COUNT.labels(
+        method=request.method,
+        endpoint=endpoint,
+        status=response.status_code
+    ).inc()
+    
+    REQUEST_LATENCY.labels(
+        method=request.method,
+        endpoint=endpoint
+    ).observe(time.time() - start_time)
+    
+    return response
 
 # Request forwarding middleware
 @app.middleware("http")
@@ -67,36 +497,10 @@ async def forward_request(request, call_next):
     path = request.url.path
     service = path.split("/")[1] if len(path.split("/")) > 1 else None
     
-    if service in SERVICE_URLS:
+    if service in service_discovery.services:
+        set_deadline(request)
         try:
-            # Forward the request to the appropriate service
-            async with httpx.AsyncClient() as client:
-                target_url = f"{SERVICE_URLS[service]}{path}"
-                response = await client.request(
-                    method=request.method,
-                    url=target_url,
-                    headers=dict(request.headers),
-                    params=dict(request.query_params),
-                    content=await request.body()
-                )
-                
-                # Record metrics
-                REQUEST_COUNT.labels(
-                    method=request.method,
-                    endpoint=path,
-                    status=response.status_code
-                ).inc()
-                
-                REQUEST_LATENCY.labels(
-                    method=request.method,
-                    endpoint=path
-                ).observe(time.time() - start_time)
-                
-                return JSONResponse(
-                    content=response.json(),
-                    status_code=response.status_code,
-                    headers=dict(response.headers)
-                )
+            return await forward(request, service, path, stream=settings.PROXY_STREAMING)
         except Exception as e:
             logger.error(f"Error forwarding request to {service}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error forwarding request to {service}")
@@ -105,19 +509,154 @@ async def forward_request(request, call_next):
     response = await call_next(request)
     
     # Record metrics for non-forwarded requests
+    endpoint = app_route_template(app, request.scope)
     REQUEST_COUNT.labels(
         method=request.method,
-        endpoint=path,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
     
     REQUEST_LATENCY.labels(
         method=request.method,
-        endpoint=path
+        endpoint=endpoint
     ).observe(time.time() - start_time)
     
     return response
 
+# Registered after forward_request so it runs first, before anything is forwarded
+if settings.RATE_LIMIT_ENABLED:
+    app.middleware("http")(rate_limit_middleware)
+
+# Batch endpoint: several sub-requests in one round trip
+class BatchItem(BaseModel):
+    id: str
+    method: str = "GET"
+    path: str
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+    depends_on: List[str] = []
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+class BatchItemResponse(BaseModel):
+    id: str
+    status: int
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResponse]
+
+def _build_subrequest(parent: Request, item: BatchItem) -> Request:
+    """Build a request for one batch item, inheriting the caller's credentials and deadline"""
+    path, _, query = item.path.partition("?")
+    headers = {
+        key.lower(): value for key, value in parent.headers.items()
+        if key.lower() in ("authorization", settings.API_KEY_HEADER.lower())
+    }
+    headers.update({key.lower(): value for key, value in item.headers.items()})
+    # Sub-responses are embedded as JSON, so ask upstream for uncompressed bodies
+    headers.pop("accept-encoding", None)
+    
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode()
+        headers["content-type"] = "application/json"
+        headers["content-length"] = str(len(body))
+    
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": item.method.upper(),
+        "scheme": parent.url.scheme,
+        "server": parent.scope.get("server"),
+        "client": parent.scope.get("client"),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(key.encode(), value.encode()) for key, value in headers.items()],
+        "state": {"deadline": parent.state.deadline},
+    }
+    body_sent = False
+    
+    async def receive():
+        nonlocal body_sent
+        if body_sent:
+            return {"type": "http.disconnect"}
+        body_sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    return Request(scope, receive)
+
+def _decode_body(response: Response) -> Optional[Any]:
+    if not response.body:
+        return None
+    if response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            return json.loads(response.body)
+        except ValueError:
+            pass
+    return response.body.decode("utf-8", errors="replace")
+
+async def _run_batch_item(request: Request, item: BatchItem) -> BatchItemResponse:
+    path = item.path.partition("?")[0]
+    service = path.split("/")[1] if len(path.split("/")) > 1 else None
+    if service not in service_discovery.services:
+        return BatchItemResponse(id=item.id, status=404, body={"detail": "Not Found"})
+    try:
+        response = await forward(_build_subrequest(request, item), service, path, stream=False)
+    except Exception as e:
+        logger.error(f"Error forwarding batch item {item.id} to {service}: {str(e)}")
+        return BatchItemResponse(
+            id=item.id, status=502, body={"detail": f"Error forwarding request to {service}"}
+        )
+    return BatchItemResponse(
+        id=item.id,
+        status=response.status_code,
+        headers={"content-type": response.headers.get("content-type", "")},
+        body=_decode_body(response)
+    )
+
+@app.post("/batch", response_model=BatchResponse)
+async def batch(request: Request, batch_request: BatchRequest):
+    """Run sub-requests concurrently, holding back only those that depend on others"""
+    items = batch_request.requests
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {settings.BATCH_MAX_REQUESTS} requests"
+        )
+    seen: Set[str] = set()
+    for item in items:
+        if item.id in seen:
+            raise HTTPException(status_code=400, detail=f"Duplicate batch id: {item.id}")
+        # Dependencies must point backwards, which also rules out cycles
+        unknown = [dep for dep in item.depends_on if dep not in seen]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch item {item.id} depends on unknown or later items: {', '.join(unknown)}"
+            )
+        seen.add(item.id)
+    
+    set_deadline(request)
+    tasks: Dict[str, asyncio.Task] = {}
+    
+    async def run(item: BatchItem) -> BatchItemResponse:
+        for dep in item.depends_on:
+            if (await tasks[dep]).status >= 400:
+                return BatchItemResponse(
+                    id=item.id, status=424, body={"detail": f"Dependency {dep} failed"}
+                )
+        return await _run_batch_item(request, item)
+    
+    for item in items:
+        tasks[item.id] = asyncio.ensure_future(run(item))
+    responses = await asyncio.gather(*tasks.values())
+    return BatchResponse(responses=responses)
+
 # Error handling
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
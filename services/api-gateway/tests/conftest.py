@@ -0,0 +1,64 @@
+import os
+import sys
+
+# Services are run from their own directory, so make `app` and `main` importable the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contextlib
+import json
+import socket
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+import httpx
+import pytest
+import uvicorn
+
+import main
+from app.core.service_discovery import Endpoint
+
+def respond(status_code: int, body: Any = b"", headers: Optional[dict] = None, chunks: Optional[Iterable[bytes]] = None) -> httpx.Response:
+    """An upstream response with a body still to be streamed, like one read off the network"""
+    headers = dict(headers or {})
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+        headers.setdefault("content-type", "application/json")
+    parts = list(chunks) if chunks is not None else [body]
+
+    async def stream():
+        for part in parts:
+            yield part
+
+    return httpx.Response(status_code, headers=headers, content=stream())
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Point a service at fresh replicas answered by a handler instead of the network"""
+
+    def install(service: str, handler, replicas: int = 1):
+        endpoints = [Endpoint(service, f"http://{service}-{index}") for index in range(replicas)]
+        monkeypatch.setitem(main.service_discovery.services, service, endpoints)
+        monkeypatch.setitem(
+            main.upstream_pool.clients, service, httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        return endpoints
+
+    return install
+
+@contextlib.contextmanager
+def serve(app):
+    """Run an ASGI app on a real socket in a background thread, for behaviour the TestClient can't show"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        thread.join(5)
+        sock.close()
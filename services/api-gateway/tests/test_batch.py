@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import respond
+
+client = TestClient(main.app)
+
+@pytest.fixture
+def services(upstream):
+    """Slow note and content upstreams that record the order requests arrive in"""
+    received = []
+
+    async def handler(request: httpx.Request):
+        received.append((request.method, request.url.path, request.headers.get("authorization")))
+        await asyncio.sleep(0.05)
+        if request.url.path.endswith("/missing"):
+            return respond(404, {"detail": "Note not found"})
+        if request.method == "POST":
+            return respond(201, {"id": "n2", "title": (await request.aread()).decode()})
+        return respond(200, {"path": request.url.path})
+
+    upstream("notes", handler)
+    upstream("content", handler)
+    return received
+
+def test_sub_requests_run_and_answer_in_order(services):
+    response = client.post(
+        "/batch",
+        json={"requests": [
+            {"id": "a", "path": "/notes/n1"},
+            {"id": "b", "path": "/content/c1"},
+            {"id": "c", "method": "POST", "path": "/notes", "body": {"title": "t"}},
+        ]},
+        headers={"Authorization": "Bearer alice"}
+    )
+
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [item["id"] for item in responses] == ["a", "b", "c"]
+    assert [item["status"] for item in responses] == [200, 200, 201]
+    assert responses[0]["body"] == {"path": "/notes/n1"}
+    assert responses[2]["body"] == {"id": "n2", "title": '{"title": "t"}'}
+    # Every sub-request carries the caller's credentials
+    assert {authorization for _, _, authorization in services} == {"Bearer alice"}
+
+def test_independent_sub_requests_run_concurrently(services):
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as http:
+            return await http.post("/batch", json={"requests": [
+                {"id": str(index), "path": f"/notes/n{index}"} for index in range(5)
+            ]})
+
+    started = time.monotonic()
+    response = asyncio.run(scenario())
+    elapsed = time.monotonic() - started
+
+    assert response.status_code == 200
+    # Five 50ms upstream calls in well under the 250ms a sequential batch would take
+    assert elapsed < 0.2
+
+def test_dependents_wait_for_and_skip_after_failed_dependencies(services):
+    response = client.post("/batch", json={"requests": [
+        {"id": "missing", "path": "/notes/missing"},
+        {"id": "after", "path": "/notes/n1", "depends_on": ["missing"]},
+        {"id": "unknown", "path": "/unknown/x"},
+    ]})
+
+    statuses = {item["id"]: item["status"] for item in response.json()["responses"]}
+    assert statuses == {"missing": 404, "after": 424, "unknown": 404}
+    assert [path for _, path, _ in services] == ["/notes/missing"]
+
+def test_invalid_batches_are_rejected(services, monkeypatch):
+    duplicate = client.post("/batch", json={"requests": [
+        {"id": "a", "path": "/notes/n1"}, {"id": "a", "path": "/notes/n2"}
+    ]})
+    forward_reference = client.post("/batch", json={"requests": [
+        {"id": "a", "path": "/notes/n1", "depends_on": ["b"]}, {"id": "b", "path": "/notes/n2"}
+    ]})
+    monkeypatch.setattr(main.settings, "BATCH_MAX_REQUESTS", 1)
+    too_many = client.post("/batch", json={"requests": [
+        {"id": "a", "path": "/notes/n1"}, {"id": "b", "path": "/notes/n2"}
+    ]})
+
+    assert duplicate.status_code == 400
+    assert forward_reference.status_code == 400
+    assert too_many.status_code == 413
+    assert services == []
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from app.core.cache import ResponseCache, is_cacheable
+from conftest import respond
+
+@pytest.fixture
+def cached_notes(upstream, monkeypatch):
+    """Response cache switched on over a notes upstream that counts its reads"""
+    monkeypatch.setattr(main.settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "response_cache", ResponseCache(max_bytes=1024 * 1024, ttl=60))
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append((request.method, request.url.path))
+        if request.method == "GET":
+            return respond(200, {"id": "n1", "version": len(calls)})
+        return respond(200, {"status": "success"})
+
+    upstream("notes", handler)
+    return calls
+
+def call(*requests):
+    """Send (method, path, headers) requests through the gateway one after another"""
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as client:
+            return [await client.request(method, path, headers=headers) for method, path, headers in requests]
+
+    return asyncio.run(scenario())
+
+def test_repeated_reads_are_served_from_the_cache(cached_notes):
+    first, second = call(("GET", "/notes/n1", {}), ("GET", "/notes/n1", {}))
+
+    assert first.json() == second.json() == {"id": "n1", "version": 1}
+    assert first.headers["etag"] == second.headers["etag"]
+    assert len(cached_notes) == 1
+
+def test_matching_etag_gets_not_modified(cached_notes):
+    first, = call(("GET", "/notes/n1", {}))
+
+    revalidated, = call(("GET", "/notes/n1", {"If-None-Match": first.headers["etag"]}))
+
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == first.headers["etag"]
+
+def test_entries_are_scoped_to_the_callers_credentials(cached_notes):
+    alice, bob = call(
+        ("GET", "/notes/n1", {"Authorization": "Bearer alice"}),
+        ("GET", "/notes/n1", {"Authorization": "Bearer bob"})
+    )
+
+    assert alice.json()["version"] == 1
+    assert bob.json()["version"] == 2
+
+def test_writes_invalidate_cached_reads_of_the_same_path(cached_notes):
+    before, _, after = call(
+        ("GET", "/notes/n1", {}),
+        ("PUT", "/notes/n1", {}),
+        ("GET", "/notes/n1", {})
+    )
+
+    assert before.json()["version"] == 1
+    assert after.json()["version"] == 3
+    assert cached_notes == [("GET", "/notes/n1"), ("PUT", "/notes/n1"), ("GET", "/notes/n1")]
+
+def test_collection_endpoints_are_not_cached():
+    assert is_cacheable("/notes/n1")
+    assert is_cacheable("/content/c1")
+    assert not is_cacheable("/notes")
+    assert not is_cacheable("/notes/search")
+    assert not is_cacheable("/notes/changes")
+    assert not is_cacheable("/ai/results/r1")
+
+def test_least_recently_used_entries_are_evicted_over_budget():
+    evicted = []
+    cache = ResponseCache(max_bytes=250, ttl=60, on_evict=lambda: evicted.append(1))
+    keys = [ResponseCache.key("alice", f"/notes/n{index}", "") for index in range(3)]
+    cache.put(keys[0], 200, {}, b"a" * 100)
+    cache.put(keys[1], 200, {}, b"b" * 100)
+    cache.get(keys[0])
+
+    cache.put(keys[2], 200, {}, b"c" * 100)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert cache.size <= 250
+    assert len(evicted) == 1
+
+def test_oversized_responses_are_not_stored():
+    cache = ResponseCache(max_bytes=1000, ttl=60, max_entry_bytes=100)
+    key = ResponseCache.key("alice", "/notes/n1", "")
+
+    entry = cache.put(key, 200, {}, b"x" * 200)
+
+    assert entry.body == b"x" * 200
+    assert cache.get(key) is None
+    assert cache.size == 0
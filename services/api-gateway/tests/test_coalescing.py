@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from conftest import respond
+
+@pytest.fixture
+def counted(upstream):
+    """A slow /content upstream counting the calls it receives"""
+    calls = []
+
+    async def handler(request: httpx.Request):
+        calls.append(request)
+        await asyncio.sleep(0.1)
+        if request.headers.get("if-none-match") == '"v1"':
+            return respond(304)
+        return respond(200, {"id": "c1"}, headers={"etag": '"v1"'})
+
+    upstream("content", handler)
+    return calls
+
+def get_concurrently(*headers):
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as client:
+            return await asyncio.gather(*[client.get("/content/c1", headers=h) for h in headers])
+
+    return asyncio.run(scenario())
+
+def test_coalescing_is_off_by_default(counted):
+    get_concurrently({}, {})
+    assert len(counted) == 2
+
+def test_identical_concurrent_gets_share_one_upstream_call(counted, monkeypatch):
+    monkeypatch.setattr(main.settings, "COALESCING_ENABLED", True)
+    responses = get_concurrently({}, {}, {})
+    assert [response.json() for response in responses] == [{"id": "c1"}] * 3
+    assert len(counted) == 1
+
+def test_conditional_requests_are_not_answered_with_another_callers_response(counted, monkeypatch):
+    monkeypatch.setattr(main.settings, "COALESCING_ENABLED", True)
+    conditional, plain = get_concurrently({"If-None-Match": '"v1"'}, {})
+    assert conditional.status_code == 304
+    assert plain.status_code == 200
+    assert len(counted) == 2
+
+def test_requests_with_different_budgets_are_not_coalesced(counted, monkeypatch):
+    monkeypatch.setattr(main.settings, "COALESCING_ENABLED", True)
+    short, long = get_concurrently({"X-Request-Budget-Ms": "1"}, {"X-Request-Budget-Ms": "5000"})
+    assert short.status_code == 504
+    assert long.status_code == 200
@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import json
+
+import httpx
+import pytest
+
+import main
+from app.core.compression import negotiate
+from conftest import respond
+
+NOTES = [{"id": f"n{index}", "content": "meeting notes " * 20} for index in range(20)]
+
+def get(path: str, headers: dict):
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as client:
+            # Read the body as sent, without httpx decoding it
+            async with client.stream("GET", path, headers=headers) as response:
+                return response, b"".join([chunk async for chunk in response.aiter_raw()])
+
+    return asyncio.run(scenario())
+
+@pytest.fixture
+def notes(upstream):
+    def handler(request: httpx.Request):
+        if request.url.path == "/notes/export":
+            lines = [json.dumps(note).encode() + b"\n" for note in NOTES]
+            return respond(200, headers={"content-type": "application/x-ndjson"}, chunks=lines)
+        if request.url.path == "/notes/tiny":
+            body = b'{"id": "tiny"}'
+            return respond(200, body, headers={"content-type": "application/json", "content-length": str(len(body))})
+        if request.url.path == "/notes/packed":
+            return respond(200, gzip.compress(b"{}"), headers={"content-type": "application/json", "content-encoding": "gzip"})
+        return respond(200, NOTES, headers={"etag": '"v1"'})
+
+    upstream("notes", handler)
+
+def test_large_json_is_compressed_in_the_encoding_the_client_prefers(notes):
+    response, raw = get("/notes", {"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(raw)) == NOTES
+    assert len(raw) < len(json.dumps(NOTES))
+
+def test_compressed_responses_only_carry_a_weak_etag(notes):
+    response, _ = get("/notes", {"Accept-Encoding": "gzip"})
+
+    assert response.headers["etag"] == 'W/"v1"'
+
+def test_clients_without_a_supported_encoding_get_identity(notes):
+    response, raw = get("/notes", {"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert json.loads(raw) == NOTES
+    assert response.headers["etag"] == '"v1"'
+
+def test_small_and_already_encoded_bodies_are_left_alone(notes):
+    tiny, raw = get("/notes/tiny", {"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in tiny.headers
+    assert json.loads(raw) == {"id": "tiny"}
+
+    packed, raw = get("/notes/packed", {"Accept-Encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(raw) == b"{}"
+
+def test_streamed_ndjson_is_compressed_as_it_flows(notes):
+    response, raw = get("/notes/export", {"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert [json.loads(line) for line in gzip.decompress(raw).splitlines()] == NOTES
+
+def test_negotiation_honours_q_values():
+    assert negotiate("gzip;q=0.5, identity") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("*") is not None
+    assert negotiate(None) is None
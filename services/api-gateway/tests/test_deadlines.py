@@ -0,0 +1,36 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+from conftest import respond
+from app.core.service_discovery import CircuitBreaker
+
+client = TestClient(main.app)
+
+async def slow(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(0.2)
+    return respond(200, {"budget": request.headers.get("x-request-budget-ms")})
+
+def test_budget_is_forwarded_to_the_upstream(upstream):
+    upstream("notes", slow)
+    response = client.get("/notes/1", headers={"X-Request-Budget-Ms": "5000"})
+    assert response.status_code == 200
+    assert 4000 < int(response.json()["budget"]) <= 5000
+
+def test_client_budget_running_out_does_not_open_the_breaker(upstream):
+    endpoint, = upstream("notes", slow)
+    for _ in range(main.settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD + 1):
+        response = client.get("/notes/1", headers={"X-Request-Budget-Ms": "1"})
+        assert response.status_code == 504
+    assert endpoint.breaker.state == CircuitBreaker.CLOSED
+    assert endpoint.outstanding == 0
+
+def test_upstream_errors_open_the_breaker(upstream):
+    endpoint, = upstream("notes", lambda request: respond(503))
+    for _ in range(main.settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD):
+        assert client.get("/notes/1").status_code == 503
+    assert endpoint.breaker.state == CircuitBreaker.OPEN
+    assert client.get("/notes/1").status_code == 503
+    assert endpoint.outstanding == 0
@@ -0,0 +1,125 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+from app.core.service_discovery import Endpoint
+from app.core.upstream import DuplexStreamingResponse, RequestBody
+from conftest import respond, serve
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+client = TestClient(main.app)
+
+async def echo_import(scope, receive, send):
+    """Upstream answering each uploaded chunk as soon as it arrives, like the note service's import"""
+    if scope["type"] != "http":
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+    if scope["path"] == "/health":
+        await send({"type": "http.response.body", "body": b""})
+        return
+    while True:
+        message = await receive()
+        if message.get("body"):
+            await send({"type": "http.response.body", "body": b"got " + message["body"], "more_body": True})
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.body", "body": b""})
+
+async def read_until(reader: asyncio.StreamReader, marker: bytes) -> bytes:
+    data = b""
+    while marker not in data:
+        chunk = await asyncio.wait_for(reader.read(65536), 5)
+        assert chunk, f"connection closed before {marker!r}"
+        data += chunk
+    return data
+
+def test_import_results_reach_the_client_while_it_is_still_uploading(monkeypatch):
+    monkeypatch.setattr(main.settings, "COMPRESSION_ENABLED", False)
+    with serve(echo_import) as upstream_port:
+        monkeypatch.setitem(main.service_discovery.services, "notes", [Endpoint("notes", f"http://127.0.0.1:{upstream_port}")])
+        with serve(main.app) as gateway_port:
+
+            async def scenario():
+                reader, writer = await asyncio.open_connection("127.0.0.1", gateway_port)
+                writer.write(
+                    b"POST /notes/import HTTP/1.1\r\nhost: gateway\r\n"
+                    b"content-type: application/x-ndjson\r\ntransfer-encoding: chunked\r\n\r\n"
+                    b"6\r\nline1\n\r\n"
+                )
+                await writer.drain()
+                # The upload is still open, yet the first result arrives
+                head = await read_until(reader, b"got line1")
+                assert head.startswith(b"HTTP/1.1 200")
+                writer.write(b"6\r\nline2\n\r\n0\r\n\r\n")
+                await writer.drain()
+                await read_until(reader, b"got line2")
+                writer.close()
+
+            asyncio.run(scenario())
+
+def test_other_uploads_go_through_the_pooled_client(upstream):
+    received = []
+
+    async def handler(request: httpx.Request):
+        received.append(await request.aread())
+        return respond(201, {"id": "1"})
+
+    upstream("notes", handler)
+    # Streamed upstream like an import, but nothing answers before the upload ends
+    response = client.post("/notes/bulk", data=b'{"title": "a"}\n{"title": "b"}\n', headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 201
+    assert received == [b'{"title": "a"}\n{"title": "b"}\n']
+
+def test_streaming_responses_stop_when_the_client_disconnects():
+    async def endless():
+        while True:
+            yield b"x"
+            await asyncio.sleep(0.01)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        response = StreamingResponse(endless())
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 1)
+
+    asyncio.run(scenario())
+
+def test_duplex_responses_listen_for_disconnects_once_the_body_is_read():
+    messages = [
+        {"type": "http.request", "body": b"a", "more_body": True},
+        {"type": "http.request", "body": b"b", "more_body": False},
+    ]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        body = RequestBody(Request({"type": "http", "method": "POST", "headers": []}, receive))
+        uploaded = []
+
+        async def relay():
+            async for chunk in body.stream():
+                uploaded.append(chunk)
+                yield chunk
+            while True:
+                await asyncio.sleep(0.01)
+                yield b"x"
+
+        response = DuplexStreamingResponse(relay(), body)
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 1)
+        # The whole body reached the relay rather than the disconnect listener
+        assert b"".join(uploaded) == b"ab"
+
+    asyncio.run(scenario())
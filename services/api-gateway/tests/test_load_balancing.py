@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from app.core import service_discovery as discovery
+from app.core.service_discovery import CircuitBreaker, Endpoint, ServiceDiscovery, ServiceUnavailableError
+from conftest import respond
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(discovery.time, "monotonic", clock)
+    return clock
+
+def get(path: str, times: int = 1):
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as client:
+            return [await client.get(path) for _ in range(times)]
+
+    return asyncio.run(scenario())
+
+def test_two_choices_prefer_the_less_loaded_replica():
+    services = ServiceDiscovery({"notes": ["http://notes-0", "http://notes-1"]})
+    busy, idle = services.services["notes"]
+    busy.outstanding = 10
+
+    chosen = {services.choose("notes").url for _ in range(20)}
+
+    assert chosen == {idle.url}
+
+def test_unavailable_replicas_are_skipped():
+    services = ServiceDiscovery({"notes": ["http://notes-0", "http://notes-1"]})
+    down, up = services.services["notes"]
+    down.healthy = False
+
+    assert services.acquire("notes").url == up.url
+    assert up.outstanding == 1
+
+    up.removed = True
+    with pytest.raises(ServiceUnavailableError):
+        services.choose("notes")
+
+def test_breaker_opens_after_repeated_failures_and_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.on_dispatch()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    breaker.allow_request()
+    breaker.on_dispatch()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_abandoned_probe_frees_the_half_open_slot(clock):
+    endpoint = Endpoint("notes", "http://notes-0")
+    for _ in range(endpoint.breaker.failure_threshold):
+        endpoint.record_outcome(success=False)
+    clock.now += endpoint.breaker.reset_timeout
+    assert endpoint.available
+    endpoint.breaker.on_dispatch()
+    assert not endpoint.available
+
+    endpoint.abandon()
+
+    assert endpoint.available
+
+def test_server_errors_feed_the_breaker_until_it_opens(upstream):
+    endpoint, = upstream("notes", lambda request: respond(500, {"detail": "boom"}))
+    threshold = endpoint.breaker.failure_threshold
+
+    responses = get("/notes/n1", threshold + 1)
+
+    assert [response.status_code for response in responses] == [500] * threshold + [503]
+    assert endpoint.breaker.state == CircuitBreaker.OPEN
+
+def test_connection_failures_are_retried_on_another_replica(upstream):
+    def handler(request: httpx.Request):
+        if request.url.host == "notes-0":
+            raise httpx.ConnectError("Connection refused", request=request)
+        return respond(200, {"id": "n1"})
+
+    endpoints = upstream("notes", handler, replicas=2)
+    endpoints[1].outstanding = 5  # make two choices try the refusing replica first
+
+    response, = get("/notes/n1")
+
+    assert response.status_code == 200
+    assert endpoints[0].breaker.failures == 1
+    assert [endpoint.outstanding for endpoint in endpoints] == [0, 5]
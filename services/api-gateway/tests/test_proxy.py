@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import main
+from app.core.service_discovery import Endpoint
+from conftest import respond, serve
+
+def call(*requests):
+    """Send (method, path, headers) requests through the gateway one after another"""
+    async def scenario():
+        async with httpx.AsyncClient(app=main.app, base_url="http://gateway") as client:
+            return [await client.request(method, path, headers=headers) for method, path, headers in requests]
+
+    return asyncio.run(scenario())
+
+@pytest.fixture
+def notes(upstream, monkeypatch):
+    received = []
+
+    async def handler(request: httpx.Request):
+        received.append(request)
+        return respond(
+            200,
+            chunks=[b'{"id": ', b'"n1"}'],
+            headers={"content-type": "application/json", "keep-alive": "timeout=5", "x-note-version": "3"}
+        )
+
+    endpoints = upstream("notes", handler)
+    monkeypatch.setitem(main.upstream_pool.in_flight, "notes", 0)
+    return received, endpoints
+
+def test_requests_share_the_service_pool_and_hand_connections_back(notes):
+    received, endpoints = notes
+    client = main.upstream_pool.client("notes")
+
+    responses = call(*[("GET", "/notes/n1", {})] * 3)
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert len(received) == 3
+    assert main.upstream_pool.client("notes") is client
+    assert main.upstream_pool.in_flight["notes"] == 0
+    assert endpoints[0].outstanding == 0
+
+def test_bodies_and_headers_pass_through_without_hop_by_hop_headers(notes):
+    received, _ = notes
+
+    response, = call(("GET", "/notes/n1?fields=title", {"Keep-Alive": "timeout=99", "X-Trace": "t1"}))
+
+    assert response.json() == {"id": "n1"}
+    assert response.headers["x-note-version"] == "3"
+    assert "keep-alive" not in response.headers
+    assert received[0].url.query == b"fields=title"
+    assert received[0].headers["x-trace"] == "t1"
+    assert "keep-alive" not in received[0].headers
+
+def test_buffered_mode_returns_the_same_response(notes, monkeypatch):
+    monkeypatch.setattr(main.settings, "PROXY_STREAMING", False)
+
+    response, = call(("GET", "/notes/n1", {}))
+
+    assert response.json() == {"id": "n1"}
+    assert "keep-alive" not in response.headers
+
+def test_streamed_responses_reach_the_client_before_the_upstream_finishes(monkeypatch):
+    monkeypatch.setattr(main.settings, "COMPRESSION_ENABLED", False)
+    release = threading.Event()
+
+    async def slow_export(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        if scope["path"] == "/health":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.body", "body": b"first\n", "more_body": True})
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        await send({"type": "http.response.body", "body": b"second\n"})
+
+    with serve(slow_export) as upstream_port:
+        monkeypatch.setitem(main.service_discovery.services, "notes", [Endpoint("notes", f"http://127.0.0.1:{upstream_port}")])
+        with serve(main.app) as gateway_port:
+            with httpx.Client(timeout=5) as client:
+                with client.stream("GET", f"http://127.0.0.1:{gateway_port}/notes/export") as response:
+                    chunks = response.iter_raw()
+                    assert next(chunks) == b"first\n"
+                    release.set()
+                    assert b"".join(chunks) == b"second\n"
@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import middleware
+from app.core.middleware import InMemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(middleware.time, "monotonic", clock)
+    return clock
+
+class FakeRedis:
+    """Just enough of redis.asyncio to run the token bucket script against a dict"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.hashes = {}
+        self.down = False
+        self.closed = False
+
+    def register_script(self, script):
+        async def run(keys, args):
+            if self.down:
+                raise ConnectionError("Connection refused")
+            # Same steps as RedisRateLimitBackend.SCRIPT
+            rate, capacity = float(args[0]), float(args[1])
+            now = self.clock()
+            bucket = self.hashes.get(keys[0], {})
+            tokens = bucket.get("tokens", capacity)
+            updated = bucket.get("updated", now)
+            tokens = min(capacity, tokens + max(0, now - updated) * rate)
+            allowed = 0
+            if tokens >= 1:
+                tokens -= 1
+                allowed = 1
+            self.hashes[keys[0]] = {"tokens": tokens, "updated": now}
+            return allowed
+
+        return run
+
+    async def close(self):
+        self.closed = True
+
+@pytest.fixture
+def fake_redis(monkeypatch, clock):
+    import redis.asyncio
+
+    fake = FakeRedis(clock)
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: fake)
+    return fake
+
+def take(backend, client_id: str, times: int):
+    async def run():
+        return [await backend.acquire(client_id) for _ in range(times)]
+
+    return asyncio.run(run())
+
+def test_bucket_refills_at_the_configured_rate(clock):
+    backend = InMemoryRateLimitBackend(rate_per_minute=60, burst=3, num_shards=4)
+
+    assert take(backend, "alice", 4) == [True, True, True, False]
+    # Other clients have buckets of their own
+    assert take(backend, "bob", 1) == [True]
+
+    clock.now += 2
+    assert take(backend, "alice", 3) == [True, True, False]
+
+    # A long idle spell refills only up to the burst size
+    clock.now += 600
+    assert take(backend, "alice", 4) == [True, True, True, False]
+
+def test_idle_clients_are_evicted_one_shard_at_a_time(clock):
+    backend = InMemoryRateLimitBackend(rate_per_minute=60, burst=3, num_shards=4)
+    for client_id in ("alice", "bob", "carol", "dave", "erin"):
+        take(backend, client_id, 1)
+    clock.now += 400
+    take(backend, "alice", 1)
+    assert len(backend) == 5
+
+    evicted = sum(backend.evict_idle(index, 300) for index in range(len(backend.shards)))
+
+    assert evicted == 4
+    assert len(backend) == 1
+    # An evicted client comes back with a full bucket
+    assert take(backend, "bob", 3) == [True, True, True]
+
+def test_redis_backend_shares_one_limit_between_replicas(fake_redis, clock):
+    replicas = [RedisRateLimitBackend("redis://redis:6379/0", 60, 2, 300) for _ in range(2)]
+
+    assert take(replicas[0], "alice", 1) == [True]
+    assert take(replicas[1], "alice", 2) == [True, False]
+
+    clock.now += 1
+    assert take(replicas[0], "alice", 2) == [True, False]
+
+def test_redis_backend_fails_open(fake_redis):
+    backend = RedisRateLimitBackend("redis://redis:6379/0", 60, 1, 300)
+    assert take(backend, "alice", 2) == [True, False]
+
+    fake_redis.down = True
+
+    assert take(backend, "alice", 3) == [True, True, True]
+
+def test_middleware_rejects_clients_over_their_limit(monkeypatch, fake_redis):
+    limiter = RateLimiter(RedisRateLimitBackend("redis://redis:6379/0", 60, 2, 300))
+    monkeypatch.setattr(middleware, "rate_limiter", limiter)
+    app = FastAPI()
+    app.middleware("http")(middleware.rate_limit_middleware)
+
+    @app.get("/notes")
+    async def notes():
+        return []
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://gateway") as client:
+            statuses = [(await client.get("/notes")).status_code for _ in range(3)]
+            keyed = await client.get("/notes", headers={"X-API-Key": "key-1"})
+        await limiter.stop()
+        return statuses, keyed.status_code
+
+    statuses, keyed = asyncio.run(run())
+
+    assert statuses == [200, 200, 429]
+    # Requests with an API key are limited per key rather than per address
+    assert keyed == 200
+    assert fake_redis.closed
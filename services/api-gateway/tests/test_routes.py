@@ -0,0 +1,41 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import main
+from app.core.routes import route_template
+from conftest import respond
+
+client = TestClient(main.app)
+
+def requests_counted(method: str, endpoint: str, status: str) -> float:
+    labels = {"method": method, "endpoint": endpoint, "status": status}
+    return REGISTRY.get_sample_value("http_requests_total", labels) or 0
+
+def test_forwarded_paths_map_to_their_route_templates():
+    assert route_template("/notes") == "/notes"
+    assert route_template("/notes/") == "/notes"
+    assert route_template("/notes/search") == "/notes/search"
+    assert route_template("/notes/8f14e45f/related") == "/notes/{note_id}/related"
+    assert route_template("/notes/8f14e45f") == "/notes/{note_id}"
+    assert route_template("/ai/results/r1") == "/ai/results/{result_id}"
+
+def test_unknown_paths_fall_back_to_one_label_per_service():
+    assert route_template("/notes/a/b/c", "notes") == "/notes/*"
+    assert route_template("/wp-admin/login.php") == "unmatched"
+
+def test_metrics_are_labelled_by_template_not_raw_path(upstream):
+    upstream("notes", lambda request: respond(200, {}))
+    before = requests_counted("GET", "/notes/{note_id}", "200")
+
+    for note_id in ("n1", "n2", "n3"):
+        assert client.get(f"/notes/{note_id}").status_code == 200
+
+    assert requests_counted("GET", "/notes/{note_id}", "200") == before + 3
+    assert REGISTRY.get_sample_value("http_requests_total", {"method": "GET", "endpoint": "/notes/n1", "status": "200"}) is None
+
+def test_gateway_routes_are_labelled_by_their_path():
+    before = requests_counted("DELETE", "/admin/services/{service}/endpoints", "403")
+
+    client.delete("/admin/services/notes/endpoints", params={"url": "http://notes-9"})
+
+    assert requests_counted("DELETE", "/admin/services/{service}/endpoints", "403") == before + 1
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+import hashlib
+import time
+
+# Returned on a cache miss, since None is a valid cached value for unknown users
+MISSING = object()
+
+class ExpiringLRU:
+    """Bounded LRU map where every entry carries its own wall-clock expiry"""
+
+    def __init__(self, max_entries: int, on_remove: Optional[Callable[[Hashable, Any], None]] = None):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        # Called with each entry that expires, is evicted or is popped
+        self.on_remove = on_remove
+        self.hits = 0
+        self.misses = 0
+
+    def _removed(self, key: Hashable, value: Any):
+        if self.on_remove is not None:
+            self.on_remove(key, value)
+
+    def get(self, key: Hashable) -> Any:
+        item = self.entries.get(key)
+        if item is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = item
+        if expires_at <= time.time():
+            del self.entries[key]
+            self._removed(key, value)
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, expires_at: float):
+        if expires_at <= time.time():
+            return
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, (evicted_value, _) = self.entries.popitem(last=False)
+            self._removed(evicted, evicted_value)
+
+    def pop(self, key: Hashable):
+        item = self.entries.pop(key, None)
+        if item is not None:
+            self._removed(key, item[0])
+
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class ClaimsCache:
+    """Verified token claims keyed by token digest, each valid until the token's exp"""
+
+    def __init__(self, max_entries: int):
+        self._entries = ExpiringLRU(max_entries, on_remove=self._forget)
+        # Digests of the cached tokens of each user, so disabling a user doesn't scan the cache
+        self._by_subject: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        # Keep raw bearer tokens out of process memory dumps
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _forget(self, digest: str, claims: Dict[str, Any]):
+        digests = self._by_subject.get(claims.get("sub"))
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_subject[claims.get("sub")]
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        claims = self._entries.get(self._digest(token))
+        return None if claims is MISSING else claims
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        digest = self._digest(token)
+        self._entries.put(digest, claims, float(claims["exp"]))
+        if digest in self._entries.entries:
+            self._by_subject.setdefault(claims.get("sub"), set()).add(digest)
+
+    def invalidate_subject(self, subject: str):
+        """Drop the cached claims of every token issued to one user"""
+        for digest in list(self._by_subject.get(subject, ())):
+            self._entries.pop(digest)
+
+    def hit_ratio(self) -> float:
+        return self._entries.hit_ratio()
+
+class UserCache:
+    """User records by username, remembering unknown usernames for a shorter time"""
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = ExpiringLRU(max_entries)
+
+    def get(self, username: str) -> Any:
+        """Return the cached user, None for a known-unknown user, or MISSING"""
+        return self._entries.get(username)
+
+    def put(self, username: str, user: Any):
+        ttl = self.ttl if user is not None else self.negative_ttl
+        self._entries.put(username, user, time.time() + ttl)
+
+    def invalidate(self, username: str):
+        self._entries.pop(username)
+
+    def hit_ratio(self) -> float:
+        return self._entries.hit_ratio()
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+import asyncio
+import functools
+from .config import settings
+
+class HashingPoolSaturatedError(Exception):
+    """Raised when too many hash operations are already queued"""
+
+class PasswordHasher:
+    """Run bcrypt on a bounded thread pool so logins never block the event loop.
+
+    bcrypt releases the GIL while hashing, so threads scale across cores. Work
+    beyond max_pending is rejected immediately rather than queued behind
+    seconds of hashing the client would time out on anyway.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HashingPoolSaturatedError("Password hashing pool is saturated")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password, returning a new hash when the stored one uses outdated cost parameters"""
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    async def dummy_verify(self):
+        await self._run(self.context.dummy_verify)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(
+    settings.BCRYPT_ROUNDS,
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,132 @@
+from typing import Any, Dict, List, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk
+import hashlib
+import logging
+import time
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Issued token ids are swept for expired ones whenever their count doubles past this
+MIN_PRUNE_SIZE = 1024
+
+def _key_id(public_key) -> str:
+    """Stable key id derived from the public key itself"""
+    der = public_key.public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+def _public_jwk(public_key, algorithm: str) -> Dict[str, Any]:
+    pem = public_key.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    key = jwk.construct(pem, algorithm).to_dict()
+    key.update({"kid": _key_id(public_key), "use": "sig", "alg": algorithm})
+    return key
+
+class KeyRing:
+    """Signing key for new tokens plus retired public keys still accepted for verification.
+
+    Other services fetch the public half from the JWKS endpoint and verify tokens
+    locally, so rotating means publishing the new key and keeping the old one
+    in JWT_RETIRED_PUBLIC_KEYS until its tokens have expired.
+    """
+
+    def __init__(
+        self,
+        private_key_pem: Optional[str],
+        retired_public_keys_pem: List[str],
+        algorithm: str,
+        allow_ephemeral: bool = False
+    ):
+        self.algorithm = algorithm
+        if private_key_pem:
+            self._private_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+        elif not allow_ephemeral:
+            # Each replica would sign with its own key and every restart would log all users out
+            raise ValueError("JWT_PRIVATE_KEY is not set (set JWT_ALLOW_EPHEMERAL_KEY=true for local development)")
+        else:
+            logger.warning("JWT_PRIVATE_KEY is not set, generating an ephemeral signing key")
+            self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.signing_pem = self._private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        ).decode()
+        public_key = self._private_key.public_key()
+        self.kid = _key_id(public_key)
+        public_keys = [public_key] + [
+            serialization.load_pem_public_key(pem.encode()) for pem in retired_public_keys_pem
+        ]
+        self.public_keys = {_key_id(key): _public_jwk(key, algorithm) for key in public_keys}
+
+    def jwks(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {"keys": list(self.public_keys.values())}
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.public_keys.get(kid)
+
+class RevocationList:
+    """Revoked token ids, remembered only until the tokens would have expired anyway"""
+
+    def __init__(self):
+        self.entries: Dict[str, float] = {}
+
+    def revoke(self, jti: str, exp: float):
+        self.entries[jti] = exp
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self.entries
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Drop expired entries and return the rest for the services that poll them"""
+        now = time.time()
+        self.entries = {jti: exp for jti, exp in self.entries.items() if exp > now}
+        return [{"jti": jti, "exp": exp} for jti, exp in self.entries.items()]
+
+class IssuedTokens:
+    """Unexpired token ids issued to each user, so all of a user's tokens can be revoked at once"""
+
+    def __init__(self):
+        self.by_subject: Dict[str, Dict[str, float]] = {}
+        self.count = 0
+        self._prune_at = MIN_PRUNE_SIZE
+
+    def add(self, subject: str, jti: str, exp: float):
+        tokens = self.by_subject.setdefault(subject, {})
+        tokens[jti] = exp
+        self.count += 1
+        if self.count >= self._prune_at:
+            self._prune()
+
+    def pop(self, subject: str) -> Dict[str, float]:
+        """Forget a user's tokens, returning those that have not expired yet"""
+        tokens = self.by_subject.pop(subject, {})
+        self.count -= len(tokens)
+        now = time.time()
+        return {jti: exp for jti, exp in tokens.items() if exp > now}
+
+    def _prune(self):
+        now = time.time()
+        live: Dict[str, Dict[str, float]] = {}
+        for subject, tokens in self.by_subject.items():
+            tokens = {jti: exp for jti, exp in tokens.items() if exp > now}
+            if tokens:
+                live[subject] = tokens
+        self.by_subject = live
+        self.count = sum(len(tokens) for tokens in live.values())
+        self._prune_at = max(MIN_PRUNE_SIZE, 2 * self.count)
+
+key_ring = KeyRing(
+    settings.JWT_PRIVATE_KEY,
+    settings.JWT_RETIRED_PUBLIC_KEYS,
+    settings.ALGORITHM,
+    settings.JWT_ALLOW_EPHEMERAL_KEY
+)
+revocation_list = RevocationList()
+issued_tokens = IssuedTokens()
@@ -0,0 +1,50 @@
+"""Measure login throughput of the password hashing pool.
+
+Run from services/auth-service:
+
+    python benchmarks/password_hashing.py --rounds 12 --workers 4 --logins 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.hashing import HashingPoolSaturatedError, PasswordHasher
+
+async def run(rounds: int, workers: int, logins: int, max_pending: int):
+    hasher = PasswordHasher(rounds, workers, max_pending)
+    hashed = await hasher.hash("benchmark-password")
+
+    async def login():
+        try:
+            verified, _ = await hasher.verify_and_update("benchmark-password", hashed)
+            return verified
+        except HashingPoolSaturatedError:
+            return None
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    completed = sum(1 for result in results if result)
+    rejected = sum(1 for result in results if result is None)
+    per_second = completed / elapsed
+    print(f"rounds={rounds} workers={workers} logins={logins}")
+    print(f"completed={completed} rejected={rejected} elapsed={elapsed:.2f}s")
+    print(f"logins/sec={per_second:.1f} logins/sec/core={per_second / workers:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--max-pending", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds, args.workers, args.logins, args.max_pending))
+
+if __name__ == "__main__":
+    main()
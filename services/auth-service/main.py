@@ -1,13 +1,18 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-import jwt
+from jose import jwt, JWTError
 from pydantic import BaseModel
 import logging
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 import time
+import uuid
+from app.core.config import settings
+from app.core.security import issued_tokens, key_ring, revocation_list
+from app.core.cache import MISSING, ClaimsCache, UserCache
+from app.core.hashing import HashingPoolSaturatedError, password_hasher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,6 +21,8 @@ logger = logging.getLogger(__name__)
 # Prometheus metrics
 AUTH_ATTEMPTS = Counter('auth_attempts_total', 'Total authentication attempts', ['status'])
 AUTH_LATENCY = Histogram('auth_request_duration_seconds', 'Authentication request latency')
+AUTH_CACHE_LOOKUPS = Counter('auth_cache_lookups_total', 'Auth cache lookups', ['cache', 'result'])
+AUTH_CACHE_HIT_RATIO = Gauge('auth_cache_hit_ratio', 'Share of auth cache lookups served from the cache', ['cache'])
 
 app = FastAPI(
     title="AutoNote Auth Service",
@@ -33,9 +40,8 @@ app.add_middleware(
 )
 
 # Security configuration
-SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ALGORITHM = settings.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -49,6 +55,12 @@ class User(BaseModel):
 class UserInDB(User):
     hashed_password: str
 
+class UserUpdate(BaseModel):
+    # Only the fields sent are changed
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    disabled: Optional[bool] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -62,15 +74,29 @@ fake_users_db = {
         "username": "testuser",
         "full_name": "Test User",
         "email": "test@example.com",
-        "hashed_password": "fakehashedsecret",
+        "hashed_password": "$2b$12$Tsnj1pYTSCr7NPWmc1wiGOhD3wzLYSuD/uzixzdOOy0xxSYhjSXEK",
         "disabled": False,
     }
 }
 
+# Caches for get_current_user, which every other service hits constantly
+claims_cache = ClaimsCache(settings.CLAIMS_CACHE_MAX_ENTRIES)
+user_cache = UserCache(
+    settings.USER_CACHE_MAX_ENTRIES,
+    settings.USER_CACHE_TTL_SECONDS,
+    settings.USER_CACHE_NEGATIVE_TTL_SECONDS
+)
+AUTH_CACHE_HIT_RATIO.labels(cache="claims").set_function(lambda: claims_cache.hit_ratio())
+AUTH_CACHE_HIT_RATIO.labels(cache="user").set_function(lambda: user_cache.hit_ratio())
+
 # Helper functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    # In production, use proper password hashing
-    return plain_password == hashed_password
+async def verify_password(username: str, plain_password: str, hashed_password: str) -> bool:
+    """Check a password off the event loop, upgrading its hash if cost parameters changed"""
+    verified, new_hash = await password_hasher.verify_and_update(plain_password, hashed_password)
+    if verified and new_hash:
+        fake_users_db[username]["hashed_password"] = new_hash
+        user_cache.invalidate(username)
+    return verified
 
 def get_user(db, username: str):
     if username in db:
@@ -78,11 +104,36 @@ def get_user(db, username: str):
         return UserInDB(**user_dict)
     return None
 
-def authenticate_user(fake_db, username: str, password: str):
+def get_cached_user(username: str) -> Optional[UserInDB]:
+    """Get a user through the user cache, which also remembers unknown usernames"""
+    user = user_cache.get(username)
+    if user is not MISSING:
+        AUTH_CACHE_LOOKUPS.labels(cache="user", result="hit").inc()
+        return user
+    AUTH_CACHE_LOOKUPS.labels(cache="user", result="miss").inc()
+    user = get_user(fake_users_db, username)
+    user_cache.put(username, user)
+    return user
+
+def update_user_record(username: str, changes: dict):
+    """Change a stored user; changes to users must drop the cached record"""
+    fake_users_db[username].update(changes)
+    user_cache.invalidate(username)
+    if changes.get("disabled"):
+        # Other services verify tokens locally and never see the flag, so revoke everything still valid
+        for jti, exp in issued_tokens.pop(username).items():
+            revocation_list.revoke(jti, exp)
+        claims_cache.invalidate_subject(username)
+
+async def authenticate_user(fake_db, username: str, password: str):
     user = get_user(fake_db, username)
     if not user:
+        # Spend the same time as a real check so unknown usernames are not revealed
+        await password_hasher.dummy_verify()
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(username, password, user.hashed_password):
+        return False
+    if user.disabled:
         return False
     return user
 
@@ -92,10 +143,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti lets a single token be revoked before it expires
+    jti = uuid.uuid4().hex
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": jti})
+    issued_tokens.add(data["sub"], jti, expire.replace(tzinfo=timezone.utc).timestamp())
+    encoded_jwt = jwt.encode(
+        to_encode, key_ring.signing_pem, algorithm=ALGORITHM, headers={"kid": key_ring.kid}
+    )
     return encoded_jwt
 
+def decode_token(token: str) -> dict:
+    """Verify a token against the published keys and the revocation list"""
+    key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise JWTError("Unknown signing key")
+    payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise JWTError("Token has been revoked")
+    return payload
+
+def verify_claims(token: str) -> dict:
+    """Decode a token through the claims cache; revocation is checked on every call"""
+    payload = claims_cache.get(token)
+    if payload is None:
+        AUTH_CACHE_LOOKUPS.labels(cache="claims", result="miss").inc()
+        payload = decode_token(token)
+        claims_cache.put(token, payload)
+    else:
+        AUTH_CACHE_LOOKUPS.labels(cache="claims", result="hit").inc()
+        if revocation_list.is_revoked(payload.get("jti")):
+            raise JWTError("Token has been revoked")
+    return payload
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,23 +182,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = verify_claims(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
-    except jwt.JWTError:
+    except JWTError:
         raise credentials_exception
-    user = get_user(fake_users_db, username=token_data.username)
+    user = get_cached_user(token_data.username)
     if user is None:
         raise credentials_exception
+    if user.disabled:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     return user
 
 # Endpoints
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     start_time = time.time()
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(fake_users_db, form_data.username, form_data.password)
+    except HashingPoolSaturatedError:
+        AUTH_ATTEMPTS.labels(status="rejected").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, retry shortly",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         AUTH_ATTEMPTS.labels(status="failed").inc()
         raise HTTPException(
@@ -139,6 +228,46 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@app.patch("/users/{username}", response_model=User)
+async def update_user(username: str, user_update: UserUpdate, current_user: User = Depends(get_current_user)):
+    """Change a user's details; only admins may change other users or enable and disable accounts"""
+    changes = user_update.dict(exclude_unset=True)
+    is_admin = current_user.username in settings.ADMIN_USERNAMES
+    if not is_admin and (username != current_user.username or "disabled" in changes):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this user")
+    if username not in fake_users_db:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    update_user_record(username, changes)
+    return get_user(fake_users_db, username)
+
+@app.post("/token/revoke")
+async def revoke_token(token: str = Depends(oauth2_scheme)):
+    """Revoke the presented token; other services pick this up on their next poll"""
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    revocation_list.revoke(payload["jti"], payload["exp"])
+    return {"status": "revoked"}
+
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    """Public keys other services use to verify tokens locally"""
+    return key_ring.jwks()
+
+@app.get("/revocations")
+async def revocations():
+    """Revoked token ids that have not expired yet"""
+    return {"revoked": revocation_list.active()}
+
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"} 
\ No newline at end of file
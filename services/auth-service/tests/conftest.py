@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Services are run from their own directory, so make `app` and `main` importable the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests sign tokens with a throwaway key
+os.environ.setdefault("JWT_ALLOW_EPHEMERAL_KEY", "true")
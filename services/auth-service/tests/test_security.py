@@ -0,0 +1,9 @@
+import pytest
+
+from app.core.security import KeyRing
+
+def test_key_ring_requires_a_private_key_unless_ephemeral_keys_are_allowed():
+    with pytest.raises(ValueError):
+        KeyRing(None, [], "RS256")
+    key_ring = KeyRing(None, [], "RS256", allow_ephemeral=True)
+    assert key_ring.verification_key(key_ring.kid)["alg"] == "RS256"
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.core.cache import ClaimsCache, UserCache
+from app.core.security import IssuedTokens, RevocationList
+
+client = TestClient(main.app)
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(main, "claims_cache", ClaimsCache(100))
+    monkeypatch.setattr(main, "user_cache", UserCache(100, 60, 10))
+    monkeypatch.setattr(main, "issued_tokens", IssuedTokens())
+    monkeypatch.setattr(main, "revocation_list", RevocationList())
+
+def auth_headers(username: str) -> dict:
+    token = main.create_access_token({"sub": username}, expires_delta=timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
+
+def add_user(monkeypatch, username: str):
+    monkeypatch.setitem(main.fake_users_db, username, {
+        "username": username,
+        "hashed_password": "unused",
+        "disabled": False,
+    })
+
+def test_disabling_user_evicts_caches_and_rejects_their_tokens(monkeypatch):
+    add_user(monkeypatch, "admin")
+    add_user(monkeypatch, "alice")
+    monkeypatch.setattr(main.settings, "ADMIN_USERNAMES", ["admin"])
+    alice = auth_headers("alice")
+
+    # Warm both caches with alice's token and record
+    assert client.get("/users/me", headers=alice).status_code == 200
+    assert main.claims_cache.get(alice["Authorization"][7:]) is not None
+    assert main.user_cache.get("alice") is not main.MISSING
+
+    response = client.patch("/users/alice", json={"disabled": True}, headers=auth_headers("admin"))
+    assert response.status_code == 200
+    assert response.json()["disabled"] is True
+    assert main.claims_cache.get(alice["Authorization"][7:]) is None
+    assert main.user_cache.get("alice") is main.MISSING
+
+    # Other services learn of it through the revocation list, since they verify tokens locally
+    alice_jti = main.jwt.get_unverified_claims(alice["Authorization"][7:])["jti"]
+    assert [entry["jti"] for entry in main.revocation_list.active()] == [alice_jti]
+    assert client.get("/users/me", headers=alice).status_code == 401
+    assert client.get("/users/me", headers=auth_headers("alice")).status_code == 403
+
+def test_users_cannot_disable_themselves_or_change_others(monkeypatch):
+    add_user(monkeypatch, "alice")
+    add_user(monkeypatch, "bob")
+    monkeypatch.setattr(main.settings, "ADMIN_USERNAMES", [])
+    alice = auth_headers("alice")
+
+    assert client.patch("/users/alice", json={"disabled": True}, headers=alice).status_code == 403
+    assert client.patch("/users/bob", json={"full_name": "Bob"}, headers=alice).status_code == 403
+    response = client.patch("/users/alice", json={"full_name": "Alice"}, headers=alice)
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "Alice"
+    assert client.get("/users/me", headers=alice).status_code == 200
+
+def test_claims_cache_tracks_tokens_by_subject_through_eviction():
+    cache = ClaimsCache(2)
+    exp = 4102444800
+    cache.put("a1", {"sub": "alice", "exp": exp})
+    cache.put("b1", {"sub": "bob", "exp": exp})
+    cache.put("a2", {"sub": "alice", "exp": exp})
+    # a1 was the least recently used entry, so it made room for a2
+    assert cache.get("a1") is None
+    assert cache.get("b1") is not None
+    cache.invalidate_subject("alice")
+    assert cache.get("a2") is None
+    assert cache.get("b1") is not None
+    assert cache._by_subject == {"bob": {ClaimsCache._digest("b1")}}
+    assert cache.hit_ratio() == 0.5
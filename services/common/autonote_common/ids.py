@@ -0,0 +1,51 @@
+from typing import Optional
+import os
+import threading
+import time
+
+# Crockford base32: no I, L, O or U, so ids survive being read aloud or retyped
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+TIMESTAMP_BITS = 48
+RANDOM_BITS = 80
+ID_LENGTH = 26
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(ID_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+class IdGenerator:
+    """ULID-style ids: 48 bits of milliseconds then 80 random bits, as 26 base32 chars.
+
+    Ids sort by creation time as plain strings, so they double as a time index
+    for range scans and pagination. The random part makes collisions between
+    replicas negligible without any coordination; within one process, ids made
+    in the same millisecond increment it so they stay strictly ordered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new_id(self, timestamp: Optional[float] = None) -> str:
+        ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        with self._lock:
+            if ms <= self._last_ms:
+                # Same millisecond, or the clock stepped back: keep counting from the last id
+                ms = self._last_ms
+                random_part = self._last_random + 1
+                if random_part >> RANDOM_BITS:
+                    ms += 1
+                    random_part = int.from_bytes(os.urandom(10), "big")
+            else:
+                random_part = int.from_bytes(os.urandom(10), "big")
+            self._last_ms = ms
+            self._last_random = random_part
+        return _encode((ms << RANDOM_BITS) | random_part)
+
+id_generator = IdGenerator()
+new_id = id_generator.new_id
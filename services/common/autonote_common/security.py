@@ -0,0 +1,120 @@
+from typing import Any, Dict, List, Optional
+from jose import jwt, JWTError
+import httpx
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenVerificationError(Exception):
+    """Raised when a token is malformed, expired, revoked or badly signed"""
+
+class KeysUnavailableError(Exception):
+    """Raised when no signing keys could be fetched from the Auth Service"""
+
+class TokenVerifier:
+    """Verify access tokens locally against keys published by the Auth Service.
+
+    Signing keys come from the Auth Service JWKS endpoint and are refreshed in
+    the background, and on demand when a token names an unknown key id.
+    Revoked token ids are pulled periodically and kept until their tokens expire.
+    """
+
+    def __init__(
+        self,
+        auth_url: str,
+        algorithms: List[str],
+        keys_refresh_seconds: int,
+        revocations_refresh_seconds: int,
+        min_forced_refresh_seconds: int
+    ):
+        self.auth_url = auth_url.rstrip("/")
+        self.algorithms = algorithms
+        self.keys_refresh_seconds = keys_refresh_seconds
+        self.revocations_refresh_seconds = revocations_refresh_seconds
+        self.min_forced_refresh_seconds = min_forced_refresh_seconds
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.revoked: Dict[str, float] = {}
+        self._last_forced_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Fetch keys once, then keep keys and revocations fresh in the background"""
+        try:
+            await self.refresh_keys()
+        except Exception as e:
+            logger.error(f"Initial signing key fetch failed: {str(e)}")
+        self._tasks = [
+            asyncio.create_task(self._periodic(self.refresh_keys, self.keys_refresh_seconds)),
+            asyncio.create_task(self._periodic(self.refresh_revocations, self.revocations_refresh_seconds)),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _periodic(self, refresh, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await refresh()
+            except Exception as e:
+                logger.error(f"Background refresh from Auth Service failed: {str(e)}")
+
+    async def refresh_keys(self, timeout: Optional[float] = None):
+        """Replace the key set with the one currently published by the Auth Service"""
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{self.auth_url}/.well-known/jwks.json",
+                timeout=timeout if timeout is not None else 5.0
+            )
+            response.raise_for_status()
+        self.keys = {key["kid"]: key for key in response.json()["keys"]}
+
+    async def refresh_revocations(self):
+        """Pull revoked token ids, dropping those whose tokens have expired anyway"""
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{self.auth_url}/revocations", timeout=5.0)
+            response.raise_for_status()
+        now = time.time()
+        self.revoked = {
+            item["jti"]: item["exp"] for item in response.json()["revoked"]
+            if item["exp"] > now
+        }
+
+    async def _key_for(self, kid: Optional[str], timeout: Optional[float]) -> Dict[str, Any]:
+        if kid in self.keys:
+            return self.keys[kid]
+        # Unknown key id: the Auth Service may have rotated keys, so refresh at most every few seconds
+        async with self._refresh_lock:
+            if kid not in self.keys and time.monotonic() - self._last_forced_refresh > self.min_forced_refresh_seconds:
+                self._last_forced_refresh = time.monotonic()
+                try:
+                    await self.refresh_keys(timeout)
+                except Exception as e:
+                    logger.error(f"Error fetching signing keys: {str(e)}")
+                    if not self.keys:
+                        raise KeysUnavailableError("Signing keys unavailable")
+        if kid not in self.keys:
+            raise TokenVerificationError("Unknown signing key")
+        return self.keys[kid]
+
+    async def verify(self, token: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Check signature, expiry and revocation, returning the token's claims"""
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            raise TokenVerificationError("Malformed token")
+        key = await self._key_for(header.get("kid"), timeout)
+        try:
+            claims = jwt.decode(token, key, algorithms=self.algorithms)
+        except JWTError as e:
+            raise TokenVerificationError(str(e))
+        if claims.get("sub") is None:
+            raise TokenVerificationError("Token has no subject")
+        if claims.get("jti") in self.revoked:
+            raise TokenVerificationError("Token has been revoked")
+        return claims
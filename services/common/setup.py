@@ -0,0 +1,11 @@
+from setuptools import setup
+
+# Code shared by several services; each service installs it from its requirements.txt
+setup(
+    name="autonote-common",
+    version="0.1.0",
+    packages=["autonote_common"],
+    python_requires=">=3.8",
+    # Versions are pinned by the services that install it
+    install_requires=["httpx", "python-jose[cryptography]"],
+)
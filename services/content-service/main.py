@@ -1,11 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Request, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import OAuth2PasswordBearer
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, HttpUrl
 import logging
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 import time
-import httpx
 from datetime import datetime
 import asyncio
 from playwright.async_api import async_playwright
@@ -13,6 +14,11 @@ import PyPDF2
 import io
 import aiohttp
 from bs4 import BeautifulSoup
+from app.core.config import settings
+from autonote_common.ids import new_id
+from autonote_common.security import KeysUnavailableError, TokenVerificationError, TokenVerifier
+from app.core.blobs import BlobStore
+from app.core.deadline import DeadlineMiddleware, check_deadline, request_budget
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +27,9 @@ logger = logging.getLogger(__name__)
 # Prometheus metrics
 CONTENT_OPERATIONS = Counter('content_operations_total', 'Total content operations', ['operation', 'source_type'])
 CONTENT_LATENCY = Histogram('content_operation_duration_seconds', 'Content operation latency', ['operation', 'source_type'])
+CONTENT_BLOB_BYTES = Gauge('content_blob_bytes', 'Processed content bytes: logical, unique or stored', ['kind'])
+CONTENT_DEDUP_RATIO = Gauge('content_dedup_ratio', 'Logical over unique processed content bytes')
+CONTENT_COMPRESSION_RATIO = Gauge('content_compression_ratio', 'Unique over stored processed content bytes')
 
 app = FastAPI(
     title="AutoNote Content Service",
@@ -37,6 +46,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Optional compression on the service-to-gateway hop
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE)
+
+# Deadline propagated by the API gateway
+app.add_middleware(DeadlineMiddleware)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.AUTH_SERVICE_URL}/token")
+token_verifier = TokenVerifier(
+    settings.AUTH_SERVICE_URL,
+    settings.JWT_ALGORITHMS,
+    settings.JWKS_REFRESH_SECONDS,
+    settings.REVOCATION_REFRESH_SECONDS,
+    settings.JWKS_MIN_REFRESH_SECONDS
+)
+
+@app.on_event("startup")
+async def startup():
+    await token_verifier.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await token_verifier.stop()
+
 # Models
 class ContentRequest(BaseModel):
     url: HttpUrl
@@ -53,48 +86,73 @@ class ContentResponse(BaseModel):
     processed_at: datetime
     status: str
 
-# In-memory storage for processed content
-content_store = {}
+# In-memory storage for processed content; bodies live in blob_store, keyed by hash
+content_store: Dict[str, Dict[str, Any]] = {}
+blob_store = BlobStore()
+
+for _kind in ("logical", "unique", "stored"):
+    CONTENT_BLOB_BYTES.labels(kind=_kind).set_function(
+        lambda kind=_kind: getattr(blob_store.stats(), f"{kind}_bytes")
+    )
+CONTENT_DEDUP_RATIO.set_function(lambda: blob_store.stats().dedup_ratio)
+CONTENT_COMPRESSION_RATIO.set_function(lambda: blob_store.stats().compression_ratio)
 
 # Helper functions
-async def verify_token(token: str) -> str:
-    """Verify JWT token with Auth Service"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "http://auth-service:8001/users/me",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()["username"]
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        except Exception as e:
-            logger.error(f"Error verifying token: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error verifying authentication"
-            )
-
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current user from token"""
-    return await verify_token(token)
-
-async def process_web_content(url: str) -> Dict[str, Any]:
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """Get current user from a locally verified token"""
+    try:
+        claims = await token_verifier.verify(token, timeout=check_deadline(request))
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except KeysUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error verifying authentication"
+        )
+    return claims["sub"]
+
+def store_content(content: ContentResponse):
+    """Keep a processed result, sharing its body with identical captures"""
+    record = content.dict(exclude={"content"})
+    record["content_hash"] = blob_store.put(content.content)
+    content_store[content.id] = record
+
+def load_content(record: Dict[str, Any]) -> ContentResponse:
+    """Rebuild a stored result, decompressing its body"""
+    fields = dict(record)
+    content = blob_store.get(fields.pop("content_hash"))
+    # Validated when it was stored
+    return ContentResponse.construct(content=content, **fields)
+
+def navigation_timeout_ms(budget: Optional[float]) -> float:
+    """Playwright timeout capped by what is left of the request budget"""
+    if budget is None:
+        return settings.PLAYWRIGHT_TIMEOUT
+    # Playwright treats 0 as "no timeout", so never let a spent budget reach it
+    return max(min(settings.PLAYWRIGHT_TIMEOUT, budget * 1000), 1)
+
+async def process_web_content(url: str, budget: Optional[float] = None) -> Dict[str, Any]:
     """Process web content using Playwright"""
+    deadline = time.monotonic() + budget if budget is not None else None
     async with async_playwright() as p:
         browser = await p.chromium.launch()
-        page = await browser.new_page()
-        await page.goto(url)
-        
-        # Wait for content to load
-        await page.wait_for_load_state("networkidle")
-        
-        # Extract content
-        title = await page.title()
-        content = await page.content()
+        try:
+            page = await browser.new_page()
+            await page.goto(url, timeout=navigation_timeout_ms(budget))
+            
+            # Wait for content to load, within whatever budget navigation left
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            await page.wait_for_load_state("networkidle", timeout=navigation_timeout_ms(remaining))
+            
+            # Extract content
+            title = await page.title()
+            content = await page.content()
+        finally:
+            await browser.close()
         
         # Clean content using BeautifulSoup
         soup = BeautifulSoup(content, 'html.parser')
@@ -114,17 +172,15 @@ async def process_web_content(url: str) -> Dict[str, Any]:
             'keywords': soup.find('meta', {'name': 'keywords'}).get('content', '') if soup.find('meta', {'name': 'keywords'}) else '',
         }
         
-        await browser.close()
-        
         return {
             'title': title,
             'content': text_content,
             'metadata': metadata
         }
 
-async def process_pdf_content(url: str) -> Dict[str, Any]:
+async def process_pdf_content(url: str, budget: Optional[float] = None) -> Dict[str, Any]:
     """Process PDF content"""
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=budget)) as session:
         async with session.get(url) as response:
             if response.status != 200:
                 raise HTTPException(status_code=400, detail="Failed to fetch PDF")
@@ -158,20 +214,21 @@ async def process_pdf_content(url: str) -> Dict[str, Any]:
 async def process_content(
     request: ContentRequest,
     background_tasks: BackgroundTasks,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    budget: Optional[float] = Depends(request_budget)
 ):
     start_time = time.time()
     
     if request.user_id != current_user:
         raise HTTPException(status_code=403, detail="Not authorized to process content for this user")
     
-    content_id = f"{request.source_type}_{int(time.time())}"
+    content_id = new_id()
     
     try:
         if request.source_type == "web":
-            result = await process_web_content(str(request.url))
+            result = await asyncio.wait_for(process_web_content(str(request.url), budget), budget)
         elif request.source_type == "pdf":
-            result = await process_pdf_content(str(request.url))
+            result = await asyncio.wait_for(process_pdf_content(str(request.url), budget), budget)
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported source type: {request.source_type}")
         
@@ -186,13 +243,18 @@ async def process_content(
             status="completed"
         )
         
-        content_store[content_id] = content
+        store_content(content)
         
         CONTENT_OPERATIONS.labels(operation="process", source_type=request.source_type).inc()
         CONTENT_LATENCY.labels(operation="process", source_type=request.source_type).observe(time.time() - start_time)
         
         return content
         
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        logger.error(f"Deadline exceeded processing {request.url}")
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     except Exception as e:
         logger.error(f"Error processing content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing content: {str(e)}")
@@ -204,7 +266,7 @@ async def get_content(content_id: str, current_user: str = Depends(get_current_u
     if content_id not in content_store:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    content = content_store[content_id]
+    content = load_content(content_store[content_id])
     
     CONTENT_OPERATIONS.labels(operation="get", source_type=content.source_type).inc()
     CONTENT_LATENCY.labels(operation="get", source_type=content.source_type).observe(time.time() - start_time)
@@ -0,0 +1,116 @@
+from typing import Dict, NamedTuple, Tuple
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+# Shorter bodies are stored raw; compression framing would eat most of the saving
+MIN_COMPRESS_BYTES = 64
+
+_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard is not None else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """Compress with zstd when installed, else zlib, returning (codec, payload)"""
+    if len(data) >= MIN_COMPRESS_BYTES:
+        if _zstd_compressor is not None:
+            codec, packed = "zstd", _zstd_compressor.compress(data)
+        else:
+            codec, packed = "zlib", zlib.compress(data, ZLIB_LEVEL)
+        if len(packed) < len(data):
+            return codec, packed
+    return "raw", data
+
+def decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "raw":
+        return payload
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "zstd":
+        if _zstd_decompressor is None:
+            raise RuntimeError("zstandard is required to read zstd blobs")
+        return _zstd_decompressor.decompress(payload)
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+class BlobStats(NamedTuple):
+    # Bytes as if every reference held its own copy
+    logical_bytes: int
+    # Bytes of distinct bodies, before compression
+    unique_bytes: int
+    # Bytes actually held
+    stored_bytes: int
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.logical_bytes / self.unique_bytes if self.unique_bytes else 1.0
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.unique_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+class Blob:
+    __slots__ = ("digest", "codec", "payload", "size", "refs")
+
+    def __init__(self, digest: str, codec: str, payload: bytes, size: int):
+        self.digest = digest
+        self.codec = codec
+        self.payload = payload
+        self.size = size
+        self.refs = 0
+
+class BlobStore:
+    """Text bodies stored once per distinct content, compressed and reference counted.
+
+    Writers put a body and keep its hash; identical bodies share one blob and
+    only reads pay for decompression. A blob is dropped with its last reference.
+    """
+
+    def __init__(self):
+        self.blobs: Dict[str, Blob] = {}
+        self.logical_bytes = 0
+        self.unique_bytes = 0
+        self.stored_bytes = 0
+
+    def put(self, text: str) -> str:
+        """Add a reference to a body, returning its hash"""
+        digest = content_hash(text)
+        blob = self.blobs.get(digest)
+        if blob is None:
+            data = text.encode()
+            blob = self.blobs[digest] = Blob(digest, *compress(data), len(data))
+            self.unique_bytes += blob.size
+            self.stored_bytes += len(blob.payload)
+        blob.refs += 1
+        self.logical_bytes += blob.size
+        # Hand back the stored key so every reference shares one string
+        return blob.digest
+
+    def get(self, digest: str) -> str:
+        blob = self.blobs[digest]
+        return decompress(blob.codec, blob.payload).decode()
+
+    def release(self, digest: str):
+        """Drop a reference taken by put"""
+        blob = self.blobs.get(digest)
+        if blob is None:
+            return
+        blob.refs -= 1
+        self.logical_bytes -= blob.size
+        if blob.refs <= 0:
+            del self.blobs[digest]
+            self.unique_bytes -= blob.size
+            self.stored_bytes -= len(blob.payload)
+
+    def stats(self) -> BlobStats:
+        return BlobStats(self.logical_bytes, self.unique_bytes, self.stored_bytes)
+
+    def __len__(self) -> int:
+        return len(self.blobs)
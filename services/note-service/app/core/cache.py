@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import random
+import time
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Stored in place of a deleted note, so a read that raced the delete can't refill it
+TOMBSTONE = b""
+
+# Called with (cache, hit, estimated seconds saved) after each lookup
+CacheObserver = Callable[[str, bool, float], None]
+
+class MemoryCacheBackend:
+    """Stand-in for the handful of Redis commands the note cache uses, for tests and single-process runs"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self._live(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        if not isinstance(value, bytes):
+            value = str(value).encode()
+        self.entries[key] = (value, time.monotonic() + ex if ex else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self.entries.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        item = self.entries.get(key)
+        value = int(self._live(key) or 0) + 1
+        self.entries[key] = (str(value).encode(), item[1] if item is not None else None)
+        return value
+
+    async def close(self):
+        pass
+
+class NoteCache:
+    """Read-through cache of single notes and first list pages over Redis.
+
+    Misses are single-flighted within the process and guarded by a short
+    Redis lock across replicas, so a hot key expiring sends one query to the
+    store rather than one per waiting request. Expiry is jittered so keys
+    filled together don't expire together.
+
+    Writers overwrite a note's entry (or leave a tombstone on delete), while
+    readers only fill absent entries, so a read that raced a write never
+    replaces the newer value. List pages are keyed on a per-user generation
+    that every write bumps, which retires all of a user's cached pages at once.
+    Backend errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        backend,
+        ttl: int,
+        jitter: float,
+        lock_seconds: int,
+        lock_wait: float,
+        observer: Optional[CacheObserver] = None
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.jitter = jitter
+        self.lock_seconds = lock_seconds
+        self.lock_wait = lock_wait
+        self.observer = observer
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        # Moving average of store load time per cache, credited as saved on each hit
+        self.load_seconds: Dict[str, float] = {}
+        self._inflight: Dict[str, "asyncio.Future[Optional[bytes]]"] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _expiry(self) -> int:
+        return max(1, round(self.ttl * (1 + random.uniform(-self.jitter, self.jitter))))
+
+    async def _call(self, command: str, *args, failed: Any = None, **kwargs) -> Any:
+        try:
+            return await getattr(self.backend, command)(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Note cache backend error: {str(e)}")
+            return failed
+
+    def _record(self, cache: str, hit: bool):
+        counts = self.hits if hit else self.misses
+        counts[cache] = counts.get(cache, 0) + 1
+        if self.observer is not None:
+            self.observer(cache, hit, self.load_seconds.get(cache, 0.0) if hit else 0.0)
+
+    def hit_ratio(self, cache: str) -> float:
+        hits, misses = self.hits.get(cache, 0), self.misses.get(cache, 0)
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    @staticmethod
+    def note_key(note_id: str) -> str:
+        return f"note:{note_id}"
+
+    async def list_key(self, user_id: str, **params) -> str:
+        generation = await self._call("get", f"notes:generation:{user_id}") or b"0"
+        return "notes:list:" + json.dumps([user_id, generation.decode(), params], sort_keys=True)
+
+    async def read_through(self, cache: str, key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """Return the cached value, or load it once, fill the cache and return it"""
+        if not self.enabled:
+            return await loader()
+        value = await self._call("get", key)
+        if value is not None:
+            self._record(cache, True)
+            return value
+        self._record(cache, False)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(cache, key, loader)
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't also warn that nobody retrieved it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    async def _load(self, cache: str, key: str, loader: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        lock = f"{key}:lock"
+        # With Redis unreachable, load straight away rather than waiting on a lock nobody holds
+        locked = await self._call("set", lock, b"1", ex=self.lock_seconds, nx=True, failed=True)
+        if not locked:
+            # Another replica is loading this key; give it a moment before querying the store too
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(0.05, self.lock_wait))
+                value = await self._call("get", key)
+                if value is not None:
+                    return value
+        try:
+            started = time.monotonic()
+            value = await loader()
+            elapsed = time.monotonic() - started
+            previous = self.load_seconds.get(cache)
+            self.load_seconds[cache] = elapsed if previous is None else 0.9 * previous + 0.1 * elapsed
+            if value is not None:
+                await self._call("set", key, value, ex=self._expiry(), nx=True)
+            return value
+        finally:
+            if locked:
+                await self._call("delete", lock)
+
+    async def put(self, key: str, value: bytes):
+        """Write through a new value, replacing whatever is cached"""
+        if self.enabled:
+            await self._call("set", key, value, ex=self._expiry())
+
+    async def tombstone(self, key: str):
+        if self.enabled:
+            await self._call("set", key, TOMBSTONE, ex=self._expiry())
+
+    async def invalidate_lists(self, user_id: str):
+        """Retire every cached list page of a user"""
+        if self.enabled:
+            await self._call("incr", f"notes:generation:{user_id}")
+
+    async def close(self):
+        if self.enabled:
+            await self._call("close")
+
+def create_note_cache(observer: Optional[CacheObserver] = None) -> NoteCache:
+    """Build the note cache selected by NOTE_CACHE_BACKEND; "none" gives a disabled cache"""
+    if settings.NOTE_CACHE_BACKEND == "redis":
+        import redis.asyncio as redis
+
+        backend = redis.from_url(settings.REDIS_URL)
+    elif settings.NOTE_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(settings.NOTE_CACHE_MAX_ENTRIES)
+    elif settings.NOTE_CACHE_BACKEND == "none":
+        backend = None
+    else:
+        raise ValueError(f"Unknown NOTE_CACHE_BACKEND: {settings.NOTE_CACHE_BACKEND}")
+    return NoteCache(
+        backend,
+        settings.NOTE_CACHE_TTL_SECONDS,
+        settings.NOTE_CACHE_TTL_JITTER,
+        settings.NOTE_CACHE_LOCK_SECONDS,
+        settings.NOTE_CACHE_LOCK_WAIT_SECONDS,
+        observer
+    )
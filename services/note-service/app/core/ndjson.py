@@ -0,0 +1,83 @@
+from typing import AsyncIterator, Optional
+from starlette.concurrency import run_until_first_complete
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+import asyncio
+import json
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def dumps_line(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=_default).encode() + b"\n"
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Optional[bytes]]:
+    """Split a byte stream into lines, holding at most one line in memory.
+
+    A line longer than max_line_bytes is discarded and reported as None, so one
+    oversized record cannot exhaust memory or abort the whole stream.
+    """
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            if oversized or newline - start > max_line_bytes:
+                oversized = False
+                yield None
+            else:
+                yield buffer[start:newline]
+            start = newline + 1
+        buffer = buffer[start:]
+        if len(buffer) > max_line_bytes:
+            buffer = b""
+            oversized = True
+    if oversized or len(buffer) > max_line_bytes:
+        yield None
+    elif buffer:
+        yield buffer
+
+class RequestBody:
+    """A request body read as a stream, noting when the client has sent all of it"""
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.done = asyncio.Event()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        async for chunk in self.request.stream():
+            yield chunk
+        self.done.set()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Streaming response whose body generator may still be reading the request body.
+
+    StreamingResponse listens for client disconnects by consuming receive(),
+    which would swallow request body chunks the generator has not read yet.
+    This one only starts listening once the body has been read in full; until
+    then the body reader owns receive() and fails on a disconnect itself.
+    """
+
+    def __init__(self, content, body: RequestBody, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body = body
+
+    async def _listen_after_body(self, receive):
+        await self.body.done.wait()
+        await self.listen_for_disconnect(receive)
+
+    async def __call__(self, scope, receive, send):
+        await run_until_first_complete(
+            (self.stream_response, {"send": send}),
+            (self._listen_after_body, {"receive": receive}),
+        )
+        if self.background is not None:
+            await self.background()
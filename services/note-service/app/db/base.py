@@ -0,0 +1,86 @@
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, MetaData, String,
+    Table, Text
+)
+
+metadata = MetaData()
+
+# Note bodies stored once per distinct content, keyed by SHA-256 and compressed
+note_blobs = Table(
+    "note_blobs",
+    metadata,
+    Column("hash", String(64), primary_key=True),
+    Column("codec", String(8), nullable=False),
+    Column("data", LargeBinary, nullable=False),
+    # Uncompressed size in bytes
+    Column("size", Integer, nullable=False),
+    # Notes referencing the blob; it is deleted when this reaches zero
+    Column("refs", Integer, nullable=False),
+)
+
+notes = Table(
+    "notes",
+    metadata,
+    Column("id", String(64), primary_key=True),
+    Column("user_id", String(255), nullable=False),
+    Column("title", Text, nullable=False),
+    Column("content_hash", String(64), ForeignKey("note_blobs.hash"), nullable=False),
+    Column("source_type", String(32), nullable=False),
+    Column("source_url", Text, nullable=True),
+    Column("tags", JSON, nullable=False, default=list),
+    Column("summary", Text, nullable=True),
+    Column("key_points", JSON, nullable=False, default=list),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    # Bumped by every write, for optimistic concurrency
+    Column("version", Integer, nullable=False, default=1),
+    # Position in the owner's change sequence at the last write
+    Column("seq", BigInteger, nullable=False, default=0),
+    # Listing order is (updated_at, id), so both indexes end with it for keyset seeks
+    Index("ix_notes_user_updated", "user_id", "updated_at", "id"),
+    Index("ix_notes_user_source_type_updated", "user_id", "source_type", "updated_at", "id"),
+    # Catching up derived indexes walks every note in change order
+    Index("ix_notes_updated", "updated_at", "id"),
+    # Delta sync reads a user's notes changed after a sequence number
+    Index("ix_notes_user_seq", "user_id", "seq"),
+)
+
+# One row per (note, tag), with the note's sort key copied in so tag listings never sort
+note_tags = Table(
+    "note_tags",
+    metadata,
+    Column("note_id", String(64), ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag", String(255), primary_key=True),
+    Column("user_id", String(255), nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_note_tags_user_tag_updated", "user_id", "tag", "updated_at", "note_id"),
+)
+
+# Deleted notes, kept so delta sync can tell clients to drop them
+note_tombstones = Table(
+    "note_tombstones",
+    metadata,
+    Column("note_id", String(64), primary_key=True),
+    Column("user_id", String(255), nullable=False),
+    Column("seq", BigInteger, nullable=False),
+    Column("deleted_at", DateTime, nullable=False),
+    Index("ix_note_tombstones_user_seq", "user_id", "seq"),
+    # Tombstones past the retention window are purged oldest first
+    Index("ix_note_tombstones_deleted_at", "deleted_at"),
+)
+
+# Newest purged tombstone per user; a sync from before it has missed deletions and must start over
+tombstone_horizons = Table(
+    "tombstone_horizons",
+    metadata,
+    Column("user_id", String(255), primary_key=True),
+    Column("seq", BigInteger, nullable=False),
+)
+
+# Last change sequence number handed out per user; its row lock orders concurrent writes
+change_sequences = Table(
+    "change_sequences",
+    metadata,
+    Column("user_id", String(255), primary_key=True),
+    Column("seq", BigInteger, nullable=False),
+)
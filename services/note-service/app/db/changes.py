@@ -0,0 +1,2 @@
+class ChangesExpiredError(Exception):
+    """Raised when tombstones a sync client still needs have been purged, so it must start over from since=0"""
@@ -0,0 +1,294 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice, takewhile
+import heapq
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import sys
+from app.core.blobs import BlobStats, BlobStore
+from .changes import ChangesExpiredError
+from .pagination import SortKey, from_micros, to_micros
+
+# A change is (seq, note id, note), where note is None for a deletion
+Change = Tuple[int, str, Optional[Any]]
+
+class Tombstone(NamedTuple):
+    id: str
+    user_id: str
+    seq: int
+    deleted_at: datetime
+
+class StoredNote:
+    """A note as held in memory, read by the orm_mode response models like any note.
+
+    Slotted rather than a Pydantic model, with owner, source type and tags
+    interned, lists kept as tuples, timestamps as integer microseconds and the
+    content left in the blob store until read.
+    """
+
+    __slots__ = (
+        "id", "user_id", "title", "source_type", "source_url", "tags", "summary", "key_points",
+        "created_micros", "updated_micros", "version", "seq", "content_hash", "_blobs",
+    )
+
+    def __init__(self, note, content_hash: str, blobs: BlobStore):
+        self.id = note.id
+        self.user_id = sys.intern(note.user_id)
+        self.title = note.title
+        self.source_type = sys.intern(note.source_type)
+        self.source_url = note.source_url
+        self.tags = tuple(sys.intern(tag) for tag in note.tags)
+        self.summary = note.summary
+        self.key_points = tuple(note.key_points)
+        self.created_micros = to_micros(note.created_at)
+        self.updated_micros = to_micros(note.updated_at)
+        self.version = note.version
+        self.seq = note.seq
+        self.content_hash = content_hash
+        self._blobs = blobs
+
+    @property
+    def content(self) -> str:
+        return self._blobs.get(self.content_hash)
+
+    @property
+    def created_at(self) -> datetime:
+        return from_micros(self.created_micros)
+
+    @property
+    def updated_at(self) -> datetime:
+        return from_micros(self.updated_micros)
+
+    def sort_key(self) -> SortKey:
+        return (self.updated_micros, self.id)
+
+class ChangeLog:
+    """One user's latest change per note, as parallel columns ordered by sequence number"""
+
+    __slots__ = ("seqs", "ids")
+
+    def __init__(self):
+        self.seqs = array("q")
+        self.ids: List[str] = []
+
+    def move_to_end(self, note_id: str, previous_seq: Optional[int], seq: int):
+        if previous_seq is not None:
+            self.remove(previous_seq)
+        self.seqs.append(seq)
+        self.ids.append(note_id)
+
+    def remove(self, seq: int):
+        position = bisect_left(self.seqs, seq)
+        if position < len(self.seqs) and self.seqs[position] == seq:
+            del self.seqs[position]
+            del self.ids[position]
+
+    def after(self, since: int, limit: int) -> List[Tuple[int, str]]:
+        start = bisect_right(self.seqs, since)
+        return list(zip(self.seqs[start:start + limit], self.ids[start:start + limit]))
+
+class MemoryNoteStore:
+    """In-process note store with per-user secondary indexes.
+
+    Notes are indexed by user, (user, tag) and (user, source_type). Each index
+    entry is a list of (updated_at, id) keys kept sorted, so listing seeks
+    straight to a cursor and only touches the caller's matching notes however
+    many notes other users have.
+
+    Every write also takes the next number in its user's change sequence, and
+    a per-user log ordered by it (one entry per live note or tombstone) answers
+    "what changed since" without touching unchanged notes.
+
+    Note content lives in a BlobStore, so a body shared by several notes is
+    held once, compressed. Sort keys are derived from the stored records
+    rather than kept in a map of their own.
+    """
+
+    # Only this process writes these notes, so there are no other replicas' writes to catch up with
+    shared = False
+
+    def __init__(self):
+        self.blobs = BlobStore()
+        self.notes: Dict[str, StoredNote] = {}
+        self.by_user: Dict[str, List[SortKey]] = {}
+        self.by_tag: Dict[Tuple[str, str], List[SortKey]] = {}
+        self.by_source_type: Dict[Tuple[str, str], List[SortKey]] = {}
+        self.indexes: Dict[str, Dict[Any, List[SortKey]]] = {
+            "user": self.by_user,
+            "tag": self.by_tag,
+            "source_type": self.by_source_type,
+        }
+        self.sequences: Dict[str, int] = {}
+        self.change_log: Dict[str, ChangeLog] = {}
+        # Deleted notes still reported by changes(), oldest deletion first
+        self.tombstones: Dict[str, Tombstone] = {}
+        # Newest purged tombstone per user
+        self.horizons: Dict[str, int] = {}
+
+    def _index_entries(self, note) -> List[Tuple[str, Any]]:
+        entries = [("user", note.user_id), ("source_type", (note.user_id, note.source_type))]
+        entries.extend(("tag", (note.user_id, tag)) for tag in dict.fromkeys(note.tags))
+        return entries
+
+    def _index(self, key: SortKey, entries: List[Tuple[str, Any]]):
+        for name, index_key in entries:
+            insort(self.indexes[name].setdefault(index_key, []), key)
+
+    def _unindex(self, key: SortKey, entries: List[Tuple[str, Any]]):
+        for name, index_key in entries:
+            index = self.indexes[name]
+            keys = index.get(index_key)
+            if keys is None:
+                continue
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+            if not keys:
+                del index[index_key]
+
+    def _record_change(self, user_id: str, note_id: str, previous_seq: Optional[int] = None) -> int:
+        """Give a note the user's next sequence number, moving it to the end of the change log"""
+        seq = self.sequences.get(user_id, 0) + 1
+        self.sequences[user_id] = seq
+        log = self.change_log.get(user_id)
+        if log is None:
+            log = self.change_log[user_id] = ChangeLog()
+        log.move_to_end(note_id, previous_seq, seq)
+        return seq
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def pool_status(self) -> Dict[str, int]:
+        return {"size": 0, "checked_out": 0, "overflow": 0}
+
+    async def blob_stats(self) -> BlobStats:
+        return self.blobs.stats()
+
+    async def get(self, note_id: str) -> Optional[Any]:
+        return self.notes.get(note_id)
+
+    async def get_many(self, note_ids: Iterable[str]) -> List[Any]:
+        """Fetch notes by id in the order given, skipping ids that no longer exist"""
+        return [self.notes[note_id] for note_id in note_ids if note_id in self.notes]
+
+    async def iter_notes(self, after: Optional[SortKey] = None, batch_size: int = 1000) -> AsyncIterator[Any]:
+        """Every note of every user in (updated_at, id) order, starting just after a position"""
+        # Merge the tails of the per-user indexes, already sorted, rather than sorting every note
+        tails = [
+            keys[bisect_right(keys, after):] if after is not None else list(keys)
+            for keys in self.by_user.values()
+        ]
+        for _, note_id in heapq.merge(*(tail for tail in tails if tail)):
+            note = self.notes.get(note_id)
+            if note is not None:
+                yield note
+
+    async def iter_user_notes(
+        self,
+        user_id: str,
+        after: Optional[SortKey] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Any]:
+        """Every note of one user in (updated_at, id) order, re-seeking per batch so concurrent writes are safe"""
+        while True:
+            keys = self.by_user.get(user_id, [])
+            start = bisect_right(keys, after) if after is not None else 0
+            batch = keys[start:start + batch_size]
+            for key in batch:
+                note = self.notes.get(key[1])
+                if note is not None:
+                    yield note
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
+    def _put(self, note):
+        stored = StoredNote(note, self.blobs.put(note.content), self.blobs)
+        self.notes[stored.id] = stored
+        self._index(stored.sort_key(), self._index_entries(stored))
+
+    async def add(self, note):
+        note.seq = self._record_change(note.user_id, note.id)
+        self._put(note)
+
+    async def add_many(self, new_notes: Iterable[Any]):
+        for note in new_notes:
+            await self.add(note)
+
+    async def update(self, note, expected_version: Optional[int] = None) -> bool:
+        """Replace a note, unless it is gone or no longer at expected_version"""
+        previous = self.notes.get(note.id)
+        if previous is None or (expected_version is not None and previous.version != expected_version):
+            return False
+        self._unindex(previous.sort_key(), self._index_entries(previous))
+        note.seq = self._record_change(note.user_id, note.id, previous.seq)
+        # Take the new reference first, so an unchanged body is never dropped and recompressed
+        self._put(note)
+        self.blobs.release(previous.content_hash)
+        return True
+
+    async def delete(self, note_id: str) -> bool:
+        note = self.notes.pop(note_id, None)
+        if note is None:
+            return False
+        self._unindex(note.sort_key(), self._index_entries(note))
+        self.blobs.release(note.content_hash)
+        seq = self._record_change(note.user_id, note_id, note.seq)
+        self.tombstones[note_id] = Tombstone(note_id, note.user_id, seq, datetime.utcnow())
+        return True
+
+    async def changes(self, user_id: str, since: int = 0, limit: int = 100) -> List[Change]:
+        """The latest change to each note the user touched after sequence number since, oldest first.
+
+        Raises ChangesExpiredError when deletions after since have been purged.
+        """
+        horizon = self.horizons.get(user_id)
+        if since > 0 and horizon is not None and since < horizon:
+            raise ChangesExpiredError(f"Deletions before sequence number {horizon} have been purged")
+        log = self.change_log.get(user_id)
+        if log is None:
+            return []
+        return [(seq, note_id, self.notes.get(note_id)) for seq, note_id in log.after(since, limit)]
+
+    async def purge_tombstones(self, before: datetime) -> int:
+        """Drop tombstones of notes deleted before a time, with their change log entries"""
+        expired = list(takewhile(lambda tombstone: tombstone.deleted_at < before, self.tombstones.values()))
+        for tombstone in expired:
+            del self.tombstones[tombstone.id]
+            log = self.change_log[tombstone.user_id]
+            log.remove(tombstone.seq)
+            if not log.seqs:
+                del self.change_log[tombstone.user_id]
+            self.horizons[tombstone.user_id] = tombstone.seq
+        return len(expired)
+
+    async def list(
+        self,
+        user_id: str,
+        limit: int = 10,
+        after: Optional[SortKey] = None,
+        skip: int = 0,
+        source_type: Optional[str] = None,
+        tag: Optional[str] = None
+    ) -> List[Any]:
+        """List a user's notes by (updated_at, id), starting just after a cursor position"""
+        candidates = [self.by_user.get(user_id, [])]
+        if source_type:
+            candidates.append(self.by_source_type.get((user_id, source_type), []))
+        if tag:
+            candidates.append(self.by_tag.get((user_id, tag), []))
+        keys = min(candidates, key=len)
+        start = bisect_right(keys, after) if after is not None else 0
+        matching = (
+            note for note in (self.notes[keys[i][1]] for i in range(start, len(keys)))
+            if (not source_type or note.source_type == source_type)
+            and (not tag or tag in note.tags)
+        )
+        return list(islice(matching, skip, skip + limit))
+
+    def __len__(self) -> int:
+        return len(self.notes)
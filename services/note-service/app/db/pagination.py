@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import base64
+import json
+
+EPOCH = datetime(1970, 1, 1)
+
+# Position of a note in listing order: (updated_at in microseconds since epoch, note id)
+SortKey = Tuple[int, str]
+
+def to_micros(value: datetime) -> int:
+    """Exact integer microseconds for a naive UTC datetime"""
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+def sort_key(note) -> SortKey:
+    return (to_micros(note.updated_at), note.id)
+
+def encode_cursor(key: SortKey) -> str:
+    """Opaque cursor pointing just after the given position"""
+    raw = json.dumps([key[0], key[1]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[SortKey]:
+    """Decode a cursor from encode_cursor, raising ValueError when it is malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        micros, note_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(micros, int) or not isinstance(note_id, str):
+        raise ValueError("Invalid cursor")
+    return (micros, note_id)
@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional, Sequence
+from .pagination import SortKey, sort_key
+
+# Notes remembered for the overlap window are pruned whenever their count doubles past this
+MIN_PRUNE_SIZE = 1024
+
+class RefreshCursor:
+    """How far an index has read the store in (updated_at, id) order.
+
+    Only refresh passes move the position. Notes indexed from local writes are
+    just remembered, so a note another replica wrote with an earlier
+    updated_at is still read by the next pass. Each pass also re-reads an
+    overlap window behind the position, covering clock skew between replicas
+    and writes that commit after a later-stamped one, and skips notes the
+    index already holds at the version read.
+    """
+
+    def __init__(self, overlap_seconds: float):
+        self.overlap = int(overlap_seconds * 1_000_000)
+        self.position: Optional[SortKey] = None
+        # updated_at of the notes indexed within the overlap window, by id
+        self.recent: Dict[str, int] = {}
+        self._prune_at = MIN_PRUNE_SIZE
+
+    def start(self) -> Optional[SortKey]:
+        """Position the next pass reads after, or None to read every note"""
+        if self.position is None:
+            return None
+        return (self.position[0] - self.overlap, "")
+
+    def indexed(self, key: SortKey):
+        """Remember that the index holds a note at this key"""
+        if key[0] > self.recent.get(key[1], -1):
+            self.recent[key[1]] = key[0]
+        if len(self.recent) >= self._prune_at:
+            self._prune()
+
+    def read(self, key: SortKey) -> bool:
+        """Move past a note read by a pass, returning whether the index still needs it"""
+        start = self.start()
+        if start is not None and key <= start:
+            return False
+        if self.position is None or key > self.position:
+            self.position = key
+        if key[0] <= self.recent.get(key[1], -1):
+            return False
+        self.indexed(key)
+        return True
+
+    def _prune(self):
+        if self.position is not None:
+            floor = self.position[0] - self.overlap
+            self.recent = {note_id: micros for note_id, micros in self.recent.items() if micros >= floor}
+        self._prune_at = max(MIN_PRUNE_SIZE, 2 * len(self.recent))
+
+def index_written(indexes: Sequence[Any], note):
+    """Index a note written by this replica, leaving each index's refresh position where it is"""
+    key = sort_key(note)
+    for index in indexes:
+        index.add(note)
+        index.refresh_cursor.indexed(key)
+
+async def refresh(store, indexes: Sequence[Any]):
+    """Index notes changed in the store since each index's last pass, including other replicas' writes"""
+    starts = [index.refresh_cursor.start() for index in indexes]
+    after = None if None in starts else min(starts)
+    async for note in store.iter_notes(after=after):
+        key = sort_key(note)
+        for index in indexes:
+            if index.refresh_cursor.read(key):
+                index.add(note)
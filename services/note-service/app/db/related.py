@@ -0,0 +1,292 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import math
+import os
+import pickle
+import zlib
+import numpy as np
+from .refresh import RefreshCursor
+from .search import note_terms
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matmul when assigning vectors to IVF lists
+ASSIGN_CHUNK_ROWS = 8192
+# K-means trains on at most this many vectors per list
+TRAINING_ROWS_PER_LIST = 64
+
+def vectorize(terms: Dict[str, float], dimensions: int, document_frequency: Dict[str, int], documents: int) -> np.ndarray:
+    """Signed feature hashing of sublinear TF-IDF weights, L2-normalised.
+
+    crc32 rather than hash() keeps buckets stable across processes, so
+    snapshots stay valid after a restart.
+    """
+    buckets = np.empty(len(terms), dtype=np.int64)
+    weights = np.empty(len(terms), dtype=np.float32)
+    for i, (term, frequency) in enumerate(terms.items()):
+        digest = zlib.crc32(term.encode())
+        idf = math.log((1 + documents) / (1 + document_frequency.get(term, 0))) + 1.0
+        weight = (1.0 + math.log(frequency)) * idf
+        buckets[i] = digest % dimensions
+        weights[i] = -weight if digest & 0x80000000 else weight
+    vector = np.zeros(dimensions, dtype=np.float32)
+    np.add.at(vector, buckets, weights)
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid for each vector"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+def train_ivf(vectors: np.ndarray, lists: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means over a sample of vectors, returning (centroids, list of every vector)"""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > lists * TRAINING_ROWS_PER_LIST:
+        sample = vectors[rng.choice(len(vectors), lists * TRAINING_ROWS_PER_LIST, replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        nearest = assign_lists(sample, centroids)
+        order = np.argsort(nearest, kind="stable")
+        clusters, starts = np.unique(nearest[order], return_index=True)
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1)
+        filled = norms > 0
+        # Lists that attracted nothing keep their previous centroid
+        centroids[clusters[filled]] = sums[filled] / norms[filled, None]
+    return centroids, assign_lists(vectors, centroids)
+
+class UserVectors:
+    """One user's note vectors as rows of a contiguous float32 matrix"""
+
+    __slots__ = ("matrix", "assignments", "ids", "rows", "centroids", "trained_count", "dirty")
+
+    def __init__(self, dimensions: int):
+        self.matrix = np.empty((16, dimensions), dtype=np.float32)
+        # IVF list of each row, or -1 before the first training
+        self.assignments = np.full(16, -1, dtype=np.int32)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_count = 0
+        # Notes written while a training run works on a snapshot, reassigned when it lands
+        self.dirty: Optional[Set[str]] = None
+
+    def set(self, note_id: str, vector: np.ndarray):
+        row = self.rows.get(note_id)
+        if row is None:
+            row = len(self.ids)
+            if row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+                self.assignments = np.concatenate([self.assignments, np.full_like(self.assignments, -1)])
+            self.ids.append(note_id)
+            self.rows[note_id] = row
+        self.matrix[row] = vector
+        if self.centroids is not None:
+            self.assignments[row] = int(np.argmax(self.centroids @ vector))
+        if self.dirty is not None:
+            self.dirty.add(note_id)
+
+    def remove(self, note_id: str):
+        """Drop a row by moving the last row into its place"""
+        row = self.rows.pop(note_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.assignments[row] = self.assignments[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+    def install(self, centroids: np.ndarray, snapshot_ids: List[str], snapshot_assignments: np.ndarray, dirty: Set[str]):
+        """Adopt IVF lists trained on a snapshot, reassigning rows written since it was taken"""
+        position = {note_id: i for i, note_id in enumerate(snapshot_ids)}
+        fresh = []
+        for row, note_id in enumerate(self.ids):
+            i = position.get(note_id)
+            if i is None or note_id in dirty:
+                fresh.append(row)
+            else:
+                self.assignments[row] = snapshot_assignments[i]
+        if fresh:
+            self.assignments[fresh] = assign_lists(self.matrix[fresh], centroids)
+        self.centroids = centroids
+        self.trained_count = len(self.ids)
+
+    def search(self, vector: np.ndarray, limit: int, probes: Optional[int]) -> List[Tuple[str, float]]:
+        """Top rows by cosine similarity; with probes, only rows in the nearest IVF lists are scored"""
+        count = len(self.ids)
+        candidates = None
+        if probes is not None and self.centroids is not None and probes < len(self.centroids):
+            nearest = np.argpartition(-(self.centroids @ vector), probes)[:probes]
+            candidates = np.flatnonzero(np.isin(self.assignments[:count], nearest))
+            scores = self.matrix[candidates] @ vector
+        else:
+            scores = self.matrix[:count] @ vector
+        k = min(limit, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = candidates[top] if candidates is not None else top
+        return [(self.ids[row], float(scores[i])) for row, i in zip(rows, top)]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+class RelatedIndex:
+    """Per-user note vectors for "related notes", kept in step with every write.
+
+    Term weights use document frequencies counted over every note indexed so
+    far, shared by all users. A note is weighted with the statistics of the
+    moment it was indexed, which settle quickly as notes accumulate.
+
+    Below ivf_threshold notes a query is one matrix-vector product over all of
+    the user's rows. Above it, rows are clustered into about sqrt(n) IVF lists
+    and a query only scores the lists whose centroids are nearest. Lists are
+    trained off the event loop and retrained when a user's note count doubles
+    or halves.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = 256,
+        ivf_threshold: int = 20000,
+        probes: int = 16,
+        refresh_overlap: float = 60.0
+    ):
+        self.dimensions = dimensions
+        self.ivf_threshold = ivf_threshold
+        self.probes = probes
+        self.users: Dict[str, UserVectors] = {}
+        self.owners: Dict[str, str] = {}
+        # Counted on every add, so rewrites of a note count again; close enough for weighting
+        self.document_frequency: Dict[str, int] = {}
+        self.documents = 0
+        # How far refresh passes have read the store, used to catch up with other replicas and after a restart
+        self.refresh_cursor = RefreshCursor(refresh_overlap)
+        self._training: Set[str] = set()
+
+    def add(self, note):
+        """Index a note, replacing any earlier version of it"""
+        owner = self.owners.get(note.id)
+        if owner is not None and owner != note.user_id:
+            self.remove(note.id)
+        vectors = self.users.get(note.user_id)
+        if vectors is None:
+            vectors = self.users[note.user_id] = UserVectors(self.dimensions)
+        terms = note_terms(note)
+        self.documents += 1
+        for term in terms:
+            self.document_frequency[term] = self.document_frequency.get(term, 0) + 1
+        vectors.set(note.id, vectorize(terms, self.dimensions, self.document_frequency, self.documents))
+        self.owners[note.id] = note.user_id
+
+    def add_many(self, notes: Iterable[Any]):
+        for note in notes:
+            self.add(note)
+
+    def remove(self, note_id: str):
+        user_id = self.owners.pop(note_id, None)
+        if user_id is None:
+            return
+        vectors = self.users[user_id]
+        vectors.remove(note_id)
+        if not len(vectors):
+            del self.users[user_id]
+
+    def related(self, user_id: str, note_id: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """The user's notes most similar to one of their notes, best first"""
+        vectors = self.users.get(user_id)
+        if vectors is None or note_id not in vectors.rows:
+            return []
+        probes = self.probes if len(vectors) >= self.ivf_threshold else None
+        hits = vectors.search(vectors.matrix[vectors.rows[note_id]].copy(), limit + 1, probes)
+        return [hit for hit in hits if hit[0] != note_id][:limit]
+
+    def stale_users(self) -> List[str]:
+        """Users past the IVF threshold whose lists are missing or were trained at a very different size"""
+        return [
+            user_id for user_id, vectors in self.users.items()
+            if len(vectors) >= self.ivf_threshold and (
+                vectors.centroids is None
+                or len(vectors) >= 2 * vectors.trained_count
+                or 2 * len(vectors) <= vectors.trained_count
+            )
+        ]
+
+    async def train(self, user_id: str):
+        """Train a user's IVF lists on a worker thread, then install them"""
+        vectors = self.users.get(user_id)
+        if vectors is None or user_id in self._training:
+            return
+        self._training.add(user_id)
+        snapshot_ids = list(vectors.ids)
+        snapshot = vectors.matrix[:len(snapshot_ids)].copy()
+        vectors.dirty = set()
+        try:
+            loop = asyncio.get_running_loop()
+            centroids, assignments = await loop.run_in_executor(
+                None, train_ivf, snapshot, max(1, int(math.sqrt(len(snapshot))))
+            )
+            vectors.install(centroids, snapshot_ids, assignments, vectors.dirty)
+        finally:
+            vectors.dirty = None
+            self._training.discard(user_id)
+
+    async def train_stale(self):
+        for user_id in self.stale_users():
+            await self.train(user_id)
+
+    def save(self, path: str):
+        """Write a snapshot atomically so a crash never leaves a torn file"""
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(
+                {
+                    "dimensions": self.dimensions,
+                    "users": self.users,
+                    "owners": self.owners,
+                    "document_frequency": self.document_frequency,
+                    "documents": self.documents,
+                    "refresh_cursor": self.refresh_cursor,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> bool:
+        """Load a snapshot written by save; the file is trusted local state"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading related notes snapshot: {str(e)}")
+            return False
+        if state["dimensions"] != self.dimensions or "refresh_cursor" not in state:
+            # Vectors of another width can't be compared with new ones, and older snapshots
+            # have no refresh cursor; rebuild instead
+            return False
+        self.users = state["users"]
+        self.owners = state["owners"]
+        self.document_frequency = state["document_frequency"]
+        self.documents = state["documents"]
+        state["refresh_cursor"].overlap = self.refresh_cursor.overlap
+        self.refresh_cursor = state["refresh_cursor"]
+        for vectors in self.users.values():
+            # A snapshot taken mid-training carries that run's bookkeeping
+            vectors.dirty = None
+        return True
@@ -0,0 +1,178 @@
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Tuple
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+from .refresh import RefreshCursor
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Weight of a term occurrence by the field it appears in
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "tags": 2.0,
+    "content": 1.0,
+    "summary": 1.0,
+    "key_points": 1.0,
+}
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def note_terms(note) -> Dict[str, float]:
+    """Field-weighted term frequencies for a note"""
+    terms: Dict[str, float] = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = getattr(note, field, None)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = " ".join(value)
+        for term in tokenize(value):
+            terms[term] = terms.get(term, 0.0) + weight
+    return terms
+
+class UserIndex:
+    """Inverted index over one user's notes"""
+
+    __slots__ = ("postings", "doc_terms", "doc_lengths", "total_length", "vocabulary")
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+        # Sorted terms, so prefix queries are a bisect plus a short scan
+        self.vocabulary: List[str] = []
+
+    def add(self, note_id: str, terms: Dict[str, float]):
+        self.doc_terms[note_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[note_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                insort(self.vocabulary, term)
+            postings[note_id] = frequency
+
+    def remove(self, note_id: str):
+        terms = self.doc_terms.pop(note_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(note_id)
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(note_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+
+    def expand(self, prefix: str, limit: int) -> List[str]:
+        """Indexed terms starting with prefix, at most limit of them"""
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+class SearchIndex:
+    """BM25 full-text index over notes, partitioned by user and updated incrementally.
+
+    Every query token also matches indexed terms it is a prefix of, so partial
+    words typed into a search box find results. The index can be snapshotted
+    to disk and reloaded, then caught up with notes changed since the snapshot.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_expansions: int = 32, refresh_overlap: float = 60.0):
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.users: Dict[str, UserIndex] = {}
+        self.owners: Dict[str, str] = {}
+        # How far refresh passes have read the store, used to catch up with other replicas and after a restart
+        self.refresh_cursor = RefreshCursor(refresh_overlap)
+
+    def add(self, note):
+        """Index a note, replacing any earlier version of it"""
+        self.remove(note.id)
+        self.users.setdefault(note.user_id, UserIndex()).add(note.id, note_terms(note))
+        self.owners[note.id] = note.user_id
+
+    def add_many(self, notes: Iterable[Any]):
+        for note in notes:
+            self.add(note)
+
+    def remove(self, note_id: str):
+        user_id = self.owners.pop(note_id, None)
+        if user_id is None:
+            return
+        index = self.users[user_id]
+        index.remove(note_id)
+        if not len(index):
+            del self.users[user_id]
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Top note ids for a query with their BM25 scores, best first"""
+        index = self.users.get(user_id)
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if index is None or not tokens:
+            return []
+        doc_count = len(index)
+        average_length = index.total_length / doc_count
+        scores: Dict[str, float] = {}
+        for token in tokens:
+            # A document scores once per query token, through its best matching term
+            token_scores: Dict[str, float] = {}
+            for term in index.expand(token, self.max_expansions):
+                postings = index.postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for note_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * index.doc_lengths[note_id] / average_length)
+                    score = idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    if score > token_scores.get(note_id, 0.0):
+                        token_scores[note_id] = score
+            for note_id, score in token_scores.items():
+                scores[note_id] = scores.get(note_id, 0.0) + score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def save(self, path: str):
+        """Write a snapshot atomically so a crash never leaves a torn file"""
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(
+                {"users": self.users, "owners": self.owners, "refresh_cursor": self.refresh_cursor},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temporary, path)
+
+    def load(self, path: str) -> bool:
+        """Load a snapshot written by save; the file is trusted local state"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading search index snapshot: {str(e)}")
+            return False
+        if "refresh_cursor" not in state:
+            # Written before refresh cursors; rebuild rather than trust its position
+            return False
+        self.users = state["users"]
+        self.owners = state["owners"]
+        state["refresh_cursor"].overlap = self.refresh_cursor.overlap
+        self.refresh_cursor = state["refresh_cursor"]
+        return True
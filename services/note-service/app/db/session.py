@@ -0,0 +1,38 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from app.core.config import settings
+
+# Async drivers for the URLs we accept in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(database_url: str):
+    """Swap a plain database URL onto its async driver"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if url.drivername in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    if backend in ("postgresql", "postgres"):
+        # asyncpg prepares every statement; keep them cached per connection
+        url = url.update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DATABASE_STATEMENT_CACHE_SIZE)}
+        )
+    return url
+
+def create_engine() -> AsyncEngine:
+    url = async_url(settings.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        # SQLite serialises writers anyway; the default pool avoids sharing connections across tasks
+        return create_async_engine(url, future=True)
+    return create_async_engine(
+        url,
+        future=True,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
@@ -0,0 +1,356 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core.blobs import BlobStats, compress, content_hash, decompress
+from .base import change_sequences, metadata, note_blobs, note_tags, note_tombstones, notes, tombstone_horizons
+from .changes import ChangesExpiredError
+from .pagination import SortKey, from_micros, sort_key
+
+# A change is (seq, note id, note), where note is None for a deletion
+Change = Tuple[int, str, Optional[Any]]
+
+NOTE_FIELDS = [column.name for column in notes.columns if column.name != "content_hash"]
+
+class SqlNote:
+    """A note row whose content is decompressed on first read"""
+
+    __slots__ = ("_row", "_content")
+
+    def __init__(self, row):
+        self._row = row
+        self._content: Optional[str] = None
+
+    def __getattr__(self, name: str):
+        return getattr(self._row, name)
+
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = decompress(self._row.codec, self._row.data).decode()
+        return self._content
+
+def _select_notes():
+    """Select notes together with their compressed content"""
+    return (
+        select(notes, note_blobs.c.codec, note_blobs.c.data)
+        .join_from(notes, note_blobs, notes.c.content_hash == note_blobs.c.hash)
+    )
+
+def _note_row(note, digest: str) -> Dict[str, Any]:
+    row = {field: getattr(note, field) for field in NOTE_FIELDS}
+    row["content_hash"] = digest
+    return row
+
+def _tag_rows(note) -> List[Dict[str, Any]]:
+    return [
+        {"note_id": note.id, "tag": tag, "user_id": note.user_id, "updated_at": note.updated_at}
+        for tag in dict.fromkeys(note.tags)
+    ]
+
+def _after(updated_at_column, id_column, after: SortKey):
+    """Keyset predicate for (updated_at, id) > after, written so both SQLite and PostgreSQL use the index"""
+    updated_at = from_micros(after[0])
+    return or_(
+        updated_at_column > updated_at,
+        and_(updated_at_column == updated_at, id_column > after[1]),
+    )
+
+class SqlNoteStore:
+    """Note store on an async SQLAlchemy engine (SQLite locally, PostgreSQL in production).
+
+    Rows come back wrapped in SqlNote, which the orm_mode response models read
+    like any other object with note attributes.
+
+    Note bodies live in note_blobs, one compressed row per distinct content
+    with a count of the notes referencing it, so repeated captures of the same
+    page are stored once.
+
+    Each write reserves change sequence numbers by updating the user's
+    change_sequences row in the same transaction. The row stays locked until
+    commit, so a user's sequence numbers become visible in order and a sync
+    client never skips a change that commits late.
+    """
+
+    # Other replicas write to the same database
+    shared = True
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+
+    async def start(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    def pool_status(self) -> Dict[str, int]:
+        pool = self.engine.sync_engine.pool
+        return {
+            "size": pool.size() if hasattr(pool, "size") else 0,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+            "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else 0,
+        }
+
+    async def blob_stats(self) -> BlobStats:
+        query = select(
+            func.coalesce(func.sum(note_blobs.c.size * note_blobs.c.refs), 0),
+            func.coalesce(func.sum(note_blobs.c.size), 0),
+            func.coalesce(func.sum(func.length(note_blobs.c.data)), 0),
+        )
+        async with self.engine.connect() as conn:
+            return BlobStats(*(await conn.execute(query)).one())
+
+    async def get(self, note_id: str) -> Optional[Any]:
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(_select_notes().where(notes.c.id == note_id))).first()
+            return SqlNote(row) if row is not None else None
+
+    async def get_many(self, note_ids: Iterable[str]) -> List[Any]:
+        """Fetch notes by id in the order given, skipping ids that no longer exist"""
+        note_ids = list(note_ids)
+        if not note_ids:
+            return []
+        async with self.engine.connect() as conn:
+            result = await conn.execute(_select_notes().where(notes.c.id.in_(note_ids)))
+            rows = {row.id: SqlNote(row) for row in result}
+        return [rows[note_id] for note_id in note_ids if note_id in rows]
+
+    async def iter_notes(self, after: Optional[SortKey] = None, batch_size: int = 1000) -> AsyncIterator[Any]:
+        """Every note of every user in (updated_at, id) order, starting just after a position"""
+        while True:
+            query = _select_notes().order_by(notes.c.updated_at, notes.c.id).limit(batch_size)
+            if after is not None:
+                query = query.where(_after(notes.c.updated_at, notes.c.id, after))
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(query)).all()
+            for row in rows:
+                yield SqlNote(row)
+            if len(rows) < batch_size:
+                return
+            after = sort_key(rows[-1])
+
+    async def iter_user_notes(
+        self,
+        user_id: str,
+        after: Optional[SortKey] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Any]:
+        """Every note of one user in (updated_at, id) order, read through a server-side cursor"""
+        query = (
+            _select_notes()
+            .where(notes.c.user_id == user_id)
+            .order_by(notes.c.updated_at, notes.c.id)
+            .execution_options(stream_results=True, max_row_buffer=batch_size)
+        )
+        if after is not None:
+            query = query.where(_after(notes.c.updated_at, notes.c.id, after))
+        async with self.engine.connect() as conn:
+            result = await conn.stream(query)
+            async for partition in result.partitions(batch_size):
+                for row in partition:
+                    yield SqlNote(row)
+
+    async def _reserve_seqs(self, conn: AsyncConnection, user_id: str, count: int) -> int:
+        """Reserve the user's next count sequence numbers, returning the last of them"""
+        bump = (
+            update(change_sequences)
+            .where(change_sequences.c.user_id == user_id)
+            .values(seq=change_sequences.c.seq + count)
+        )
+        if (await conn.execute(bump)).rowcount == 0:
+            # First write for this user; another transaction may be creating the row too
+            await conn.execute(
+                self.dialect.insert(change_sequences)
+                .values(user_id=user_id, seq=0)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+            )
+            await conn.execute(bump)
+        result = await conn.execute(
+            select(change_sequences.c.seq).where(change_sequences.c.user_id == user_id)
+        )
+        return result.scalar_one()
+
+    async def _ref_blobs(self, conn: AsyncConnection, contents: List[str]) -> List[str]:
+        """Take a reference to each body, storing bodies not seen before; returns their hashes"""
+        digests = [content_hash(text) for text in contents]
+        counts: Dict[str, int] = {}
+        bodies: Dict[str, str] = {}
+        for digest, text in zip(digests, contents):
+            counts[digest] = counts.get(digest, 0) + 1
+            bodies[digest] = text
+        rows = []
+        for digest, text in bodies.items():
+            data = text.encode()
+            codec, payload = compress(data)
+            rows.append({"hash": digest, "codec": codec, "data": payload, "size": len(data), "refs": counts[digest]})
+        upsert = self.dialect.insert(note_blobs)
+        await conn.execute(
+            upsert.on_conflict_do_update(
+                index_elements=["hash"],
+                set_={"refs": note_blobs.c.refs + upsert.excluded.refs}
+            ),
+            rows
+        )
+        return digests
+
+    async def _release_blob(self, conn: AsyncConnection, digest: str):
+        await conn.execute(
+            update(note_blobs).where(note_blobs.c.hash == digest).values(refs=note_blobs.c.refs - 1)
+        )
+        await conn.execute(delete(note_blobs).where(note_blobs.c.hash == digest, note_blobs.c.refs <= 0))
+
+    async def add(self, note):
+        await self.add_many([note])
+
+    async def add_many(self, new_notes: Iterable[Any]):
+        """Insert notes and their tags with one executemany per table"""
+        new_notes = list(new_notes)
+        if not new_notes:
+            return
+        by_user: Dict[str, List[Any]] = {}
+        for note in new_notes:
+            by_user.setdefault(note.user_id, []).append(note)
+        tag_rows = [row for note in new_notes for row in _tag_rows(note)]
+        async with self.engine.begin() as conn:
+            for user_id, user_notes in by_user.items():
+                last = await self._reserve_seqs(conn, user_id, len(user_notes))
+                for seq, note in enumerate(user_notes, last - len(user_notes) + 1):
+                    note.seq = seq
+            digests = await self._ref_blobs(conn, [note.content for note in new_notes])
+            await conn.execute(
+                insert(notes),
+                [_note_row(note, digest) for note, digest in zip(new_notes, digests)]
+            )
+            if tag_rows:
+                await conn.execute(insert(note_tags), tag_rows)
+
+    async def update(self, note, expected_version: Optional[int] = None) -> bool:
+        """Replace a note, unless it is gone or no longer at expected_version"""
+        async with self.engine.connect() as conn:
+            async with conn.begin() as transaction:
+                # Holding the user's sequence row serializes their writes, so the note can't change under us
+                note.seq = await self._reserve_seqs(conn, note.user_id, 1)
+                query = select(notes.c.content_hash).where(notes.c.id == note.id)
+                if expected_version is not None:
+                    query = query.where(notes.c.version == expected_version)
+                previous_digest = (await conn.execute(query)).scalar()
+                if previous_digest is None:
+                    await transaction.rollback()
+                    return False
+                # Take the new reference first, so an unchanged body is never dropped
+                [digest] = await self._ref_blobs(conn, [note.content])
+                row = _note_row(note, digest)
+                del row["id"]
+                await conn.execute(update(notes).where(notes.c.id == note.id).values(**row))
+                await self._release_blob(conn, previous_digest)
+                await conn.execute(delete(note_tags).where(note_tags.c.note_id == note.id))
+                tag_rows = _tag_rows(note)
+                if tag_rows:
+                    await conn.execute(insert(note_tags), tag_rows)
+        return True
+
+    async def delete(self, note_id: str) -> bool:
+        """Delete a note, leaving a tombstone in its owner's change sequence"""
+        async with self.engine.connect() as conn:
+            async with conn.begin() as transaction:
+                user_id = (await conn.execute(select(notes.c.user_id).where(notes.c.id == note_id))).scalar()
+                if user_id is None:
+                    await transaction.rollback()
+                    return False
+                seq = await self._reserve_seqs(conn, user_id, 1)
+                digest = (await conn.execute(select(notes.c.content_hash).where(notes.c.id == note_id))).scalar()
+                if digest is None:
+                    await transaction.rollback()
+                    return False
+                await conn.execute(delete(note_tags).where(note_tags.c.note_id == note_id))
+                await conn.execute(delete(notes).where(notes.c.id == note_id))
+                await self._release_blob(conn, digest)
+                await conn.execute(insert(note_tombstones).values(
+                    note_id=note_id, user_id=user_id, seq=seq, deleted_at=datetime.utcnow()
+                ))
+        return True
+
+    async def changes(self, user_id: str, since: int = 0, limit: int = 100) -> List[Change]:
+        """The latest change to each note the user touched after sequence number since, oldest first.
+
+        Raises ChangesExpiredError when deletions after since have been purged.
+        """
+        note_query = (
+            _select_notes()
+            .where(notes.c.user_id == user_id, notes.c.seq > since)
+            .order_by(notes.c.seq)
+            .limit(limit)
+        )
+        tombstone_query = (
+            select(note_tombstones.c.seq, note_tombstones.c.note_id)
+            .where(note_tombstones.c.user_id == user_id, note_tombstones.c.seq > since)
+            .order_by(note_tombstones.c.seq)
+            .limit(limit)
+        )
+        async with self.engine.connect() as conn:
+            if since > 0:
+                horizon = (await conn.execute(
+                    select(tombstone_horizons.c.seq).where(tombstone_horizons.c.user_id == user_id)
+                )).scalar()
+                if horizon is not None and since < horizon:
+                    raise ChangesExpiredError(f"Deletions before sequence number {horizon} have been purged")
+            changed = [(row.seq, row.id, SqlNote(row)) for row in await conn.execute(note_query)]
+            deleted = [(row.seq, row.note_id, None) for row in await conn.execute(tombstone_query)]
+        return sorted(changed + deleted, key=lambda change: change[0])[:limit]
+
+    async def purge_tombstones(self, before: datetime) -> int:
+        """Drop tombstones of notes deleted before a time, moving each affected user's horizon past them"""
+        expired = note_tombstones.c.deleted_at < before
+        async with self.engine.begin() as conn:
+            newest = await conn.execute(
+                select(note_tombstones.c.user_id, func.max(note_tombstones.c.seq).label("seq"))
+                .where(expired)
+                .group_by(note_tombstones.c.user_id)
+            )
+            for row in newest.all():
+                # A user's sequence numbers grow with time, so this only ever moves the horizon forward
+                upsert = self.dialect.insert(tombstone_horizons).values(user_id=row.user_id, seq=row.seq)
+                await conn.execute(
+                    upsert.on_conflict_do_update(index_elements=["user_id"], set_={"seq": upsert.excluded.seq})
+                )
+            result = await conn.execute(delete(note_tombstones).where(expired))
+        return result.rowcount
+
+    async def list(
+        self,
+        user_id: str,
+        limit: int = 10,
+        after: Optional[SortKey] = None,
+        skip: int = 0,
+        source_type: Optional[str] = None,
+        tag: Optional[str] = None
+    ) -> List[Any]:
+        """List a user's notes by (updated_at, id), starting just after a cursor position"""
+        if tag:
+            # Walk the (user, tag) index, which carries the sort key itself
+            query = (
+                _select_notes()
+                .join(note_tags, note_tags.c.note_id == notes.c.id)
+                .where(note_tags.c.user_id == user_id, note_tags.c.tag == tag)
+                .order_by(note_tags.c.updated_at, note_tags.c.note_id)
+            )
+            if after is not None:
+                query = query.where(_after(note_tags.c.updated_at, note_tags.c.note_id, after))
+        else:
+            query = (
+                _select_notes()
+                .where(notes.c.user_id == user_id)
+                .order_by(notes.c.updated_at, notes.c.id)
+            )
+            if after is not None:
+                query = query.where(_after(notes.c.updated_at, notes.c.id, after))
+        if source_type:
+            query = query.where(notes.c.source_type == source_type)
+        query = query.offset(skip).limit(limit)
+        async with self.engine.connect() as conn:
+            result = await conn.execute(query)
+            return [SqlNote(row) for row in result]
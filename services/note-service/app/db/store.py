@@ -0,0 +1,12 @@
+from app.core.config import settings
+from .memory import MemoryNoteStore
+from .session import create_engine
+from .sql import SqlNoteStore
+
+def create_note_store():
+    """Build the note store selected by NOTE_STORE"""
+    if settings.NOTE_STORE == "memory":
+        return MemoryNoteStore()
+    if settings.NOTE_STORE == "sql":
+        return SqlNoteStore(create_engine())
+    raise ValueError(f"Unknown NOTE_STORE: {settings.NOTE_STORE}")
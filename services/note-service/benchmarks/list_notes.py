@@ -0,0 +1,85 @@
+"""Show that listing a page of a user's notes stays flat as the global note count grows.
+
+Run from services/note-service:
+
+    python benchmarks/list_notes.py --sizes 10000,100000,1000000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.memory import MemoryNoteStore
+
+SOURCE_TYPES = ["web", "video", "coursera", "manual"]
+TAGS = [f"tag{i}" for i in range(50)]
+START = datetime(2024, 1, 1)
+
+class BenchNote:
+    __slots__ = (
+        "id", "user_id", "title", "content", "source_type", "source_url", "tags", "summary",
+        "key_points", "created_at", "updated_at", "version", "seq",
+    )
+
+    def __init__(self, note_id: str, user_id: str, updated_at: datetime):
+        self.id = note_id
+        self.user_id = user_id
+        self.title = f"Note {note_id}"
+        self.content = "Benchmark note body"
+        self.source_type = random.choice(SOURCE_TYPES)
+        self.source_url = None
+        self.tags = random.sample(TAGS, 3)
+        self.summary = None
+        self.key_points = []
+        self.created_at = updated_at
+        self.updated_at = updated_at
+        self.version = 1
+        self.seq = 0
+
+async def fill(store: MemoryNoteStore, start: int, stop: int, users: int, user_notes: int):
+    for i in range(start, stop):
+        # The measured user owns a fixed number of notes; everyone else's keep growing
+        user_id = "bench-user" if i < user_notes else f"user{i % users}"
+        await store.add(BenchNote(str(i), user_id, START + timedelta(milliseconds=i)))
+
+async def time_query(store: MemoryNoteStore, repeat: int, **filters) -> float:
+    # Start from the middle of the user's notes, as a sync loop paging through would
+    keys = store.by_user["bench-user"]
+    after = keys[len(keys) // 2]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await store.list("bench-user", limit=50, after=after, **filters)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+async def run(sizes, users: int, user_notes: int, repeat: int):
+    random.seed(0)
+    store = MemoryNoteStore()
+    filled = 0
+    print(f"{'notes':>10} {'user notes':>10} {'all us':>8} {'tag us':>8} {'tag+type us':>12}")
+    for size in sizes:
+        await fill(store, filled, size, users, user_notes)
+        filled = size
+        print(
+            f"{size:>10} {len(store.by_user.get('bench-user', {})):>10} "
+            f"{await time_query(store, repeat):>8.1f} "
+            f"{await time_query(store, repeat, tag='tag7'):>8.1f} "
+            f"{await time_query(store, repeat, tag='tag7', source_type='web'):>12.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--user-notes", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    asyncio.run(run(sizes, args.users, args.user_notes, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Measure resident bytes per note and get/list throughput of the in-memory note store.
+
+Run from services/note-service (memory is read from /proc, so Linux only):
+
+    python benchmarks/memory_store.py --notes 1000000
+    python benchmarks/memory_store.py --notes 1000000 --baseline
+
+--baseline holds plain Pydantic notes in a dict instead, as note-service did
+before notes had a compact stored form.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import gc
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+from app.db.memory import MemoryNoteStore
+
+SOURCE_TYPES = ["web", "video", "coursera", "manual"]
+TAGS = [f"tag{i}" for i in range(50)]
+WORDS = [f"word{i}" for i in range(5000)]
+START = datetime(2024, 1, 1)
+
+class BenchNote(BaseModel):
+    # Same fields as the service's Note response model
+    id: str
+    user_id: str
+    title: str
+    content: str
+    source_type: str
+    source_url: Optional[str] = None
+    tags: List[str] = []
+    summary: Optional[str] = None
+    key_points: List[str] = []
+    created_at: datetime
+    updated_at: datetime
+    version: int = 1
+    seq: int = 0
+
+    class Config:
+        orm_mode = True
+
+def resident_bytes() -> int:
+    gc.collect()
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def make_note(i: int, users: int) -> BenchNote:
+    # Each user's id, source type and tag strings arrive as fresh objects, as parsed from JSON
+    created = START + timedelta(seconds=i)
+    return BenchNote.construct(
+        id=f"{i:026d}",
+        user_id=f"user{i % users}".join(["", ""]),
+        title=" ".join(random.choices(WORDS, k=6)),
+        content=" ".join(random.choices(WORDS, k=40)),
+        source_type="".join(random.choice(SOURCE_TYPES)),
+        source_url=f"https://example.com/articles/{i}",
+        tags=["".join(tag) for tag in random.sample(TAGS, random.randint(0, 3))],
+        summary=None,
+        key_points=[],
+        created_at=created,
+        updated_at=created,
+        version=1,
+        seq=0,
+    )
+
+def rate(count: int, started: float) -> str:
+    return f"{count / (time.perf_counter() - started):,.0f}/s"
+
+async def run(args):
+    random.seed(0)
+    users = max(1, args.notes // args.notes_per_user)
+    baseline = {} if args.baseline else None
+    store = None if args.baseline else MemoryNoteStore()
+
+    before = resident_bytes()
+    started = time.perf_counter()
+    for i in range(args.notes):
+        note = make_note(i, users)
+        if baseline is not None:
+            baseline[note.id] = note
+        else:
+            await store.add(note)
+    print(f"stored {args.notes:,} notes for {users:,} users at {rate(args.notes, started)}")
+    used = resident_bytes() - before
+    print(f"resident: {used / args.notes:,.0f} bytes per note")
+    if store is not None:
+        stats = store.blobs.stats()
+        print(f"  of which compressed content: {stats.stored_bytes / args.notes:,.0f} bytes per note")
+        print(f"  content before compression: {stats.logical_bytes / args.notes:,.0f} bytes per note")
+        await throughput(store, args, users)
+
+async def throughput(store: MemoryNoteStore, args, users: int):
+    note_ids = [f"{random.randrange(args.notes):026d}" for _ in range(args.operations)]
+    started = time.perf_counter()
+    for note_id in note_ids:
+        await store.get(note_id)
+    print(f"get: {rate(len(note_ids), started)}")
+
+    started = time.perf_counter()
+    for note_id in note_ids:
+        BenchNote.from_orm(await store.get(note_id)).dict()
+    print(f"get + response model: {rate(len(note_ids), started)}")
+
+    user_ids = [f"user{random.randrange(users)}" for _ in range(args.operations // 10)]
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await store.list(user_id, limit=20)
+    print(f"list 20: {rate(len(user_ids), started)}")
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        [BenchNote.from_orm(note).dict() for note in await store.list(user_id, limit=20)]
+    print(f"list 20 + response models: {rate(len(user_ids), started)}")
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await store.list(user_id, limit=20, tag=random.choice(TAGS))
+    print(f"list 20 by tag: {rate(len(user_ids), started)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000000)
+    parser.add_argument("--notes-per-user", type=int, default=100)
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--baseline", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measure related-notes query latency and IVF recall for one user with many notes.
+
+Run from services/note-service:
+
+    python benchmarks/related.py --notes 100000
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.related import RelatedIndex, train_ivf
+
+class BenchNote:
+    __slots__ = ("id", "user_id", "title", "content", "tags", "summary", "key_points")
+
+    def __init__(self, note_id: str, user_id: str, words):
+        self.id = note_id
+        self.user_id = user_id
+        self.title = " ".join(words[:5])
+        self.content = " ".join(words[5:])
+        self.tags = words[:2]
+        self.summary = None
+        self.key_points = []
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+def topic_precision(note_ids, results, topics: int) -> float:
+    """Share of returned notes on the query note's topic"""
+    return statistics.mean(
+        sum(int(hit) % topics == int(note_id) % topics for hit, _ in hits) / max(len(hits), 1)
+        for note_id, hits in zip(note_ids, results)
+    )
+
+def time_queries(index: RelatedIndex, note_ids, limit: int):
+    timings, results = [], []
+    for note_id in note_ids:
+        started = time.perf_counter()
+        results.append(index.related("bench-user", note_id, limit))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--topic-words", type=int, default=50)
+    parser.add_argument("--words-per-note", type=int, default=40)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--probes", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(args.vocabulary)))
+    # Each topic favours its own slice of words, so notes on one topic really are related
+    topic_words = [random.sample(vocabulary, args.topic_words) for _ in range(args.topics)]
+    index = RelatedIndex(args.dimensions, ivf_threshold=args.notes + 1, probes=args.probes)
+
+    started = time.perf_counter()
+    for i in range(args.notes):
+        topic = topic_words[i % args.topics]
+        words = random.choices(topic, k=args.words_per_note // 2)
+        words += random.choices(vocabulary, cum_weights=weights, k=args.words_per_note - len(words))
+        random.shuffle(words)
+        index.add(BenchNote(str(i), "bench-user", words))
+    build = time.perf_counter() - started
+    print(f"indexed {args.notes} notes in {build:.1f}s ({args.notes / build:.0f} notes/s)")
+
+    note_ids = [str(random.randrange(args.notes)) for _ in range(args.queries)]
+    exact_timings, exact_results = time_queries(index, note_ids, 10)
+    p50, p99 = percentiles(exact_timings)
+    precision = topic_precision(note_ids, exact_results, args.topics)
+    print(f"       exact: p50={p50:.2f}ms p99={p99:.2f}ms topic precision@10={precision:.2f}")
+
+    vectors = index.users["bench-user"]
+    started = time.perf_counter()
+    centroids, assignments = train_ivf(vectors.matrix[:len(vectors)].copy(), max(1, int(math.sqrt(len(vectors)))))
+    vectors.install(centroids, list(vectors.ids), assignments, set())
+    print(f"trained {len(centroids)} IVF lists in {time.perf_counter() - started:.1f}s")
+
+    index.ivf_threshold = 0
+    ivf_timings, ivf_results = time_queries(index, note_ids, 10)
+    p50, p99 = percentiles(ivf_timings)
+    recall = statistics.mean(
+        len({hit for hit, _ in approximate} & {hit for hit, _ in exact}) / max(len(exact), 1)
+        for approximate, exact in zip(ivf_results, exact_results)
+    )
+    precision = topic_precision(note_ids, ivf_results, args.topics)
+    print(
+        f"IVF {args.probes:>2} probes: p50={p50:.2f}ms p99={p99:.2f}ms "
+        f"topic precision@10={precision:.2f} recall@10 vs exact={recall:.2f}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measure full-text query latency as the number of indexed notes grows.
+
+Run from services/note-service:
+
+    python benchmarks/search.py --notes 1000000 --users 100
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.search import SearchIndex
+
+class BenchNote:
+    __slots__ = ("id", "user_id", "title", "content", "tags", "summary", "key_points")
+
+    def __init__(self, note_id: str, user_id: str, words):
+        self.id = note_id
+        self.user_id = user_id
+        self.title = " ".join(words[:5])
+        self.content = " ".join(words[5:])
+        self.tags = words[:2]
+        self.summary = None
+        self.key_points = []
+
+def zipf_words(vocabulary, cum_weights, count: int):
+    return random.choices(vocabulary, cum_weights=cum_weights, k=count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--words-per-note", type=int, default=40)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(args.vocabulary)))
+    index = SearchIndex()
+
+    started = time.perf_counter()
+    for i in range(args.notes):
+        note = BenchNote(str(i), f"user{i % args.users}", zipf_words(vocabulary, weights, args.words_per_note))
+        index.add(note, (i, str(i)))
+    build = time.perf_counter() - started
+    print(f"indexed {args.notes} notes for {args.users} users in {build:.1f}s ({args.notes / build:.0f} notes/s)")
+
+    queries = {
+        "rare term": lambda: random.choice(vocabulary[5000:]),
+        "common term": lambda: random.choice(vocabulary[:20]),
+        "two terms": lambda: " ".join(zipf_words(vocabulary, weights, 2)),
+        "prefix": lambda: f"w{random.randint(100, 999)}",
+    }
+    for name, make_query in queries.items():
+        timings = []
+        for _ in range(args.queries):
+            user_id = f"user{random.randrange(args.users)}"
+            query = make_query()
+            started = time.perf_counter()
+            index.search(user_id, query, 10)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(
+            f"{name:>12}: p50={statistics.median(timings):.2f}ms "
+            f"p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
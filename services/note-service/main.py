@@ -1,12 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from datetime import datetime
-from pydantic import BaseModel
+from fastapi.security import OAuth2PasswordBearer
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from datetime import datetime, timedelta
+from pydantic import BaseModel, ValidationError
 import logging
-from prometheus_client import Counter, Histogram
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 import time
-import httpx
+import asyncio
+import zlib
+from app.core.cache import create_note_cache
+from app.core.config import settings
+from app.core.deadline import DeadlineMiddleware, check_deadline
+from autonote_common.ids import new_id
+from autonote_common.security import KeysUnavailableError, TokenVerificationError, TokenVerifier
+from app.core.ndjson import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, RequestBody, dumps_line, iter_lines
+from app.db.changes import ChangesExpiredError
+from app.db.store import create_note_store
+from app.db.pagination import decode_cursor, encode_cursor, sort_key
+from app.db.refresh import index_written, refresh
+from app.db.search import SearchIndex
+from app.db.related import RelatedIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +31,91 @@ logger = logging.getLogger(__name__)
 # Prometheus metrics
 NOTE_OPERATIONS = Counter('note_operations_total', 'Total note operations', ['operation'])
 NOTE_LATENCY = Histogram('note_operation_duration_seconds', 'Note operation latency', ['operation'])
+DB_POOL_CONNECTIONS = Gauge('note_db_pool_connections', 'Database pool connections', ['state'])
+CONTENT_BLOB_BYTES = Gauge('note_content_blob_bytes', 'Note content bytes: logical, unique or stored', ['kind'])
+CONTENT_DEDUP_RATIO = Gauge('note_content_dedup_ratio', 'Logical over unique note content bytes')
+CONTENT_COMPRESSION_RATIO = Gauge('note_content_compression_ratio', 'Unique over stored note content bytes')
+NOTE_CACHE_LOOKUPS = Counter('note_cache_lookups_total', 'Note cache lookups', ['cache', 'result'])
+NOTE_CACHE_HIT_RATIO = Gauge('note_cache_hit_ratio', 'Share of note cache lookups served from the cache', ['cache'])
+NOTE_CACHE_SAVED_SECONDS = Counter(
+    'note_cache_saved_seconds_total', 'Store time saved by cache hits, at the average load time', ['cache']
+)
+
+note_store = create_note_store()
+for _state in ("size", "checked_out", "overflow"):
+    DB_POOL_CONNECTIONS.labels(state=_state).set_function(
+        lambda state=_state: note_store.pool_status()[state]
+    )
+
+def _observe_cache(cache: str, hit: bool, saved_seconds: float):
+    NOTE_CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+    if hit:
+        NOTE_CACHE_SAVED_SECONDS.labels(cache=cache).inc(saved_seconds)
+
+# Single notes and first list pages, read through from note_store and invalidated by every write below
+note_cache = create_note_cache(_observe_cache)
+for _cache in ("note", "list"):
+    NOTE_CACHE_HIT_RATIO.labels(cache=_cache).set_function(lambda cache=_cache: note_cache.hit_ratio(cache))
+
+# Full-text and related-notes indexes over each user's notes, kept in step with every write below
+search_index = SearchIndex(refresh_overlap=settings.SEARCH_REFRESH_OVERLAP_SECONDS)
+related_index = RelatedIndex(
+    settings.RELATED_DIMENSIONS,
+    settings.RELATED_IVF_THRESHOLD,
+    settings.RELATED_IVF_PROBES,
+    settings.SEARCH_REFRESH_OVERLAP_SECONDS
+)
+_index_task: Optional[asyncio.Task] = None
+_purge_task: Optional[asyncio.Task] = None
+
+def index_note(note):
+    index_written([search_index, related_index], note)
+
+def unindex_note(note_id: str):
+    search_index.remove(note_id)
+    related_index.remove(note_id)
+
+async def refresh_indexes():
+    """Index notes changed since each index last caught up, including writes made by other replicas"""
+    await refresh(note_store, [search_index, related_index])
+
+def save_indexes():
+    if settings.SEARCH_INDEX_PATH:
+        search_index.save(settings.SEARCH_INDEX_PATH)
+    if settings.RELATED_INDEX_PATH:
+        related_index.save(settings.RELATED_INDEX_PATH)
+
+async def _maintain_indexes():
+    last_snapshot = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.SEARCH_REFRESH_SECONDS)
+        try:
+            # Every write to an unshared store was indexed as it was made
+            if note_store.shared:
+                await refresh_indexes()
+            await related_index.train_stale()
+            if time.monotonic() - last_snapshot >= settings.SEARCH_SNAPSHOT_SECONDS:
+                save_indexes()
+                last_snapshot = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error maintaining note indexes: {str(e)}")
+
+async def _purge_tombstones():
+    while True:
+        try:
+            purged = await note_store.purge_tombstones(
+                datetime.utcnow() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+            )
+            if purged:
+                logger.info(f"Purged {purged} expired note tombstones")
+        except Exception as e:
+            logger.error(f"Error purging note tombstones: {str(e)}")
+        await asyncio.sleep(settings.TOMBSTONE_PURGE_SECONDS)
+
+# Opaque cursor for the next page of GET /notes; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Carries a note's version, checked against If-Match on PUT and PATCH
+ETAG_HEADER = "ETag"
 
 app = FastAPI(
     title="AutoNote Note Service",
@@ -29,8 +130,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 
+# Optional compression on the service-to-gateway hop
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE)
+
+# Deadline propagated by the API gateway
+app.add_middleware(DeadlineMiddleware)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.AUTH_SERVICE_URL}/token")
+token_verifier = TokenVerifier(
+    settings.AUTH_SERVICE_URL,
+    settings.JWT_ALGORITHMS,
+    settings.JWKS_REFRESH_SECONDS,
+    settings.REVOCATION_REFRESH_SECONDS,
+    settings.JWKS_MIN_REFRESH_SECONDS
+)
+
+@app.on_event("startup")
+async def startup():
+    global _index_task, _purge_task
+    await note_store.start()
+    # A snapshot only needs the notes changed since it was written; without one this is a full build
+    if settings.SEARCH_INDEX_PATH:
+        search_index.load(settings.SEARCH_INDEX_PATH)
+    if settings.RELATED_INDEX_PATH:
+        related_index.load(settings.RELATED_INDEX_PATH)
+    await refresh_indexes()
+    _index_task = asyncio.create_task(_maintain_indexes())
+    _purge_task = asyncio.create_task(_purge_tombstones())
+    await token_verifier.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await token_verifier.stop()
+    for task in (_index_task, _purge_task):
+        if task is not None:
+            task.cancel()
+    save_indexes()
+    await note_cache.close()
+    await note_store.close()
+
 # Models
 class NoteBase(BaseModel):
     title: str
@@ -49,44 +191,105 @@ class Note(NoteBase):
     updated_at: datetime
     summary: Optional[str] = None
     key_points: List[str] = []
+    version: int = 1
+    # Position in the owner's change sequence, assigned by the store on every write
+    seq: int = 0
 
     class Config:
         orm_mode = True
 
-# Mock database - Replace with actual database in production
-notes_db = {}
+class NotePage(BaseModel):
+    # A cached first page of GET /notes
+    notes: List[Note]
+    next_cursor: Optional[str] = None
+
+class NoteImport(NoteCreate):
+    # Kept from the tool being migrated from; updated_at is always the import time
+    created_at: Optional[datetime] = None
+
+class NotePatch(BaseModel):
+    # Only the fields sent are changed
+    title: Optional[str] = None
+    content: Optional[str] = None
+    source_type: Optional[str] = None
+    source_url: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+class NoteChange(BaseModel):
+    seq: int
+    id: str
+    deleted: bool
+    # Current state of the note, or None when it was deleted
+    note: Optional[Note] = None
+
+class NoteChanges(BaseModel):
+    changes: List[NoteChange]
+    # Pass back as since to fetch the next changes
+    next_since: int
+    has_more: bool
+
 
 # Helper functions
-async def verify_token(token: str) -> str:
-    """Verify JWT token with Auth Service"""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                "http://auth-service:8001/users/me",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()["username"]
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        except Exception as e:
-            logger.error(f"Error verifying token: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error verifying authentication"
-            )
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    """Get current user from a locally verified token"""
+    try:
+        claims = await token_verifier.verify(token, timeout=check_deadline(request))
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except KeysUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error verifying authentication"
+        )
+    return claims["sub"]
+
+def note_etag(note) -> str:
+    return f'"{note.version}"'
+
+def check_if_match(if_match: Optional[str], note):
+    """Reject a write made against a version of the note other than the current one"""
+    if if_match is None:
+        return
+    candidates = [tag.strip() for tag in if_match.split(",")]
+    # The gateway weakens ETags on responses it compresses, so compare weakly
+    if "*" in candidates or note_etag(note) in (tag[2:] if tag.startswith("W/") else tag for tag in candidates):
+        return
+    raise HTTPException(status_code=412, detail="Note has been modified")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current user from token"""
-    return await verify_token(token)
+async def fetch_note(note_id: str) -> Optional[Note]:
+    """Read a note through the cache; writes go to note_store directly"""
+    if not note_cache.enabled:
+        return await note_store.get(note_id)
+    
+    async def load() -> Optional[bytes]:
+        note = await note_store.get(note_id)
+        return Note.from_orm(note).json().encode() if note is not None else None
+    
+    data = await note_cache.read_through("note", note_cache.note_key(note_id), load)
+    # An empty entry marks a deleted note
+    return Note.parse_raw(data) if data else None
+
+async def cache_written(note: Note):
+    await note_cache.put(note_cache.note_key(note.id), note.json().encode())
+    await note_cache.invalidate_lists(note.user_id)
+
+async def save_update(updated_note: Note, current_version: int, response: Response):
+    """Store an update made from current_version, failing if another write got there first"""
+    if not await note_store.update(updated_note, expected_version=current_version):
+        raise HTTPException(status_code=412, detail="Note has been modified")
+    index_note(updated_note)
+    await cache_written(updated_note)
+    response.headers[ETAG_HEADER] = note_etag(updated_note)
 
 # Endpoints
 @app.post("/notes", response_model=Note)
-async def create_note(note: NoteCreate, current_user: str = Depends(get_current_user)):
+async def create_note(note: NoteCreate, response: Response, current_user: str = Depends(get_current_user)):
     start_time = time.time()
-    note_id = str(len(notes_db) + 1)
+    note_id = new_id()
     now = datetime.utcnow()
     
     new_note = Note(
@@ -97,99 +300,372 @@ async def create_note(note: NoteCreate, current_user: str = Depends(get_current_
         **note.dict()
     )
     
-    notes_db[note_id] = new_note
+    await note_store.add(new_note)
+    index_note(new_note)
+    await cache_written(new_note)
+    response.headers[ETAG_HEADER] = note_etag(new_note)
     NOTE_OPERATIONS.labels(operation="create").inc()
     NOTE_LATENCY.labels(operation="create").observe(time.time() - start_time)
     
     return new_note
 
+async def _store_import_batch(batch: List[Note], results: List[dict]) -> int:
+    """Insert a batch with one store call and one index pass, marking its lines failed on error"""
+    if not batch:
+        return 0
+    try:
+        await note_store.add_many(batch)
+    except Exception as e:
+        logger.error(f"Error importing notes: {str(e)}")
+        failed = {note.id for note in batch}
+        for result in results:
+            if result.get("id") in failed:
+                result.pop("id")
+                result.update({"status": "error", "error": "Failed to store note"})
+        return 0
+    for note in batch:
+        index_note(note)
+    # Imported notes are cached when first read; only the owner's list pages are now stale
+    await note_cache.invalidate_lists(batch[0].user_id)
+    return len(batch)
+
+async def _import_notes(chunks: AsyncIterator[bytes], current_user: str) -> AsyncIterator[bytes]:
+    start_time = time.time()
+    batch: List[Note] = []
+    results: List[dict] = []
+    imported = 0
+    line_number = 0
+    
+    async for line in iter_lines(chunks, settings.IMPORT_MAX_LINE_BYTES):
+        line_number += 1
+        if line is None:
+            results.append({"line": line_number, "status": "error", "error": "Line too long"})
+        elif line.strip():
+            try:
+                item = NoteImport.parse_raw(line)
+            except ValidationError as e:
+                results.append({"line": line_number, "status": "error", "error": e.errors()})
+            else:
+                now = datetime.utcnow()
+                # Already validated, so skip a second round of validation
+                note = Note.construct(
+                    id=new_id(),
+                    user_id=current_user,
+                    created_at=item.created_at or now,
+                    updated_at=now,
+                    summary=None,
+                    key_points=[],
+                    version=1,
+                    seq=0,
+                    **item.dict(exclude={"created_at"})
+                )
+                batch.append(note)
+                results.append({"line": line_number, "status": "created", "id": note.id})
+        
+        if len(batch) >= settings.IMPORT_BATCH_SIZE or len(results) >= settings.IMPORT_BATCH_SIZE:
+            imported += await _store_import_batch(batch, results)
+            yield b"".join(dumps_line(result) for result in results)
+            batch, results = [], []
+    
+    imported += await _store_import_batch(batch, results)
+    if results:
+        yield b"".join(dumps_line(result) for result in results)
+    
+    NOTE_OPERATIONS.labels(operation="import").inc(imported)
+    NOTE_LATENCY.labels(operation="import").observe(time.time() - start_time)
+
+@app.post("/notes/import")
+async def import_notes(request: Request, current_user: str = Depends(get_current_user)):
+    """Bulk-create notes from an NDJSON body of NoteCreate objects, streaming back one result per line"""
+    body = RequestBody(request)
+    return DuplexStreamingResponse(_import_notes(body.stream(), current_user), body, media_type=NDJSON_MEDIA_TYPE)
+
+async def _export_notes(current_user: str, after, compress: bool) -> AsyncIterator[bytes]:
+    start_time = time.time()
+    fields = list(Note.__fields__)
+    compressor = zlib.compressobj(settings.EXPORT_COMPRESSION_LEVEL, zlib.DEFLATED, 31) if compress else None
+    lines: List[bytes] = []
+    exported = 0
+    
+    async for note in note_store.iter_user_notes(current_user, after, settings.EXPORT_BATCH_SIZE):
+        lines.append(dumps_line({
+            "cursor": encode_cursor(sort_key(note)),
+            "note": {field: getattr(note, field) for field in fields},
+        }))
+        if len(lines) >= settings.EXPORT_BATCH_SIZE:
+            chunk = b"".join(lines)
+            exported += len(lines)
+            lines = []
+            # Sync flush so whatever arrived before a dropped connection still decompresses
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+    
+    chunk = b"".join(lines)
+    exported += len(lines)
+    yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+    
+    NOTE_OPERATIONS.labels(operation="export").inc(exported)
+    NOTE_LATENCY.labels(operation="export").observe(time.time() - start_time)
+
+@app.get("/notes/export")
+async def export_notes(
+    current_user: str = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    gzip: bool = False
+):
+    """Stream all of the caller's notes as NDJSON {"cursor", "note"} lines; pass the last cursor received to resume"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    filename = "notes.ndjson.gz" if gzip else "notes.ndjson"
+    return StreamingResponse(
+        _export_notes(current_user, after, gzip),
+        media_type="application/gzip" if gzip else NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/notes", response_model=List[Note])
 async def list_notes(
+    response: Response,
     current_user: str = Depends(get_current_user),
-    skip: int = 0,
-    limit: int = 10,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
     source_type: Optional[str] = None,
     tag: Optional[str] = None
 ):
+    """List notes ordered by (updated_at, id); pass X-Next-Cursor back as cursor for the next page"""
     start_time = time.time()
-    user_notes = [
-        note for note in notes_db.values()
-        if note.user_id == current_user
-    ]
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    # Apply filters
-    if source_type:
-        user_notes = [note for note in user_notes if note.source_type == source_type]
-    if tag:
-        user_notes = [note for note in user_notes if tag in note.tags]
+    async def load():
+        # Fetch one extra note to learn whether another page exists
+        notes = await note_store.list(
+            current_user, limit=limit + 1, after=after, skip=skip, source_type=source_type, tag=tag
+        )
+        if len(notes) > limit:
+            return notes[:limit], encode_cursor(sort_key(notes[limit - 1]))
+        return notes, None
     
-    # Apply pagination
-    paginated_notes = user_notes[skip:skip + limit]
+    # Only first pages are cached; deeper pages are read far less often
+    if note_cache.enabled and after is None and skip == 0:
+        key = await note_cache.list_key(current_user, limit=limit, source_type=source_type, tag=tag)
+        
+        async def load_page() -> bytes:
+            notes, next_cursor = await load()
+            return NotePage(notes=notes, next_cursor=next_cursor).json().encode()
+        
+        page = NotePage.parse_raw(await note_cache.read_through("list", key, load_page))
+        paginated_notes, next_cursor = page.notes, page.next_cursor
+    else:
+        paginated_notes, next_cursor = await load()
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     NOTE_OPERATIONS.labels(operation="list").inc()
     NOTE_LATENCY.labels(operation="list").observe(time.time() - start_time)
     
     return paginated_notes
 
+@app.get("/notes/search", response_model=List[Note])
+async def search_notes(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: str = Depends(get_current_user)
+):
+    """Search the caller's notes by relevance; every query word also matches as a prefix"""
+    start_time = time.time()
+    hits = search_index.search(current_user, q, limit)
+    notes = await note_store.get_many(note_id for note_id, _ in hits)
+    
+    # Another replica may have deleted a hit since the last refresh
+    found = {note.id for note in notes}
+    for note_id, _ in hits:
+        if note_id not in found:
+            unindex_note(note_id)
+    
+    NOTE_OPERATIONS.labels(operation="search").inc()
+    NOTE_LATENCY.labels(operation="search").observe(time.time() - start_time)
+    
+    return [note for note in notes if note.user_id == current_user]
+
+@app.get("/notes/changes", response_model=NoteChanges)
+async def list_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(settings.CHANGES_PAGE_SIZE, ge=1, le=settings.CHANGES_PAGE_SIZE),
+    current_user: str = Depends(get_current_user)
+):
+    """Notes created, updated or deleted after change sequence number since; since=0 returns every note"""
+    start_time = time.time()
+    # Fetch one extra change to learn whether more are waiting
+    try:
+        changes = await note_store.changes(current_user, since, limit + 1)
+    except ChangesExpiredError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Changes this far back are no longer kept; sync again from since=0"
+        )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    
+    NOTE_OPERATIONS.labels(operation="changes").inc()
+    NOTE_LATENCY.labels(operation="changes").observe(time.time() - start_time)
+    
+    return NoteChanges(
+        changes=[
+            NoteChange(seq=seq, id=note_id, deleted=note is None, note=note)
+            for seq, note_id, note in changes
+        ],
+        next_since=changes[-1][0] if changes else since,
+        has_more=has_more
+    )
+
 @app.get("/notes/{note_id}", response_model=Note)
-async def get_note(note_id: str, current_user: str = Depends(get_current_user)):
+async def get_note(note_id: str, response: Response, current_user: str = Depends(get_current_user)):
     start_time = time.time()
-    if note_id not in notes_db:
+    note = await fetch_note(note_id)
+    if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    note = notes_db[note_id]
     if note.user_id != current_user:
         raise HTTPException(status_code=403, detail="Not authorized to access this note")
     
+    response.headers[ETAG_HEADER] = note_etag(note)
     NOTE_OPERATIONS.labels(operation="get").inc()
     NOTE_LATENCY.labels(operation="get").observe(time.time() - start_time)
     
     return note
 
+@app.get("/notes/{note_id}/related", response_model=List[Note])
+async def related_notes(
+    note_id: str,
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: str = Depends(get_current_user)
+):
+    """The caller's notes most similar in wording to one of their notes, most similar first"""
+    start_time = time.time()
+    note = await note_store.get(note_id)
+    if note is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    
+    if note.user_id != current_user:
+        raise HTTPException(status_code=403, detail="Not authorized to access this note")
+    
+    # Written by another replica since the last refresh
+    if note_id not in related_index.owners:
+        related_index.add(note)
+    hits = related_index.related(current_user, note_id, limit)
+    notes = await note_store.get_many(hit_id for hit_id, _ in hits)
+    
+    found = {hit.id for hit in notes}
+    for hit_id, _ in hits:
+        if hit_id not in found:
+            unindex_note(hit_id)
+    
+    NOTE_OPERATIONS.labels(operation="related").inc()
+    NOTE_LATENCY.labels(operation="related").observe(time.time() - start_time)
+    
+    return [hit for hit in notes if hit.user_id == current_user]
+
 @app.put("/notes/{note_id}", response_model=Note)
 async def update_note(
     note_id: str,
     note_update: NoteCreate,
-    current_user: str = Depends(get_current_user)
+    response: Response,
+    current_user: str = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
 ):
     start_time = time.time()
-    if note_id not in notes_db:
+    note = await note_store.get(note_id)
+    if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    note = notes_db[note_id]
     if note.user_id != current_user:
         raise HTTPException(status_code=403, detail="Not authorized to update this note")
     
+    check_if_match(if_match, note)
     updated_note = Note(
         id=note_id,
         user_id=current_user,
         created_at=note.created_at,
         updated_at=datetime.utcnow(),
+        version=note.version + 1,
         **note_update.dict()
     )
     
-    notes_db[note_id] = updated_note
+    await save_update(updated_note, note.version, response)
     NOTE_OPERATIONS.labels(operation="update").inc()
     NOTE_LATENCY.labels(operation="update").observe(time.time() - start_time)
     
     return updated_note
 
+@app.patch("/notes/{note_id}", response_model=Note)
+async def patch_note(
+    note_id: str,
+    note_patch: NotePatch,
+    response: Response,
+    current_user: str = Depends(get_current_user),
+    if_match: Optional[str] = Header(None)
+):
+    """Change only the fields sent; send the note's ETag as If-Match to avoid overwriting someone else's edit"""
+    start_time = time.time()
+    note = await note_store.get(note_id)
+    if note is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    
+    if note.user_id != current_user:
+        raise HTTPException(status_code=403, detail="Not authorized to update this note")
+    
+    check_if_match(if_match, note)
+    fields = {field: getattr(note, field) for field in Note.__fields__}
+    fields.update(note_patch.dict(exclude_unset=True))
+    fields.update(updated_at=datetime.utcnow(), version=note.version + 1)
+    try:
+        updated_note = Note(**fields)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    
+    await save_update(updated_note, note.version, response)
+    NOTE_OPERATIONS.labels(operation="patch").inc()
+    NOTE_LATENCY.labels(operation="patch").observe(time.time() - start_time)
+    
+    return updated_note
+
 @app.delete("/notes/{note_id}")
 async def delete_note(note_id: str, current_user: str = Depends(get_current_user)):
     start_time = time.time()
-    if note_id not in notes_db:
+    note = await note_store.get(note_id)
+    if note is None:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    note = notes_db[note_id]
     if note.user_id != current_user:
         raise HTTPException(status_code=403, detail="Not authorized to delete this note")
     
-    del notes_db[note_id]
+    await note_store.delete(note_id)
+    unindex_note(note_id)
+    await note_cache.tombstone(note_cache.note_key(note_id))
+    await note_cache.invalidate_lists(current_user)
     NOTE_OPERATIONS.labels(operation="delete").inc()
     NOTE_LATENCY.labels(operation="delete").observe(time.time() - start_time)
     
     return {"status": "success"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    # The SQL store totals blob sizes with a query, so they are read per scrape rather than in set_function
+    stats = await note_store.blob_stats()
+    CONTENT_BLOB_BYTES.labels(kind="logical").set(stats.logical_bytes)
+    CONTENT_BLOB_BYTES.labels(kind="unique").set(stats.unique_bytes)
+    CONTENT_BLOB_BYTES.labels(kind="stored").set(stats.stored_bytes)
+    CONTENT_DEDUP_RATIO.set(stats.dedup_ratio)
+    CONTENT_COMPRESSION_RATIO.set(stats.compression_ratio)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"} 
\ No newline at end of file
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# Services are run from their own directory, so make `app` and `main` importable the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main builds its store at import; the API tests swap in their own, so don't point it at a database
+os.environ.setdefault("NOTE_STORE", "memory")
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Header
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.memory import MemoryNoteStore
+from app.db.sql import SqlNoteStore
+
+def make_note(note_id: str, user_id: str = "alice", content: str = "", updated_at: datetime = datetime(2024, 1, 1), **fields):
+    """A note as main.py hands it to the store"""
+    values = dict(
+        id=note_id, user_id=user_id, title=note_id, content=content, source_type="manual", source_url=None,
+        tags=[], summary=None, key_points=[], created_at=updated_at, updated_at=updated_at, version=1, seq=0,
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+@pytest.fixture(params=["memory", "sql"])
+def new_store(request, tmp_path):
+    """Build each kind of note store; call it inside the test's event loop, since SQL connections belong to one"""
+
+    async def build():
+        if request.param == "memory":
+            store = MemoryNoteStore()
+        else:
+            store = SqlNoteStore(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'notes.db'}", future=True))
+        await store.start()
+        return store
+
+    return build
+
+@pytest.fixture
+def client(monkeypatch):
+    """The note API over an empty memory store, taking the caller's user id as the bearer token"""
+    import main
+
+    async def bearer_user(authorization: str = Header(...)) -> str:
+        return authorization.partition(" ")[2]
+
+    monkeypatch.setattr(main, "note_store", MemoryNoteStore())
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, bearer_user)
+    return TestClient(main.app)
+
+def as_user(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {user_id}"}
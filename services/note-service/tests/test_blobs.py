@@ -0,0 +1,38 @@
+from app.core.blobs import MIN_COMPRESS_BYTES, BlobStore, compress, decompress
+
+def test_short_or_incompressible_bodies_are_kept_raw():
+    assert compress(b"hi") == ("raw", b"hi")
+    noise = bytes(range(256))
+    assert compress(noise) == ("raw", noise)
+
+    codec, packed = compress(b"a" * MIN_COMPRESS_BYTES * 4)
+    assert codec in ("zstd", "zlib")
+    assert decompress(codec, packed) == b"a" * MIN_COMPRESS_BYTES * 4
+
+def test_identical_bodies_share_one_blob_until_the_last_reference_goes():
+    blobs = BlobStore()
+    body = "lecture transcript " * 50
+
+    first, second = blobs.put(body), blobs.put(body)
+    other = blobs.put("short")
+
+    assert first is second
+    assert len(blobs) == 2
+    assert blobs.get(first) == body
+    stats = blobs.stats()
+    assert stats.logical_bytes == 2 * len(body) + len("short")
+    assert stats.unique_bytes == len(body) + len("short")
+    assert stats.dedup_ratio > 1
+    assert stats.compression_ratio > 1
+
+    blobs.release(first)
+    assert blobs.get(second) == body
+    blobs.release(second)
+    blobs.release(other)
+    assert len(blobs) == 0
+    assert blobs.stats() == (0, 0, 0)
+
+def test_releasing_an_unknown_blob_is_harmless():
+    blobs = BlobStore()
+    blobs.release("not-a-digest")
+    assert blobs.stats().dedup_ratio == 1.0
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.changes import ChangesExpiredError
+import main
+from conftest import as_user, make_note
+
+def test_changes_report_writes_and_deletions_once_each_in_order(new_store):
+    async def run():
+        store = await new_store()
+        for note_id in ("a", "b", "c"):
+            await store.add(make_note(note_id))
+        await store.add(make_note("other", user_id="bob"))
+        first = await store.changes("alice", 0, 10)
+        assert [(seq, note_id) for seq, note_id, _ in first] == [(1, "a"), (2, "b"), (3, "c")]
+
+        await store.delete("a")
+        b = await store.get("b")
+        await store.update(make_note("b", content="edited", version=b.version + 1), b.version)
+        later = await store.changes("alice", 3, 10)
+        assert [(seq, note_id, note is None) for seq, note_id, note in later] == [(4, "a", True), (5, "b", False)]
+        assert later[1][2].content == "edited"
+        await store.close()
+
+    asyncio.run(run())
+
+def test_purged_tombstones_send_stale_clients_back_to_a_full_sync(new_store):
+    async def run():
+        store = await new_store()
+        for note_id in ("a", "b", "c"):
+            await store.add(make_note(note_id))
+        await store.delete("a")
+        await store.delete("b")
+        assert await store.purge_tombstones(datetime.utcnow() - timedelta(days=1)) == 0
+
+        assert await store.purge_tombstones(datetime.utcnow() + timedelta(seconds=1)) == 2
+        # A client that saw both deletions, or none of the notes, is unaffected
+        assert await store.changes("alice", 5, 10) == []
+        assert [note_id for _, note_id, _ in await store.changes("alice", 0, 10)] == ["c"]
+        # One that last synced before them would never learn the notes are gone
+        with pytest.raises(ChangesExpiredError):
+            await store.changes("alice", 3, 10)
+        assert await store.changes("bob", 3, 10) == []
+        await store.close()
+
+    asyncio.run(run())
+
+def test_clients_sync_by_following_next_since(client):
+    created = [
+        client.post("/notes", json={"title": f"t{index}", "content": "", "source_type": "manual"}, headers=as_user("alice")).json()
+        for index in range(3)
+    ]
+    first = client.get("/notes/changes", params={"limit": 2}, headers=as_user("alice")).json()
+    assert [change["id"] for change in first["changes"]] == [note["id"] for note in created[:2]]
+    assert first["has_more"]
+
+    client.delete(f"/notes/{created[0]['id']}", headers=as_user("alice"))
+    rest = client.get("/notes/changes", params={"since": first["next_since"]}, headers=as_user("alice")).json()
+
+    assert [(change["id"], change["deleted"]) for change in rest["changes"]] == [
+        (created[2]["id"], False), (created[0]["id"], True)
+    ]
+    assert not rest["has_more"]
+    caught_up = client.get("/notes/changes", params={"since": rest["next_since"]}, headers=as_user("alice")).json()
+    assert caught_up == {"changes": [], "next_since": rest["next_since"], "has_more": False}
+
+def test_clients_behind_a_purge_are_told_to_sync_from_scratch(client):
+    note = client.post("/notes", json={"title": "t", "content": "", "source_type": "manual"}, headers=as_user("alice")).json()
+    client.post("/notes", json={"title": "kept", "content": "", "source_type": "manual"}, headers=as_user("alice"))
+    client.delete(f"/notes/{note['id']}", headers=as_user("alice"))
+    asyncio.run(main.note_store.purge_tombstones(datetime.utcnow() + timedelta(seconds=1)))
+
+    assert client.get("/notes/changes", params={"since": 1}, headers=as_user("alice")).status_code == 410
+    full = client.get("/notes/changes", params={"since": 0}, headers=as_user("alice")).json()
+    assert [change["note"]["title"] for change in full["changes"]] == ["kept"]
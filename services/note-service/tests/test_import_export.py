@@ -0,0 +1,79 @@
+import gzip
+import json
+
+import main
+from conftest import as_user
+
+def ndjson(*items) -> bytes:
+    return b"".join(json.dumps(item).encode() + b"\n" for item in items)
+
+def import_notes(client, body: bytes, user_id: str = "alice"):
+    response = client.post(
+        "/notes/import", data=body, headers={**as_user(user_id), "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def export_notes(client, user_id: str = "alice", **params):
+    response = client.get("/notes/export", params=params, headers=as_user(user_id))
+    assert response.status_code == 200
+    return response
+
+def test_import_reports_each_line_and_keeps_going_past_bad_ones(client, monkeypatch):
+    monkeypatch.setattr(main.settings, "IMPORT_MAX_LINE_BYTES", 200)
+    body = (
+        ndjson({"title": "one", "content": "a", "source_type": "manual", "created_at": "2020-05-01T00:00:00"})
+        + b"\n"
+        + ndjson({"title": "no content"})
+        + ndjson({"title": "long", "content": "x" * 500, "source_type": "manual"})
+        + ndjson({"title": "two", "content": "b", "source_type": "web", "tags": ["t"]})
+    )
+
+    results = import_notes(client, body)
+
+    assert [(result["line"], result["status"]) for result in results] == [
+        (1, "created"), (3, "error"), (4, "error"), (5, "created")
+    ]
+    assert results[2]["error"] == "Line too long"
+    notes = {note["title"]: note for note in client.get("/notes", headers=as_user("alice")).json()}
+    assert set(notes) == {"one", "two"}
+    assert notes["one"]["id"] == results[0]["id"]
+    assert notes["one"]["created_at"] == "2020-05-01T00:00:00"
+    assert notes["two"]["tags"] == ["t"]
+
+def test_import_stores_notes_in_batches(client, monkeypatch):
+    monkeypatch.setattr(main.settings, "IMPORT_BATCH_SIZE", 2)
+    body = ndjson(*[{"title": f"t{index}", "content": "", "source_type": "manual"} for index in range(5)])
+
+    results = import_notes(client, body)
+
+    assert [result["status"] for result in results] == ["created"] * 5
+    assert len(main.note_store) == 5
+
+def test_export_streams_every_note_and_resumes_from_a_cursor(client, monkeypatch):
+    monkeypatch.setattr(main.settings, "EXPORT_BATCH_SIZE", 2)
+    import_notes(client, ndjson(*[{"title": f"t{index}", "content": "", "source_type": "manual"} for index in range(5)]))
+    import_notes(client, ndjson({"title": "bob's", "content": "", "source_type": "manual"}), user_id="bob")
+
+    lines = [json.loads(line) for line in export_notes(client).text.splitlines()]
+    resumed = [json.loads(line) for line in export_notes(client, cursor=lines[2]["cursor"]).text.splitlines()]
+
+    assert sorted(line["note"]["title"] for line in lines) == [f"t{index}" for index in range(5)]
+    assert [line["note"]["id"] for line in resumed] == [line["note"]["id"] for line in lines[3:]]
+
+def test_export_can_be_gzipped_and_round_trips_through_import(client):
+    import_notes(client, ndjson({"title": "kept", "content": "body", "source_type": "web", "tags": ["a"]}))
+
+    response = export_notes(client, gzip="true")
+
+    assert response.headers["content-type"] == "application/gzip"
+    exported = [json.loads(line)["note"] for line in gzip.decompress(response.content).splitlines()]
+    results = import_notes(client, ndjson(*exported), user_id="bob")
+    assert [result["status"] for result in results] == ["created"]
+    copy, = client.get("/notes", headers=as_user("bob")).json()
+    assert (copy["title"], copy["content"], copy["tags"]) == ("kept", "body", ["a"])
+    assert copy["id"] != exported[0]["id"]
+
+def test_export_rejects_a_bad_cursor(client):
+    response = client.get("/notes/export", params={"cursor": "bogus"}, headers=as_user("alice"))
+    assert response.status_code == 400
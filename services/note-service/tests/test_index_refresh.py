@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.db.memory import MemoryNoteStore
+from app.db.refresh import index_written, refresh
+from app.db.related import RelatedIndex
+from app.db.search import SearchIndex
+
+START = datetime(2024, 1, 1)
+
+def make_note(note_id: str, title: str, updated_at: datetime):
+    return SimpleNamespace(
+        id=note_id, user_id="alice", title=title, content="", source_type="manual", source_url=None,
+        tags=[], summary=None, key_points=[], created_at=updated_at, updated_at=updated_at, version=1, seq=0,
+    )
+
+class Replica:
+    """One note-service process: its own indexes over the store shared by every replica"""
+
+    def __init__(self, store: MemoryNoteStore):
+        self.store = store
+        self.search_index = SearchIndex(refresh_overlap=60)
+        self.related_index = RelatedIndex(dimensions=64, refresh_overlap=60)
+        self.indexes = [self.search_index, self.related_index]
+
+    async def write(self, note):
+        await self.store.add(note)
+        index_written(self.indexes, note)
+
+    async def refresh(self):
+        await refresh(self.store, self.indexes)
+
+    def finds(self, query: str) -> bool:
+        return bool(self.search_index.search("alice", query))
+
+    def relates(self, note_id: str) -> bool:
+        return note_id in self.related_index.owners
+
+def test_local_write_does_not_hide_earlier_remote_write():
+    async def run():
+        store = MemoryNoteStore()
+        a, b = Replica(store), Replica(store)
+        await a.refresh()
+        await b.write(make_note("b1", "bravo", START))
+        await a.write(make_note("a1", "alpha", START + timedelta(seconds=1)))
+        await a.refresh()
+        assert a.finds("bravo")
+        assert a.finds("alpha")
+        assert a.relates("b1")
+        assert a.relates("a1")
+
+    asyncio.run(run())
+
+def test_refresh_rereads_overlap_for_late_commits():
+    async def run():
+        store = MemoryNoteStore()
+        a, b = Replica(store), Replica(store)
+        await b.write(make_note("b1", "bravo", START + timedelta(seconds=10)))
+        await a.refresh()
+        # Stamped before the note a has already read past, but committed after that refresh
+        await b.write(make_note("b2", "charlie", START + timedelta(seconds=5)))
+        await a.refresh()
+        assert a.finds("charlie")
+        assert a.relates("b2")
+
+    asyncio.run(run())
+
+def test_refresh_skips_notes_already_indexed():
+    async def run():
+        store = MemoryNoteStore()
+        a = Replica(store)
+        added = []
+        original_add = a.search_index.add
+        a.search_index.add = lambda note: (added.append(note.id), original_add(note))
+        await a.write(make_note("a1", "alpha", START))
+        await a.refresh()
+        await a.refresh()
+        assert added == ["a1"]
+
+    asyncio.run(run())
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+import main
+from app.core.cache import MemoryCacheBackend, NoteCache
+from conftest import as_user
+
+def new_cache(backend=None, lock_wait: float = 0.2) -> NoteCache:
+    backend = backend if backend is not None else MemoryCacheBackend(max_entries=100)
+    return NoteCache(backend, ttl=60, jitter=0.1, lock_seconds=5, lock_wait=lock_wait)
+
+class BrokenBackend:
+    """A Redis that can't be reached"""
+
+    def __getattr__(self, name: str):
+        async def fail(*args, **kwargs):
+            raise ConnectionError("Connection refused")
+
+        return fail
+
+def test_concurrent_misses_load_once():
+    cache = new_cache()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return b"note"
+
+    async def run():
+        values = await asyncio.gather(*[cache.read_through("note", "note:n1", load) for _ in range(5)])
+        assert values == [b"note"] * 5
+        assert await cache.read_through("note", "note:n1", load) == b"note"
+
+    asyncio.run(run())
+    assert len(loads) == 1
+    assert cache.hits["note"] == 1
+    assert cache.hit_ratio("note") == 1 / 6
+
+def test_a_read_that_raced_a_write_does_not_overwrite_it():
+    cache = new_cache()
+
+    async def run():
+        async def stale_load():
+            # The note is rewritten while the old version is being read
+            await cache.put("note:n1", b"new")
+            return b"old"
+
+        assert await cache.read_through("note", "note:n1", stale_load) == b"old"
+        assert await cache.backend.get("note:n1") == b"new"
+
+        await cache.tombstone("note:n1")
+        assert await cache.read_through("note", "note:n1", stale_load) == b""
+
+    asyncio.run(run())
+
+def test_writes_retire_every_cached_list_page_of_the_user():
+    cache = new_cache()
+
+    async def run():
+        before = await cache.list_key("alice", limit=10)
+        other = await cache.list_key("bob", limit=10)
+        await cache.invalidate_lists("alice")
+        assert await cache.list_key("alice", limit=10) != before
+        assert await cache.list_key("bob", limit=10) == other
+
+    asyncio.run(run())
+
+def test_an_unreachable_backend_falls_back_to_the_store():
+    cache = new_cache(BrokenBackend())
+
+    async def load():
+        return b"note"
+
+    async def run():
+        assert await cache.read_through("note", "note:n1", load) == b"note"
+        await cache.put("note:n1", b"note")
+        await cache.invalidate_lists("alice")
+
+    asyncio.run(run())
+    assert cache.misses["note"] == 1
+
+@pytest.fixture
+def cached_client(client, monkeypatch):
+    monkeypatch.setattr(main, "note_cache", new_cache())
+    return client
+
+def test_reads_are_served_from_the_cache_and_writes_keep_it_current(cached_client, monkeypatch):
+    client = cached_client
+    note = client.post("/notes", json={"title": "t", "content": "v1", "source_type": "manual"}, headers=as_user("alice")).json()
+    assert client.get("/notes", headers=as_user("alice")).json()[0]["content"] == "v1"
+
+    # Reads no longer reach the store once cached
+    async def unreachable(*args, **kwargs):
+        raise AssertionError("store read")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(main.note_store, "get", unreachable)
+        patch.setattr(main.note_store, "list", unreachable)
+        assert client.get(f"/notes/{note['id']}", headers=as_user("alice")).json()["content"] == "v1"
+        assert client.get("/notes", headers=as_user("alice")).json()[0]["content"] == "v1"
+
+    client.patch(f"/notes/{note['id']}", json={"content": "v2"}, headers=as_user("alice"))
+    assert client.get(f"/notes/{note['id']}", headers=as_user("alice")).json()["content"] == "v2"
+    assert client.get("/notes", headers=as_user("alice")).json()[0]["content"] == "v2"
+
+    client.delete(f"/notes/{note['id']}", headers=as_user("alice"))
+    assert client.get(f"/notes/{note['id']}", headers=as_user("alice")).status_code == 404
+    assert client.get("/notes", headers=as_user("alice")).json() == []
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.db.pagination import sort_key
+from conftest import make_note
+
+START = datetime(2024, 1, 1)
+
+def test_notes_round_trip_with_their_tags(new_store):
+    async def run():
+        store = await new_store()
+        await store.add(make_note("a", content="body a", tags=["x", "y"], source_url="https://example.com"))
+        await store.add_many([make_note("b", content="body b"), make_note("c", content="body c")])
+
+        a = await store.get("a")
+        assert (a.content, sorted(a.tags), a.source_url, a.version) == ("body a", ["x", "y"], "https://example.com", 1)
+        assert await store.get("missing") is None
+        assert [note.id for note in await store.get_many(["c", "missing", "a"])] == ["c", "a"]
+        await store.close()
+
+    asyncio.run(run())
+
+def test_updates_only_apply_to_the_expected_version(new_store):
+    async def run():
+        store = await new_store()
+        await store.add(make_note("a", content="first"))
+
+        assert await store.update(make_note("a", content="second", version=2, tags=["new"]), expected_version=1)
+        assert not await store.update(make_note("a", content="stale", version=2), expected_version=1)
+        assert not await store.update(make_note("missing", version=2), expected_version=1)
+
+        a = await store.get("a")
+        assert (a.content, a.version, list(a.tags)) == ("second", 2, ["new"])
+        assert [note.id for note in await store.list("alice", tag="new")] == ["a"]
+        await store.close()
+
+    asyncio.run(run())
+
+def test_deleted_notes_are_gone_from_reads_and_listings(new_store):
+    async def run():
+        store = await new_store()
+        await store.add(make_note("a", tags=["x"]))
+        await store.add(make_note("b"))
+
+        assert await store.delete("a")
+        assert not await store.delete("a")
+
+        assert await store.get("a") is None
+        assert [note.id for note in await store.list("alice")] == ["b"]
+        assert await store.list("alice", tag="x") == []
+        await store.close()
+
+    asyncio.run(run())
+
+def test_iterating_notes_resumes_after_a_position(new_store):
+    async def run():
+        store = await new_store()
+        for index in range(5):
+            await store.add(make_note(f"n{index}", updated_at=START + timedelta(seconds=index)))
+        await store.add(make_note("other", user_id="bob", updated_at=START - timedelta(days=1)))
+
+        every = [note async for note in store.iter_user_notes("alice", batch_size=2)]
+        assert [note.id for note in every] == [f"n{index}" for index in range(5)]
+        resumed = store.iter_user_notes("alice", after=sort_key(every[1]), batch_size=2)
+        assert [note.id async for note in resumed] == ["n2", "n3", "n4"]
+        assert [note.id async for note in store.iter_notes(batch_size=2)] == ["other"] + [note.id for note in every]
+        await store.close()
+
+    asyncio.run(run())
+
+def test_identical_bodies_are_stored_once(new_store):
+    async def run():
+        store = await new_store()
+        body = "the same long transcript " * 40
+        for note_id in ("a", "b", "c"):
+            await store.add(make_note(note_id, content=body))
+
+        stats = await store.blob_stats()
+        assert stats.logical_bytes == 3 * len(body)
+        assert stats.unique_bytes == len(body)
+        assert stats.stored_bytes < len(body)
+
+        await store.delete("a")
+        await store.update(make_note("b", content="different", version=2), expected_version=1)
+        stats = await store.blob_stats()
+        assert stats.logical_bytes == len(body) + len("different")
+        assert (await store.get("c")).content == body
+        await store.close()
+
+    asyncio.run(run())